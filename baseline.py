@@ -0,0 +1,41 @@
+import numpy as np
+from scipy.interpolate import CubicSpline
+from pybaselines import Baseline
+
+
+def decimate(values, factor):
+    """Moyenne par paquets de factor points (le dernier paquet peut être plus court)"""
+    values = np.asarray(values, dtype=np.float64)
+    n_full = len(values) // factor * factor
+    binned = values[:n_full].reshape(-1, factor).mean(axis=1)
+    if n_full < len(values):
+        binned = np.append(binned, values[n_full:].mean())
+    return binned
+
+
+class FastBaseline:
+    """Ligne de base AsLS rapide : résolution sur une grille décimée puis interpolation.
+
+    lam est ramené à la grille décimée (lam / facteur^4 pour une pénalité d'ordre 2) ;
+    les poids du calcul précédent servent de point de départ au suivant, ce qui rend
+    les réajustements successifs (réglage interactif de lam/p) quasi immédiats.
+    """
+
+    def __init__(self, x, target_points=5000):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.factor = max(1, len(self.x) // target_points)
+        self.x_decimated = decimate(self.x, self.factor)
+        self.fitter = Baseline(x_data=self.x_decimated)
+        self.weights = None
+
+    def fit(self, y, lam=1e5, p=0.95, warm_start=True):
+        y_decimated = decimate(y, self.factor)
+        weights = self.weights if warm_start else None
+        baseline, params = self.fitter.asls(y_decimated, lam=lam / self.factor ** 4, p=p, weights=weights)
+        self.weights = params['weights']
+        if self.factor == 1:
+            return baseline
+        return CubicSpline(self.x_decimated, baseline)(self.x)
+
+    def reset(self):
+        self.weights = None
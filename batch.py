@@ -0,0 +1,265 @@
+"""Traitement par lots des spectres FITS 1D, sans interface graphique.
+
+Usage : python batch.py <dossier ou fichier> [...] -o <dossier de sortie> [options]
+
+Pour chaque spectre : lecture de l'en-tête, retrait des raies telluriques et
+normalisation par la ligne de base. Les spectres nettoyés sont écrits en FITS
+(même arborescence que l'entrée) et un récapitulatif est écrit en CSV.
+Un journal permet de reprendre un lot interrompu sans refaire les fichiers déjà traités.
+
+N'importe ni PySide6 ni pyqtgraph : utilisable sur un nœud de calcul sans affichage.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+FITS_EXTENSIONS = ('.fit', '.fits', '.fts')
+JOURNAL_NAME = "batch_journal.jsonl"
+SUMMARY_NAME = "batch_summary.csv"
+OUTPUT_SUFFIX = "_clean.fits"
+SUMMARY_COLUMNS = ['file', 'status', 'output', 'object', 'hd_number', 'date_obs', 'resolution',
+                   'npix', 'wave_min', 'wave_max', 'seconds', 'error']
+
+
+def find_spectra(paths, exclude=(), skip_suffixes=()):
+    """Fichiers FITS des chemins donnés (dossiers parcourus récursivement) ; retourne [(fichier, racine)]
+
+    exclude : dossiers ou fichiers laissés de côté (la sortie, si elle est dans l'arborescence
+    d'entrée) ; skip_suffixes : fins de nom des fichiers déjà produits par l'outil.
+    """
+    exclude = {os.path.abspath(path) for path in exclude}
+    suffixes = tuple(suffix.lower() for suffix in skip_suffixes)
+    found = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isfile(path):
+            found.append((path, os.path.dirname(path)))
+            continue
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names[:] = sorted(name for name in dir_names if os.path.join(dir_path, name) not in exclude)
+            for name in sorted(file_names):
+                file_name = os.path.join(dir_path, name)
+                if (name.lower().endswith(FITS_EXTENSIONS) and file_name not in exclude
+                        and not (suffixes and name.lower().endswith(suffixes))):
+                    found.append((file_name, path))
+    return found
+
+
+def output_paths(spectra, output_dir, suffix=OUTPUT_SUFFIX):
+    """Fichier de sortie de chaque (fichier, racine) : même arborescence que l'entrée, suffixe suffix.
+
+    Avec plusieurs racines, chacune a son sous-dossier (nom de la racine) : night1/s.fits et
+    night2/s.fits ne s'écrasent pas. Deux entrées qui donneraient la même sortie lèvent ValueError.
+    """
+    several_roots = len({root for _, root in spectra}) > 1
+    outputs = []
+    sources = {}
+    duplicates = []
+    for file_name, root in spectra:
+        relative = os.path.relpath(file_name, root)
+        if several_roots:
+            relative = os.path.join(os.path.basename(root), relative)
+        base, _ = os.path.splitext(relative)
+        out_name = os.path.join(output_dir, base + suffix)
+        if out_name in sources:
+            duplicates.append(f"{sources[out_name]} et {file_name} -> {out_name}")
+        sources.setdefault(out_name, file_name)
+        outputs.append(out_name)
+    if duplicates:
+        raise ValueError("Plusieurs entrées donnent le même fichier de sortie :\n" + "\n".join(duplicates))
+    return outputs
+
+
+def file_signature(file_name):
+    stat = os.stat(file_name)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class Journal:
+    """Journal JSON lines des fichiers traités (une ligne ajoutée par fichier, écrite immédiatement)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # dernière ligne tronquée par une interruption
+                    self.entries[entry['file']] = entry
+
+    def is_done(self, file_name, signature, options):
+        entry = self.entries.get(file_name)
+        return (entry is not None and entry['status'] == "ok"
+                and entry['signature'] == signature and entry['options'] == options
+                and os.path.exists(entry['output']))
+
+    def record(self, entry):
+        self.entries[entry['file']] = entry
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+_processor = None
+
+
+def process_one(file_name, out_name, options):
+    """Traiter un spectre dans un processus de calcul ; retourne la ligne du récapitulatif"""
+    global _processor
+    if _processor is None:
+        from data_processing import DataProcessor
+        from product_cache import ProductCache
+
+        # chaque fichier n'est traité qu'une fois : pas de cache des produits dans les processus
+        _processor = DataProcessor(products=ProductCache(max_bytes=0))
+
+    from astropy.io import fits
+
+    t0 = time.perf_counter()
+    spectrum = _processor.process_file(file_name)
+    x = spectrum.wavelength
+    y = np.asarray(spectrum.native_flux, dtype=np.float64)
+    resolution = spectrum.resolution if options['method'] == "template" else None
+    _, cleaned, bkg = _processor.remove_atmospheric_lines(
+        x, y, method=options['method'], lam=options['lam'], p=options['p'],
+        resolution=resolution, baseline=options['baseline'])
+    normalized = cleaned / bkg
+
+    header = spectrum.header.copy()
+    for keyword in ('BZERO', 'BSCALE', 'BLANK'):
+        header.remove(keyword, ignore_missing=True)
+    header['HISTORY'] = f"Cosmos batch: raies telluriques retirees (methode {options['method']})"
+    header['HISTORY'] = f"Cosmos batch: normalise par la ligne de base AsLS (lam={options['lam']:g}, p={options['p']:g})"
+    hdul = fits.HDUList([fits.PrimaryHDU(normalized.astype(np.float32), header=header),
+                         fits.ImageHDU(bkg.astype(np.float32), name="BASELINE")])
+
+    os.makedirs(os.path.dirname(out_name), exist_ok=True)
+    tmp_name = out_name + ".tmp"
+    hdul.writeto(tmp_name, overwrite=True, output_verify="silentfix")
+    os.replace(tmp_name, out_name)
+
+    return {
+        'object': spectrum.obj_name,
+        'hd_number': spectrum.hd_number,
+        'date_obs': spectrum.date_obs,
+        'resolution': spectrum.resolution,
+        'npix': len(x),
+        'wave_min': float(x[0]),
+        'wave_max': float(x[-1]),
+        'seconds': round(time.perf_counter() - t0, 3),
+    }
+
+
+def prefetch_identifiers(file_names):
+    """Remplir le cache SIMBAD en une requête avant de lancer les processus"""
+    from simbad_resolver import SimbadResolver
+    from astropy.io import fits
+
+    names = []
+    for file_name in file_names:
+        try:
+            names.append(fits.getval(file_name, 'OBJNAME'))
+        except (OSError, KeyError):
+            pass
+    if names:
+        try:
+            SimbadResolver().resolve_many(names)
+        except Exception as e:
+            print(f"Résolution SIMBAD groupée impossible: {e}")
+
+
+def write_summary(path, rows, columns=SUMMARY_COLUMNS):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+
+def run(paths, output_dir, method="joint", lam=1e5, p=0.95, baseline="full", workers=None, force=False):
+    """Traiter tous les spectres de paths ; retourne les lignes du récapitulatif"""
+    output_dir = os.path.abspath(output_dir)  # chemins du journal valables depuis tout dossier courant
+    if method == "template":
+        from telluric import has_measured_template
+
+        if not has_measured_template():
+            raise ValueError("Aucun gabarit tellurique mesuré : le créer d'abord dans l'interface "
+                             "(Créer le gabarit à partir de ce spectre) ou utiliser --method joint")
+    os.makedirs(output_dir, exist_ok=True)
+    options = {'method': method, 'lam': lam, 'p': p, 'baseline': baseline}
+    journal = Journal(os.path.join(output_dir, JOURNAL_NAME))
+
+    spectra = find_spectra(paths, exclude=[output_dir], skip_suffixes=[OUTPUT_SUFFIX])
+    todo = []
+    for (file_name, root), out_name in zip(spectra, output_paths(spectra, output_dir)):
+        signature = file_signature(file_name)
+        if force or not journal.is_done(file_name, signature, options):
+            todo.append((file_name, out_name, signature))
+    print(f"{len(spectra)} spectre(s), {len(spectra) - len(todo)} déjà traité(s), {len(todo)} à traiter")
+
+    if todo:
+        prefetch_identifiers([file_name for file_name, _, _ in todo])
+        workers = workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(todo)),
+                                       mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = {executor.submit(process_one, file_name, out_name, options): (file_name, out_name, signature)
+                       for file_name, out_name, signature in todo}
+            for done, future in enumerate(as_completed(futures), 1):
+                file_name, out_name, signature = futures[future]
+                entry = {'file': file_name, 'output': out_name, 'signature': signature, 'options': options}
+                try:
+                    entry.update(future.result(), status="ok", error="")
+                except Exception as e:
+                    entry.update(status="échec", error=f"{type(e).__name__}: {e}")
+                journal.record(entry)
+                print(f"[{done}/{len(todo)}] {entry['status']:5s} {file_name} {entry['error']}")
+        except KeyboardInterrupt:
+            print("Interrompu : relancer la même commande pour reprendre")
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+    rows = [journal.entries[file_name] for file_name, _ in spectra if file_name in journal.entries]
+    write_summary(os.path.join(output_dir, SUMMARY_NAME), rows)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Traitement par lots de spectres FITS 1D (sans interface)")
+    parser.add_argument('paths', nargs='+', help="fichiers FITS ou dossiers (parcourus récursivement)")
+    parser.add_argument('-o', '--output', required=True, help="dossier de sortie")
+    parser.add_argument('--method', choices=["joint", "template", "lmfit"], default="joint",
+                        help="correction tellurique (défaut : joint ; template exige un gabarit mesuré)")
+    parser.add_argument('--lam', type=float, default=1e5, help="lissage de la ligne de base AsLS")
+    parser.add_argument('--p', type=float, default=0.95, help="asymétrie de la ligne de base AsLS")
+    parser.add_argument('--fast-baseline', action='store_true', help="ligne de base sur grille décimée")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="nombre de processus (défaut : tous les cœurs)")
+    parser.add_argument('--force', action='store_true', help="retraiter aussi les fichiers déjà dans le journal")
+    args = parser.parse_args(argv)
+
+    try:
+        rows = run(args.paths, args.output, method=args.method, lam=args.lam, p=args.p,
+                   baseline="fast" if args.fast_baseline else "full", workers=args.workers, force=args.force)
+    except ValueError as e:
+        print(f"Erreur : {e}")
+        return 2
+    failed = sum(1 for row in rows if row['status'] != "ok")
+    print(f"Terminé : {len(rows) - failed} réussi(s), {failed} échec(s) ; récapitulatif dans "
+          f"{os.path.join(args.output, SUMMARY_NAME)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,67 +1,256 @@
-import pandas as pd
-from astroquery.simbad import Simbad
-from astropy import coordinates
-import astropy.units as u
-from astropy.coordinates import SkyCoord, EarthLocation, AltAz, get_sun
+import re
+from html import unescape
+
 import numpy as np
-import matplotlib.pyplot as plt
-from astropy.visualization import astropy_mpl_style, quantity_support
-from astropy.time import Time
-from bs4 import BeautifulSoup
 import requests
 
 
-def bess_request():
-
-    
-    url = "http://arasbeam.free.fr/spip.php?page=beam_belist2&lang=fr"
-
-    response = requests.get(url)
-    response.raise_for_status()  
-
-    soup = BeautifulSoup(response.content, 'html.parser')
-
-    # Trouver la première table (ou la table cible) sur la page
-    tables = soup.find_all('table')
-    table = tables[4]
-
-    # Trouver toutes les lignes (tr) dans le tableau
-    rows = table.find_all('tr')
-
-    
-    id = []
-    hd_number = []
-    ad = []
-    dec = []
-    mag = []
-    sptype = []
-    date = []
-    bgcolors = []  
-
-    # Parcourir et récupérer le contenu des balises <td> de chaque ligne
-    for row in rows:
-        tds = row.find_all('td')  # Trouver toutes les balises <td> dans la ligne
-        if len(tds) > 1:  # Vérifier qu'il y a au moins deux <td> dans la ligne
-            id.append(tds[0].get_text(strip=True))
-            hd_number.append(tds[1].get_text(strip=True))  
-            ad.append(tds[2].get_text(strip=True))
-            dec.append(tds[3].get_text(strip=True))
-            mag.append(tds[4].get_text(strip=True))
-            sptype.append(tds[5].get_text(strip=True))
-            date.append(tds[9].get_text(strip=True))
-            # Récupérer le code couleur de la dernière balise <td>
-            bgcolor = tds[9].get('bgcolor', None)  
-            bgcolors.append(bgcolor)  
-
-    df = pd.DataFrame({
-        'id': id[2:], 
-        'hd': hd_number[2:], 
-        'ad': ad[2:], 
-        'dec': dec[2:], 
-        'mag': mag[2:], 
-        'sptype': sptype[2:], 
-        'date': date[2:], 
-        'bgcolor': bgcolors[2:] 
-    })
-
-    return df
\ No newline at end of file
+BESS_URL = "http://arasbeam.free.fr/spip.php?page=beam_belist2&lang=fr"
+
+BESS_COLUMNS = ['id', 'hd', 'ad', 'dec', 'mag', 'sptype', 'date', 'bgcolor']
+
+# Colonnes typées calculées à partir des colonnes texte
+TYPED_COLUMNS = ['ra_deg', 'dec_deg', 'mag_value', 'date_value', 'constellation']
+
+# Noms renvoyés par astropy (get_constellation) -> noms affichés dans l'interface
+CONSTELLATION_NAMES = {'Boötes': 'Bootes', 'Chamaleon': 'Chamaeleon', 'Ophiucus': 'Ophiuchus',
+                       'Pisces Austrinus': 'Piscis Austrinus', 'Crux ': 'Crux'}
+
+BESS_TABLE_INDEX = 4  # le tableau des étoiles est le 5e <table> de la page
+HEADER_ROWS = 2
+
+
+def fetch_bess(url=BESS_URL, etag=None, last_modified=None, timeout=30):
+    """Télécharger la page ARASBEAM (requête conditionnelle) ; retourne None si elle n'a pas changé (304)"""
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    return response
+
+
+_TABLE_TAG = re.compile(r'<(/?)table\b[^>]*>', re.I)
+_ROW_TAG = re.compile(r'<tr\b[^>]*>', re.I)
+_CELL = re.compile(r'<td\b([^>]*)>(.*?)(?=<td\b|</td>|</tr>|$)', re.I | re.S)
+_BGCOLOR = re.compile(r'bgcolor\s*=\s*["\']?([^"\'\s>]+)', re.I)
+_TAG = re.compile(r'<[^>]*>')
+
+
+def find_table(text, index=BESS_TABLE_INDEX):
+    """Bornes (début, fin) du index-ième <table> de la page (même ordre que find_all('table')), sans arbre DOM"""
+    seen = 0
+    depth = 0
+    start = None
+    for match in _TABLE_TAG.finditer(text):
+        if not match.group(1):
+            if depth:
+                depth += 1
+            elif seen == index:
+                start, depth = match.end(), 1
+            seen += 1
+        elif depth:
+            depth -= 1
+            if not depth:
+                return start, match.start()
+    if start is None:
+        raise ValueError("Tableau des étoiles introuvable dans la page ARASBEAM")
+    return start, len(text)
+
+
+def _cell_text(html):
+    # équivalent de get_text(strip=True) : chaque morceau de texte est nettoyé puis concaténé
+    if '<' not in html and '&' not in html:
+        return html.strip()
+    return "".join(unescape(piece).strip() for piece in _TAG.split(html))
+
+
+def iter_rows(text, start, end):
+    """Lignes du tableau : liste de (texte, bgcolor) par cellule ; lignes de moins de deux cellules ignorées"""
+    for row in _ROW_TAG.split(text[start:end])[1:]:
+        cells = [(_cell_text(content), _bgcolor(attrs)) for attrs, content in _CELL.findall(row)]
+        if len(cells) > 1:
+            yield cells
+
+
+def _bgcolor(attrs):
+    match = _BGCOLOR.search(attrs)
+    return match.group(1) if match else None
+
+
+def _decode(content):
+    if isinstance(content, str):
+        return content
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        return content.decode('latin-1')
+
+
+def parse_sexagesimal(values, hours=False):
+    """'hh mm ss.s' / '+dd:mm:ss' -> degrés (NaN si illisible)"""
+    def convert(value):
+        parts = re.split(r'[\s:hdms°\'"]+', value.strip())
+        parts = [part for part in parts if part]
+        if not parts:
+            return np.nan
+        try:
+            numbers = [abs(float(part.replace(',', '.'))) for part in parts[:3]]
+        except ValueError:
+            return np.nan
+        degrees = numbers[0] + sum(n / 60 ** (i + 1) for i, n in enumerate(numbers[1:]))
+        if parts[0].startswith('-'):
+            degrees = -degrees
+        return degrees * 15 if hours else degrees
+
+    return np.fromiter((convert(value) for value in values), dtype=np.float64, count=len(values))
+
+
+def parse_float(values):
+    def convert(value):
+        try:
+            return float(value.replace(',', '.'))
+        except ValueError:
+            return np.nan
+
+    return np.fromiter((convert(value) for value in values), dtype=np.float64, count=len(values))
+
+
+_DATE_YMD = re.compile(r'(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})')
+_DATE_DMY = re.compile(r'(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})')
+
+
+def parse_dates(values):
+    """Dates 'AAAA-MM-JJ' ou 'JJ/MM/AAAA' -> datetime64[D] (NaT si absente)"""
+    def convert(value):
+        match = _DATE_YMD.search(value)
+        if match:
+            year, month, day = match.groups()
+        else:
+            match = _DATE_DMY.search(value)
+            if not match:
+                return 'NaT'
+            day, month, year = match.groups()
+        return f"{year}-{int(month):02d}-{int(day):02d}"
+
+    dates = [convert(value) for value in values]
+    try:
+        return np.array(dates, dtype='datetime64[D]')
+    except ValueError:
+        # date impossible (ex. 31/02) : conversion une par une
+        return np.array([_safe_date(date) for date in dates], dtype='datetime64[D]')
+
+
+def _safe_date(date):
+    try:
+        return np.datetime64(date, 'D')
+    except ValueError:
+        return np.datetime64('NaT', 'D')
+
+
+def find_constellations(ra_deg, dec_deg):
+    """Constellation (nom complet) de chaque position J2000 en une seule passe ; None si coordonnées illisibles"""
+    ra_deg = np.asarray(ra_deg, dtype=np.float64)
+    dec_deg = np.asarray(dec_deg, dtype=np.float64)
+    result = np.full(len(ra_deg), None, dtype=object)
+    valid = np.isfinite(ra_deg) & np.isfinite(dec_deg)
+    if valid.any():
+        from astropy.coordinates import SkyCoord, get_constellation
+        import astropy.units as u
+
+        names = get_constellation(SkyCoord(ra=ra_deg[valid] * u.deg, dec=dec_deg[valid] * u.deg, frame='icrs'))
+        result[valid] = [CONSTELLATION_NAMES.get(name, name) for name in names]
+    return result
+
+
+class BessCatalogue:
+    """Catalogue BeSS en colonnes : textes d'origine (BESS_COLUMNS) et colonnes typées.
+
+    ra_deg, dec_deg, mag_value : float64 (NaN si illisible) ; date_value : datetime64[D] ;
+    constellation : nom complet (None si coordonnées illisibles) ;
+    sptype_codes, constellation_codes : index dans sptype_categories, constellation_categories.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.sptype_categories, self.sptype_codes = np.unique(columns['sptype'], return_inverse=True)
+        constellations = np.array([name or "" for name in columns['constellation']], dtype=object)
+        self.constellation_categories, self.constellation_codes = np.unique(constellations, return_inverse=True)
+
+    @classmethod
+    def from_text(cls, columns):
+        """Compléter les colonnes texte par les colonnes typées"""
+        columns = {name: np.asarray(columns[name], dtype=object) for name in BESS_COLUMNS}
+        columns['ra_deg'] = parse_sexagesimal(columns['ad'], hours=True)
+        columns['dec_deg'] = parse_sexagesimal(columns['dec'])
+        columns['mag_value'] = parse_float(columns['mag'])
+        columns['date_value'] = parse_dates(columns['date'])
+        columns['constellation'] = find_constellations(columns['ra_deg'], columns['dec_deg'])
+        return cls(columns)
+
+    @classmethod
+    def from_rows(cls, rows, names=BESS_COLUMNS):
+        """Construire à partir de tuples (ex. lignes SQLite) dans l'ordre de names"""
+        columns = {name: np.array([row[i] for row in rows], dtype=object) for i, name in enumerate(names)}
+        if all(name in columns for name in TYPED_COLUMNS):
+            columns['ra_deg'] = columns['ra_deg'].astype(np.float64)
+            columns['dec_deg'] = columns['dec_deg'].astype(np.float64)
+            columns['mag_value'] = columns['mag_value'].astype(np.float64)
+            columns['date_value'] = np.array([_safe_date(d) if d else np.datetime64('NaT', 'D')
+                                              for d in columns['date_value']], dtype='datetime64[D]')
+            return cls(columns)
+        return cls.from_text(columns)
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def constellation_mask(self, names):
+        """Lignes situées dans l'une des constellations names : simple lecture de table par code"""
+        selected = np.isin(self.constellation_categories, list(names))
+        return selected[self.constellation_codes]
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def rows(self, names=BESS_COLUMNS + TYPED_COLUMNS):
+        """Tuples Python dans l'ordre de names (NaN -> None, dates en ISO)"""
+        converted = []
+        for name in names:
+            column = self.columns[name]
+            if name == 'date_value':
+                column = [None if np.isnat(d) else str(d) for d in column]
+            elif column.dtype.kind == 'f':
+                column = [None if np.isnan(v) else float(v) for v in column]
+            converted.append(column)
+        return list(zip(*converted))
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        return pd.DataFrame({name: self.columns[name] for name in BESS_COLUMNS})
+
+
+def parse_bess(content):
+    """Extraire le tableau des étoiles sans construire l'arbre HTML de la page ; retourne un BessCatalogue"""
+    text = _decode(content)
+    start, end = find_table(text)
+
+    columns = {name: [] for name in BESS_COLUMNS}
+    for i, row in enumerate(iter_rows(text, start, end)):
+        if i < HEADER_ROWS or len(row) < 10:
+            continue
+        for j, name in enumerate(BESS_COLUMNS[:6]):
+            columns[name].append(row[j][0])
+        # date de la dernière observation et son code couleur
+        columns['date'].append(row[9][0])
+        columns['bgcolor'].append(row[9][1])
+    return BessCatalogue.from_text(columns)
+
+
+def bess_request(url=BESS_URL):
+    return parse_bess(fetch_bess(url).content).to_dataframe()
@@ -0,0 +1,672 @@
+"""Mesures de performance de Cosmos.
+
+Usage : python benchmarks.py <nom> [<nom> ...]   (sans argument : liste des mesures)
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+import numpy as np
+
+
+def synthetic_spectrum(n=20000, start=6400.0, stop=6700.0, noise=0.002, seed=0):
+    """Spectre synthétique normalisé avec les raies telluriques en absorption"""
+    from telluric import TELLURIC_LINES, voigt
+
+    rng = np.random.default_rng(seed)
+    x = np.linspace(start, stop, n)
+    y = np.ones(n)
+    for pos in TELLURIC_LINES:
+        depth = rng.uniform(0.05, 0.4)
+        sigma = rng.uniform(0.08, 0.15)
+        y -= voigt(x, depth * sigma * np.sqrt(2 * np.pi) / 0.6557, pos + rng.normal(0, 0.01), sigma)
+    y += rng.normal(0, noise, n)
+    return x, y
+
+
+def bench_telluric():
+    """Ajustement simultané (TelluricFitter) contre l'ajustement lmfit raie par raie"""
+    from data_processing import DataProcessor
+    from telluric import TelluricFitter, TELLURIC_LINES
+
+    x, y = synthetic_spectrum()
+    y_corrected = y - 1.0
+    processor = DataProcessor.__new__(DataProcessor)
+
+    t0 = time.perf_counter()
+    joint = TelluricFitter().remove(x, y_corrected)
+    t_joint = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    per_line = y_corrected.copy()
+    for pos in TELLURIC_LINES:
+        mask = (x > pos - 2) & (x < pos + 2)
+        try:
+            per_line[mask] -= processor.fit_voigt(x[mask], per_line[mask], center=pos).best_fit
+        except Exception as e:
+            print(f"lmfit: échec pour la raie {pos}: {e}")
+    t_lmfit = time.perf_counter() - t0
+
+    print(f"{len(x)} pixels, {len(TELLURIC_LINES)} raies")
+    print(f"  lmfit raie par raie : {t_lmfit:8.3f} s   résidu rms {np.std(per_line):.5f}")
+    print(f"  ajustement joint    : {t_joint:8.3f} s   résidu rms {np.std(joint):.5f}")
+    print(f"  gain                : x{t_lmfit / t_joint:.1f}")
+
+
+def bench_baseline():
+    """Ligne de base AsLS : résolution complète contre grille décimée (à froid et à chaud)"""
+    from pybaselines import Baseline
+    from baseline import FastBaseline
+
+    x, y = synthetic_spectrum(n=200000, start=6000.0, stop=7000.0)
+    y = y * (1 + 0.2 * np.sin((x - 6000) / 60))
+    settings = [(1e5, 0.95), (1e5, 0.96), (3e5, 0.96), (1e6, 0.97)]
+
+    fast = FastBaseline(x)
+    t_full = t_cold = t_warm = 0.0
+    errors = []
+    for i, (lam, p) in enumerate(settings):
+        t0 = time.perf_counter()
+        full, _ = Baseline(x_data=x).asls(y, lam=lam, p=p)
+        t_full += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        approx = fast.fit(y, lam=lam, p=p, warm_start=i > 0)
+        elapsed = time.perf_counter() - t0
+        if i == 0:
+            t_cold = elapsed
+        else:
+            t_warm += elapsed
+        errors.append(np.abs(approx - full) / np.median(full))
+
+    n_warm = len(settings) - 1
+    print(f"{len(x)} pixels, facteur de décimation {fast.factor}")
+    print(f"  résolution complète : {t_full / len(settings) * 1e3:8.1f} ms par réglage")
+    print(f"  décimée, à froid    : {t_cold * 1e3:8.1f} ms")
+    print(f"  décimée, à chaud    : {t_warm / n_warm * 1e3:8.1f} ms par réglage")
+    print(f"  écart relatif       : médian {np.median(errors):.2e}, max {np.max(errors):.2e}")
+
+
+def synthetic_bess_page(n=2000, seed=0):
+    """Page HTML ayant la structure de beam_belist2 (tableau des étoiles = 5e <table>)"""
+    rng = np.random.default_rng(seed)
+    menu = "".join(f"<table><tr><td><a href='#{i}'>Menu {i}</a></td></tr></table>" for i in range(4))
+    cells = "".join("<td>en-tête</td>" for _ in range(10))
+    rows = [f"<tr>{cells}</tr>", f"<tr>{cells}</tr>"]
+    for i in range(n):
+        ra = f"{rng.integers(24):02d} {rng.integers(60):02d} {rng.uniform(0, 60):04.1f}"
+        dec = f"{rng.choice(['+', '-'])}{rng.integers(90):02d} {rng.integers(60):02d} {rng.integers(60):02d}"
+        date = f"{rng.integers(1, 29):02d}/{rng.integers(1, 13):02d}/{rng.integers(2000, 2025)}"
+        color = rng.choice(['#FF0000', '#FFA500', '#00FF00'])
+        rows.append(f"<tr><td><a href='star{i}'>{i + 1}</a></td><td>HD {100000 + i}</td><td>{ra}</td>"
+                    f"<td>{dec}</td><td>{rng.uniform(2, 12):.2f}</td><td>B{rng.integers(10)}Ve</td>"
+                    f"<td>x</td><td>y</td><td>z</td><td bgcolor='{color}'>{date}</td></tr>")
+    footer = "<div>" + "<p>Lorem ipsum dolor sit amet</p>" * 2000 + "</div>"
+    return f"<html><body>{menu}<table>{''.join(rows)}</table>{footer}</body></html>".encode('utf-8')
+
+
+def _parse_bess_soup(content):
+    """Analyse d'origine (arbre BeautifulSoup complet, listes Python), pour comparaison"""
+    from bs4 import BeautifulSoup
+
+    table = BeautifulSoup(content, 'html.parser').find_all('table')[4]
+    columns = [[] for _ in range(8)]
+    for row in table.find_all('tr'):
+        tds = row.find_all('td')
+        if len(tds) > 1:
+            for i, j in enumerate((0, 1, 2, 3, 4, 5, 9)):
+                columns[i].append(tds[j].get_text(strip=True))
+            columns[7].append(tds[9].get('bgcolor', None))
+    return [column[2:] for column in columns]
+
+
+def bench_bess_parse(repeat=5):
+    """Analyse de la page ARASBEAM : BeautifulSoup complet contre l'analyseur ciblé (BESS_FIXTURE=page.html)"""
+    from bdd_processing import parse_bess
+
+    fixture = os.environ.get('BESS_FIXTURE')
+    if fixture:
+        with open(fixture, 'rb') as f:
+            content = f.read()
+    else:
+        content = synthetic_bess_page()
+
+    def best(func):
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = func(content)
+            times.append(time.perf_counter() - t0)
+        return min(times), result
+
+    t_soup, soup_columns = best(_parse_bess_soup)
+    t_stream, catalogue = best(parse_bess)
+    assert list(catalogue['hd']) == soup_columns[1] and list(catalogue['bgcolor']) == soup_columns[7]
+
+    print(f"{len(content) / 1024:.0f} ko, {len(catalogue)} étoiles ({fixture or 'page synthétique'})")
+    print(f"  BeautifulSoup       : {t_soup * 1e3:8.1f} ms (colonnes texte)")
+    print(f"  analyseur ciblé     : {t_stream * 1e3:8.1f} ms (colonnes typées)")
+    print(f"  gain                : x{t_soup / t_stream:.1f}")
+    print(f"  illisibles          : ad {np.isnan(catalogue['ra_deg']).sum()}, dec {np.isnan(catalogue['dec_deg']).sum()}, "
+          f"mag {np.isnan(catalogue['mag_value']).sum()}, date {np.isnat(catalogue['date_value']).sum()}")
+
+
+def synthetic_bess_catalogue(n=100000, seed=0):
+    """BessCatalogue synthétique de n étoiles (sans passer par le HTML)"""
+    from bdd_processing import BessCatalogue
+
+    rng = np.random.default_rng(seed)
+    ra = rng.uniform(0, 24, n)
+    dec = rng.uniform(-90, 90, n)
+    columns = {
+        'id': [str(i + 1) for i in range(n)],
+        'hd': [f"HD {100000 + i}" for i in range(n)],
+        'ad': [f"{int(h):02d} {int(h * 60 % 60):02d} {h * 3600 % 60:04.1f}" for h in ra],
+        'dec': [f"{'-' if d < 0 else '+'}{int(abs(d)):02d} {int(abs(d) * 60 % 60):02d} {int(abs(d) * 3600 % 60):02d}"
+                for d in dec],
+        'mag': [f"{m:.2f}" for m in rng.uniform(2, 12, n)],
+        'sptype': [f"B{k}Ve" for k in rng.integers(0, 10, n)],
+        'date': [f"{d:02d}/{m:02d}/{y}" for d, m, y in zip(rng.integers(1, 29, n), rng.integers(1, 13, n),
+                                                            rng.integers(2000, 2025, n))],
+        'bgcolor': list(rng.choice(['#FF0000', '#FFA500', '#00FF00'], n)),
+    }
+    return BessCatalogue.from_text(columns)
+
+
+def bench_bess_table(n=100000):
+    """Tableau du catalogue BeSS (modèle + proxy) : chargement, tri, filtres et défilement sur n lignes"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtWidgets import QApplication, QTableView
+    from PySide6.QtCore import Qt
+    from bess_model import BessTableModel, BessFilterProxy
+
+    catalogue = synthetic_bess_catalogue(n)
+    app = QApplication.instance() or QApplication([])
+    model = BessTableModel()
+    proxy = BessFilterProxy()
+    proxy.setSourceModel(model)
+    view = QTableView()
+    view.setModel(proxy)
+    view.setSortingEnabled(True)
+    view.resize(900, 700)
+    view.show()
+    app.processEvents()
+
+    def measure(label, func):
+        t0 = time.perf_counter()
+        func()
+        app.processEvents()
+        print(f"  {label:26s}: {(time.perf_counter() - t0) * 1e3:8.1f} ms ({proxy.rowCount()} lignes)")
+
+    print(f"{n} étoiles")
+    measure("chargement", lambda: model.set_catalogue(catalogue))
+    measure("tri mag (1re fois)", lambda: view.sortByColumn(4, Qt.AscendingOrder))
+    measure("tri mag décroissant", lambda: view.sortByColumn(4, Qt.DescendingOrder))
+    measure("tri HD (1re fois)", lambda: view.sortByColumn(1, Qt.AscendingOrder))
+    measure("tri HD décroissant", lambda: view.sortByColumn(1, Qt.DescendingOrder))
+    for text in ["h", "hd", "hd 1", "hd 12", "hd 123"]:
+        measure(f"filtre texte '{text}'", lambda: proxy.set_text_filter(text))
+    measure("filtre mag <= 6", lambda: proxy.set_range_filter('mag_value', maximum=6.0))
+    measure("défilement en bas", view.scrollToBottom)
+    view.close()
+
+
+def bench_observability(sizes=(3000, 100000)):
+    """Observabilité nocturne : grille de la nuit (1er appel, autre date, cache) et N étoiles,
+    comparée à une transformation AltAz astropy complète (N x T) sur un petit échantillon"""
+    from observability import night_grid, observability, altitude, coordinates_of_date
+    import config
+
+    latitude, longitude, height = config.SITE
+    t0 = time.perf_counter()
+    night = night_grid("2024-03-01", latitude, longitude, height)
+    print(f"grille de la nuit (1er appel)  : {(time.perf_counter() - t0) * 1e3:8.1f} ms ({len(night.times)} instants)")
+    t0 = time.perf_counter()
+    night_grid("2024-03-02", latitude, longitude, height)
+    print(f"grille de la nuit (autre date) : {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+    t0 = time.perf_counter()
+    night_grid("2024-03-01", latitude, longitude, height)
+    print(f"grille de la nuit (cache)      : {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        ra = rng.uniform(0, 360, n)
+        dec = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+        t0 = time.perf_counter()
+        result = observability(ra, dec, night)
+        elapsed = time.perf_counter() - t0
+        print(f"{n:7d} étoiles : {elapsed * 1e3:8.1f} ms ({(result['obs_hours'] > 0).sum()} observables)")
+
+    # Référence : transformation astropy complète pour quelques étoiles
+    from astropy.time import Time
+    from astropy.coordinates import SkyCoord, EarthLocation, AltAz
+    import astropy.units as u
+
+    n = 200
+    ra = rng.uniform(0, 360, n)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    location = EarthLocation(lat=latitude * u.deg, lon=longitude * u.deg, height=height * u.m)
+    obstime = Time(night.times.astype('datetime64[ms]').astype(str), scale='utc')
+    t0 = time.perf_counter()
+    frame = AltAz(obstime=obstime[None, :], location=location)
+    reference = SkyCoord(ra=ra[:, None] * u.deg, dec=dec[:, None] * u.deg).transform_to(frame).alt.deg
+    elapsed = time.perf_counter() - t0
+    fast = altitude(*coordinates_of_date(ra, dec, night), night)
+    print(f"astropy AltAz N x T ({n} étoiles) : {elapsed * 1e3:8.1f} ms, "
+          f"écart max {np.abs(fast - reference).max():.4f}°")
+
+
+def synthetic_fits_image(path, shape=(6000, 8000), seed=0):
+    """Image FITS uint16 (BZERO = 32768) de la taille d'un capteur CMOS"""
+    from astropy.io import fits
+
+    rng = np.random.default_rng(seed)
+    data = rng.normal(1000, 30, shape).astype(np.uint16)
+    fits.PrimaryHDU(data).writeto(path, overwrite=True)
+    return path
+
+
+def bench_image_viewer(shape=(6000, 8000)):
+    """Ouverture d'une grande image FITS : lecture complète + rotation + min/max + lissage (avant)
+    contre memory-map + pyramide sur disque + niveaux échantillonnés (IMAGE_FIXTURE=image.fits)"""
+    import tempfile
+    import pyqtgraph as pg
+    from astropy.io import fits
+    from image_pyramid import ImagePyramid, sample_levels
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.environ.get('IMAGE_FIXTURE') or synthetic_fits_image(os.path.join(tmp, "image.fits"), shape)
+
+        def before():
+            with fits.open(path) as hdul:
+                data = hdul[0].data
+            rotated = np.rot90(data, 3)
+            return rotated.min(), rotated.max(), pg.gaussianFilter(rotated, (2, 2))
+
+        def after(cache_root):
+            pyramid = ImagePyramid.from_file(path, cache_root=cache_root)
+            levels = sample_levels(pyramid.levels[0], scaling=pyramid.scaling)
+            overview = pyramid.overview()
+            pg.gaussianFilter(overview, (2, 2))
+            return pyramid, levels
+
+        print(f"{path} {fits.getdata(path).shape}")
+        t0 = time.perf_counter()
+        before()
+        print(f"  lecture complète    : {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+        cache_root = os.path.join(tmp, "pyramids")
+        t0 = time.perf_counter()
+        pyramid, levels = after(cache_root)
+        print(f"  pyramide (création) : {(time.perf_counter() - t0) * 1e3:8.1f} ms ({len(pyramid.levels)} niveaux)")
+        t0 = time.perf_counter()
+        after(cache_root)
+        print(f"  pyramide (cache)    : {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+        t0 = time.perf_counter()
+        for ty, tx in pyramid.tiles(0, 0, 2000, 0, 2000):
+            pyramid.tile(0, ty, tx)
+        print(f"  16 tuiles niveau 0  : {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+        del pyramid
+
+
+def bench_isocurve(shape=(2000, 2000), factor=4):
+    """Isocourbes : image lissée pleine résolution (avant) contre image réduite de factor (moteur)"""
+    import pyqtgraph as pg
+    from isocurve import isocurve_path
+
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:shape[0], 0:shape[1]]
+    data = (1000 + 500 * np.exp(-((x - shape[1] / 2) ** 2 + (y - shape[0] / 2) ** 2) / (shape[0] ** 2 / 8))
+            + rng.normal(0, 20, shape)).astype(np.float32)
+    level = 1200.0
+
+    t0 = time.perf_counter()
+    smoothed = pg.gaussianFilter(data, (2, 2))
+    pg.isocurve(smoothed.T, level, connected=True)
+    print(f"{shape} pleine résolution : {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+
+    t0 = time.perf_counter()
+    small = data[:shape[0] // factor * factor, :shape[1] // factor * factor]
+    small = small.reshape(shape[0] // factor, factor, shape[1] // factor, factor).mean(axis=(1, 3))
+    isocurve_path(pg.gaussianFilter(small, (2, 2)), level)
+    print(f"réduite x{factor} (moteur)         : {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+
+
+def bench_roi_profile(shape=(4000, 4000), moves=200):
+    """Profil d'une ROI : getArrayRegion + moyenne (avant) contre table des sommes cumulées"""
+    import tempfile
+    from image_pyramid import ImagePyramid
+    from roi_profile import SummedAreaTable
+
+    rng = np.random.default_rng(0)
+    data = rng.normal(1000, 30, shape).astype(np.float32)
+    with tempfile.TemporaryDirectory() as tmp:
+        pyramid = ImagePyramid(data, cache_dir=os.path.join(tmp, "pyramid"))
+        pyramid.build()
+        t0 = time.perf_counter()
+        sat = SummedAreaTable(pyramid)
+        print(f"{shape} table (niveau {sat.level}): {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+
+        t0 = time.perf_counter()
+        for i in range(moves):
+            x0, row0 = 100 + i, 200 + i
+            sat.profile(x0, x0 + 2000, row0, row0 + 1500)
+        print(f"  profil (table)          : {(time.perf_counter() - t0) / moves * 1e3:8.3f} ms")
+
+        t0 = time.perf_counter()
+        for i in range(moves // 20):
+            x0, row0 = 100 + i, 200 + i
+            np.array(data[row0:row0 + 1500, x0:x0 + 2000]).mean(axis=0)  # copie + moyenne, sans interpolation
+        print(f"  profil (copie + moyenne): {(time.perf_counter() - t0) / (moves // 20) * 1e3:8.3f} ms")
+        del pyramid
+
+
+def synthetic_frames(n=100, shape=(200, 2000), cosmics=20, seed=0):
+    """Poses 2D d'un spectre horizontal (trace gaussienne, ciel, bruit, cosmiques) et spectre vrai"""
+    rng = np.random.default_rng(seed)
+    rows, cols = shape
+    x = np.arange(cols)
+    spectrum = 200 * (1 - 0.5 * np.exp(-(x - cols / 2) ** 2 / 50))
+    profile = np.exp(-(np.arange(rows)[:, None] - rows / 2) ** 2 / 8.0)
+    profile /= profile.sum()
+    frames = rng.poisson(50 + spectrum * profile, (n, rows, cols)).astype(np.float32)
+    frames += rng.normal(0, 5, frames.shape).astype(np.float32)
+    for frame in frames:
+        frame[rng.integers(rows // 2 - 5, rows // 2 + 6, cosmics), rng.integers(0, cols, cosmics)] += 5000
+    return frames, spectrum
+
+
+def bench_extraction(n=100):
+    """Extraction de n poses : optimale vectorisée (par paquets) contre somme simple de l'ouverture"""
+    from extraction import optimal_extract, find_aperture, CHUNK_FRAMES
+
+    frames, spectrum = synthetic_frames(n)
+    aperture = find_aperture(frames[0])
+    t0 = time.perf_counter()
+    results = [optimal_extract(frames[i:i + CHUNK_FRAMES], aperture) for i in range(0, n, CHUNK_FRAMES)]
+    elapsed = time.perf_counter() - t0
+    flux = np.concatenate([result['flux'] for result in results])
+    standard = np.concatenate([result['standard'] for result in results])
+    print(f"{n} poses {frames.shape[1:]} : {elapsed:6.2f} s ({elapsed / n * 1e3:.1f} ms/pose, un processus)")
+    print(f"  écart type / spectre vrai : optimale {np.std(flux - spectrum):6.1f}, "
+          f"somme simple {np.std(standard - spectrum):6.1f}")
+
+
+def bench_frame_combine(n=20, shape=(2000, 3000), memory=64):
+    """Combinaison médiane de n poses : pile complète en mémoire (avant) contre bandes à mémoire bornée (memory Mo)"""
+    import resource
+    import tempfile
+    from astropy.io import fits
+    from frame_combine import combine
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_names = [synthetic_fits_image(os.path.join(tmp, f"pose{i}.fits"), shape, seed=i) for i in range(n)]
+        print(f"{n} poses {shape} uint16 ({n * shape[0] * shape[1] * 4 / 1024**2:.0f} Mo en float32)")
+
+        # en premier : le pic mémoire du processus n'inclut pas encore la pile complète
+        out_name = os.path.join(tmp, "master.fits")
+        _, chunk, elapsed = combine(file_names, out_name, method="median", memory=memory * 1024**2, workers=1)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"  bandes ({memory} Mo, {chunk} lignes) : {elapsed:6.2f} s, pic {peak:6.0f} Mo")
+
+        t0 = time.perf_counter()
+        stack = np.array([fits.getdata(file_name).astype(np.float32) for file_name in file_names])
+        reference = np.median(stack, axis=0)
+        elapsed = time.perf_counter() - t0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"  pile complète        : {elapsed:6.2f} s, pic {peak:6.0f} Mo")
+        print(f"  écart max : {np.abs(fits.getdata(out_name) - reference).max()}")
+        del stack
+
+
+def synthetic_cosmic_frame(shape=(2000, 2000), stars=300, cosmics=1000, gain=1.0, read_noise=5.0, seed=0):
+    """Pose 2D (ciel, trace de spectre, étoiles FWHM ~3 px, bruit) touchée par des cosmiques :
+    impacts et traces de 1 à 5 pixels. Retourne (image, masque vrai)"""
+    rng = np.random.default_rng(seed)
+    rows, cols = shape
+    image = np.full(shape, 200.0)
+    image += 3000 * np.exp(-0.5 * ((np.arange(rows)[:, None] - rows / 2) / 1.3) ** 2)
+    sigma = 1.3
+    for r, c, flux in zip(rng.uniform(0, rows, stars), rng.uniform(0, cols, stars), rng.uniform(200, 20000, stars)):
+        r0, r1, c0, c1 = int(max(0, r - 8)), int(min(rows, r + 9)), int(max(0, c - 8)), int(min(cols, c + 9))
+        y, x = np.mgrid[r0:r1, c0:c1]
+        image[r0:r1, c0:c1] += flux / (2 * np.pi * sigma ** 2) * np.exp(-0.5 * ((y - r) ** 2 + (x - c) ** 2) / sigma ** 2)
+    image = rng.poisson(image * gain) / gain + rng.normal(0, read_noise / gain, shape)
+    truth = np.zeros(shape, dtype=bool)
+    for _ in range(cosmics):
+        r, c = rng.integers(5, rows - 5), rng.integers(5, cols - 5)
+        angle = rng.uniform(0, np.pi)
+        for t in range(rng.integers(1, 6)):
+            rr, cc = int(round(r + t * np.sin(angle))), int(round(c + t * np.cos(angle)))
+            image[rr, cc] += rng.uniform(300, 5000)
+            truth[rr, cc] = True
+    return image.astype(np.float32), truth
+
+
+def _lacosmic_reference(image, gain=1.0, read_noise=5.0, sigclip=4.5, sigfrac=0.3, objlim=5.0, iterations=4):
+    """L.A.Cosmic littéral : sur-échantillonnage 2x, convolution et médianes pleine image"""
+    from scipy import ndimage
+
+    kernel = np.array([[0, -1, 0], [-1, 4, -1], [0, -1, 0]], dtype=np.float32)
+    clean = image.astype(np.float32)
+    mask = np.zeros(image.shape, dtype=bool)
+    square = np.ones((3, 3), dtype=bool)
+    for _ in range(iterations):
+        big = np.repeat(np.repeat(clean, 2, axis=0), 2, axis=1)
+        lplus = np.clip(ndimage.convolve(big, kernel, mode='nearest'), 0, None)
+        lplus = lplus.reshape(clean.shape[0], 2, clean.shape[1], 2).mean(axis=(1, 3))
+        noise = np.sqrt(np.clip(ndimage.median_filter(clean, 5), 1e-4, None) * gain + read_noise ** 2) / gain
+        s = lplus / (2 * noise)
+        sprime = s - ndimage.median_filter(s, 5, mode='reflect')
+        med3 = ndimage.median_filter(clean, 3, mode='reflect')
+        fine = (med3 - ndimage.median_filter(med3, 7, mode='reflect')) / noise
+        cosmics = (sprime > sigclip) & (s / np.clip(fine, 0.01, None) > objlim)
+        cosmics |= ndimage.binary_dilation(cosmics, square) & (sprime > sigclip)
+        cosmics |= ndimage.binary_dilation(cosmics, square) & (sprime > sigfrac * sigclip)
+        new = cosmics & ~mask
+        if not new.any():
+            break
+        mask |= new
+        clean[new] = ndimage.median_filter(clean, 5)[new]
+    return clean, mask
+
+
+def bench_cosmic(shape=(2000, 2000), iterations=2):
+    """Rejet des cosmiques : L.A.Cosmic littéral pleine image (avant) contre version par tuiles
+    (médianes aux seuls candidats, threads), sur une pose synthétique"""
+    import cosmic
+
+    image, truth = synthetic_cosmic_frame(shape)
+    print(f"pose {shape}, {truth.sum()} pixels touchés par des cosmiques")
+
+    def score(mask):
+        return f"détectés {(mask & truth).sum() / truth.sum():6.1%}, faux positifs {(mask & ~truth).sum()}"
+
+    t0 = time.perf_counter()
+    _, mask = _lacosmic_reference(image, iterations=iterations)
+    print(f"  pleine image (avant)  : {time.perf_counter() - t0:6.2f} s, {score(mask)}")
+    for workers in sorted({1, os.cpu_count() or 1}):
+        t0 = time.perf_counter()
+        _, mask = cosmic.detect_cosmics(image, workers=workers, iterations=iterations)
+        print(f"  tuiles, {workers} thread(s)   : {time.perf_counter() - t0:6.2f} s, {score(mask)}")
+
+
+def _write_frames(folder, shape, rate, seconds, stop, seed=0):
+    """Écriture de poses uint16 à rate poses/s comme un logiciel d'acquisition (en-tête puis données par morceaux)"""
+    from astropy.io import fits
+
+    rng = np.random.default_rng(seed)
+    frames = [rng.normal(1000, 30, shape).astype(np.uint16) for _ in range(4)]
+    header = fits.PrimaryHDU(frames[0]).header.tostring().encode('ascii')
+    index, t0 = 0, time.perf_counter()
+    while not stop.is_set() and time.perf_counter() - t0 < seconds:
+        data = (frames[index % len(frames)].astype('>i4') - 32768).astype('>i2').tobytes()
+        data += b"\0" * (-len(data) % 2880)
+        with open(os.path.join(folder, f"frame{index:05d}.fits"), "wb") as f:
+            f.write(header)
+            for part in range(4):
+                f.write(data[part * len(data) // 4:(part + 1) * len(data) // 4])
+                f.flush()
+        index += 1
+        time.sleep(max(0.0, t0 + index / rate - time.perf_counter()))
+    return index
+
+
+def bench_live_watch(shape=(1000, 1500), rate=30, seconds=5):
+    """Mode direct : poses écrites à rate poses/s dans un dossier, lues dans le tampon circulaire et affichées
+    (page FITS 2D hors écran) ; comparé à l'ouverture normale d'une pose (pyramide, table, isocourbes)"""
+    import tempfile
+    import threading
+    if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtCore import QTimer
+    import ui
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    page = ui.ImagePage()
+    page.resize(900, 900)
+    page.show()
+    with tempfile.TemporaryDirectory() as tmp:
+        written = []
+        stop = threading.Event()
+        page.start_live(tmp)
+        writer = threading.Thread(target=lambda: written.append(_write_frames(tmp, shape, rate, seconds, stop)))
+        writer.start()
+        QTimer.singleShot(int((seconds + 0.5) * 1000), app.quit)
+        app.exec()
+        stop.set()
+        writer.join()
+        watcher = page.live_watcher
+        latencies = np.array(watcher.latencies) * 1e3
+        print(f"{written[0]} poses {shape} écrites à {rate} poses/s : {watcher.summary()}")
+        if len(latencies):
+            print(f"  latence écriture -> affichage : médiane {np.median(latencies):6.1f} ms, "
+                  f"95 % {np.percentile(latencies, 95):6.1f} ms, max {latencies.max():6.1f} ms")
+        ring = watcher.ring
+        print(f"  tampon circulaire : {ring.capacity} x {ring.shape} ({ring.frames.nbytes / 1024**2:.0f} Mo, alloué une fois)")
+        page.liveButton.setChecked(False)
+
+        file_name = os.path.join(tmp, "frame00000.fits")
+        t0 = time.perf_counter()
+        page.image_processor.show_image(page.image_processor.prepare_image(file_name))
+        print(f"  ouverture normale d'une pose : {(time.perf_counter() - t0) * 1e3:6.1f} ms")
+    page.close()
+
+
+def bench_degrade(resolutions=(1000, 5000, 15000)):
+    """Référence MELCHIORS superposée : noyaux gaussiens fixes sur tout le spectre (astropy, avant)
+    contre noyau déduit de R, FFT sur le domaine observé et rééchantillonnage"""
+    from astropy.convolution import convolve, Gaussian1DKernel
+    from degrade import degrade, MELCHIORS_RESOLUTION, FWHM_TO_SIGMA
+
+    # référence synthétique au pas MELCHIORS (raies de FWHM lambda / 85000)
+    wave = np.arange(3800.0, 9000.0, 0.02)
+    flux = np.ones_like(wave)
+    for center in np.arange(4000.0, 8900.0, 50.0):
+        sigma = center / MELCHIORS_RESOLUTION * FWHM_TO_SIGMA
+        window = slice(np.searchsorted(wave, center - 1), np.searchsorted(wave, center + 1))
+        flux[window] -= 0.5 * np.exp(-0.5 * ((wave[window] - center) / sigma) ** 2)
+    print(f"référence : {len(wave)} points")
+
+    for width in (80, 1):
+        t0 = time.perf_counter()
+        convolve(flux, Gaussian1DKernel(width))
+        print(f"  Gaussian1DKernel({width:2d}), tout le spectre (avant) : {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+    degrade(wave, flux, np.arange(6400.0, 6700.0, 1.0), 1000)  # import de scipy.signal
+    for resolution in resolutions:
+        target = np.arange(6400.0, 6700.0, 6550.0 / resolution / 2.5)
+        t0 = time.perf_counter()
+        degraded = degrade(wave, flux, target, resolution)
+        elapsed = time.perf_counter() - t0
+        # largeur de la raie à 6550 Å : largeur équivalente / profondeur (gaussienne)
+        line = (target > 6530) & (target < 6570)
+        depth = 1 - degraded[line]
+        fwhm = np.trapz(depth, target[line]) / depth.max() * 2 * np.sqrt(np.log(2) / np.pi)
+        print(f"  R = {resolution:5d}, 6400-6700 Å ({len(target):4d} points) : {elapsed * 1e3:8.1f} ms, "
+              f"FWHM {fwhm:.2f} Å (attendu {6550.0 / resolution:.2f})")
+
+
+# Bibliothèques qui ne doivent pas être importées au démarrage de l'interface
+HEAVY_MODULES = ['lmfit', 'pybaselines', 'cv2', 'matplotlib', 'bs4', 'astroquery', 'pandas']
+
+_STARTUP_SCRIPT = """
+import sys, time, json
+t0 = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QObject, QEvent
+import ui
+t_import = time.perf_counter() - t0
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and not hasattr(self, 'elapsed'):
+            self.elapsed = time.perf_counter() - t0
+            app.quit()
+        return False
+
+app = QApplication(sys.argv)
+with open("styles.qss", "r") as f:
+    app.setStyleSheet(f.read())
+window = ui.MainWindow()
+first_paint = FirstPaint()
+window.home_page.installEventFilter(first_paint)
+window.show()
+app.exec()
+heavy = [name for name in HEAVY if name in sys.modules]
+print(json.dumps({'import': t_import, 'paint': first_paint.elapsed, 'heavy': heavy}))
+"""
+
+
+def bench_startup(runs=5):
+    """Démarrage de l'interface : import de ui et premier affichage de la fenêtre (processus neufs)"""
+    env = dict(os.environ)
+    if not env.get('DISPLAY') and not env.get('WAYLAND_DISPLAY'):
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    script = "HEAVY = " + repr(HEAVY_MODULES) + "\n" + _STARTUP_SCRIPT
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", script], env=env, cwd=cwd,
+                                capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    imports = [result['import'] for result in results]
+    paints = [result['paint'] for result in results]
+    print(f"{runs} démarrages")
+    print(f"  import de ui        : médiane {np.median(imports) * 1e3:7.0f} ms (min {min(imports) * 1e3:.0f})")
+    print(f"  premier affichage   : médiane {np.median(paints) * 1e3:7.0f} ms (min {min(paints) * 1e3:.0f})")
+    heavy = sorted(set(name for result in results for name in result['heavy']))
+    if heavy:
+        print(f"  RÉGRESSION : importés au démarrage : {', '.join(heavy)}")
+    else:
+        print("  aucune bibliothèque lourde importée au démarrage")
+
+
+BENCHMARKS = {
+    'telluric': bench_telluric,
+    'baseline': bench_baseline,
+    'startup': bench_startup,
+    'bess_parse': bench_bess_parse,
+    'bess_table': bench_bess_table,
+    'observability': bench_observability,
+    'image_viewer': bench_image_viewer,
+    'isocurve': bench_isocurve,
+    'roi_profile': bench_roi_profile,
+    'extraction': bench_extraction,
+    'frame_combine': bench_frame_combine,
+    'cosmic': bench_cosmic,
+    'live_watch': bench_live_watch,
+    'degrade': bench_degrade,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:]
+    if not names:
+        for name, func in BENCHMARKS.items():
+            print(f"{name:12s} {func.__doc__}")
+    for name in names:
+        print(f"== {name}")
+        BENCHMARKS[name]()
@@ -0,0 +1,288 @@
+import numpy as np
+from PySide6.QtCore import Qt, QAbstractTableModel, QAbstractProxyModel, QModelIndex, Signal
+from PySide6.QtGui import QColor
+
+from bdd_processing import parse_float
+
+
+DISPLAY_COLUMNS = ['id', 'hd', 'ad', 'dec', 'mag', 'sptype', 'date']
+
+# Colonne typée utilisée pour trier une colonne affichée
+TYPED_SORT_KEYS = {'ad': 'ra_deg', 'dec': 'dec_deg', 'mag': 'mag_value', 'date': 'date_value'}
+
+# Format d'affichage des colonnes calculées (voir set_columns)
+COLUMN_FORMATS = {'alt_max': "{:.1f}", 'airmass': "{:.2f}", 'obs_hours': "{:.1f}"}
+
+
+class BessTableModel(QAbstractTableModel):
+    """Modèle Qt sur un BessCatalogue (colonnes numpy) : rien n'est copié, les cellules
+    visibles sont lues à la demande et la couleur de la colonne date vient de bgcolor.
+    Des colonnes calculées (observabilité, ...) peuvent être ajoutées avec set_columns.
+    """
+
+    columnsUpdated = Signal(list)
+
+    def __init__(self, catalogue=None, parent=None):
+        super().__init__(parent)
+        self.catalogue = catalogue
+        self.columns = list(DISPLAY_COLUMNS)
+        self._colors = {}
+        self._sort_keys = {}
+
+    def set_catalogue(self, catalogue):
+        self.beginResetModel()
+        self.catalogue = catalogue
+        self.columns = list(DISPLAY_COLUMNS)
+        self._sort_keys = {}
+        self.endResetModel()
+
+    def set_columns(self, values):
+        """Ajouter ou remplacer des colonnes calculées : dict nom -> tableau de longueur len(catalogue)"""
+        new = [name for name in values if name not in self.columns]
+        if new:
+            self.beginInsertColumns(QModelIndex(), len(self.columns), len(self.columns) + len(new) - 1)
+        self.catalogue.columns.update(values)
+        for name in values:
+            self._sort_keys.pop(name, None)
+        if new:
+            self.columns.extend(new)
+            self.endInsertColumns()
+        elif self.rowCount():
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, len(self.columns) - 1))
+        self.columnsUpdated.emit(list(values))
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.catalogue is None:
+            return 0
+        return len(self.catalogue)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.columns[section]
+        return str(section + 1)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        name = self.columns[index.column()]
+        if role == Qt.DisplayRole:
+            return self.display(name, self.catalogue[name][index.row()])
+        if role == Qt.BackgroundRole and name == 'date':
+            return self.color(self.catalogue['bgcolor'][index.row()])
+        return None
+
+    @staticmethod
+    def display(name, value):
+        if value is None:
+            return ""
+        if isinstance(value, np.datetime64):
+            return "" if np.isnat(value) else str(value)[11:16]  # heure UTC
+        if isinstance(value, float):
+            return "" if np.isnan(value) else COLUMN_FORMATS.get(name, "{}").format(value)
+        return str(value)
+
+    def color(self, name):
+        """QColor d'un code couleur HTML (une seule instance par couleur)"""
+        if not isinstance(name, str) or not name:
+            return None
+        color = self._colors.get(name)
+        if color is None:
+            color = self._colors[name] = QColor(name)
+        return color
+
+    def sort_key(self, column):
+        """Clé de tri de la colonne : float (NaN en dernier) ou chaînes ; calculée une fois par catalogue"""
+        name = self.columns[column]
+        key = self._sort_keys.get(name)
+        if key is None:
+            column = self.catalogue[TYPED_SORT_KEYS.get(name, name)]
+            if column.dtype.kind in 'fM':
+                key = column
+                if key.dtype.kind == 'M':
+                    key = np.where(np.isnat(key), np.nan, key.astype('int64').astype(np.float64))
+            elif name == 'sptype':
+                key = self.catalogue.sptype_codes
+            else:
+                key = self.catalogue[name].astype(str)
+                if name == 'id':
+                    numbers = parse_float(key)
+                    if len(numbers) and not np.isnan(numbers).any():
+                        key = numbers  # identifiants numériques : 2 avant 10
+            self._sort_keys[name] = key
+        return key
+
+    def sort_order(self, column, order=Qt.AscendingOrder):
+        """Permutation des lignes du catalogue triées selon column"""
+        key = self.sort_key(column)
+        if order == Qt.DescendingOrder:
+            if key.dtype.kind == 'f':
+                return np.argsort(-key, kind='stable')  # NaN toujours en dernier
+            return np.argsort(key, kind='stable')[::-1]
+        return np.argsort(key, kind='stable')
+
+
+class BessFilterProxy(QAbstractProxyModel):
+    """Tri et filtrage vectorisés du catalogue.
+
+    Les lignes visibles sont un tableau d'indices (ordre de tri puis masque booléen) :
+    trier ou filtrer 100 000 lignes ne demande que quelques opérations numpy. Les
+    filtres sont des masques nommés combinés par ET (set_mask), ce qui permet à
+    d'autres critères (visibilité, constellation, ...) de s'y ajouter.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.masks = {}
+        self.order = None
+        self.sort_column = -1
+        self.sort_direction = Qt.AscendingOrder
+        self.rows = np.zeros(0, dtype=np.intp)
+        self._source_rows = np.zeros(0, dtype=np.intp)
+        self._text = ""
+        self._search_keys = None
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.modelReset.connect(self._on_source_reset)
+        model.columnsUpdated.connect(self._on_columns_updated)
+        self._on_source_reset()
+
+    def _on_columns_updated(self, names):
+        # nouvelles colonnes ou valeurs modifiées : le tri en cours est recalculé si besoin
+        source = self.sourceModel()
+        if 0 <= self.sort_column < len(source.columns) and source.columns[self.sort_column] in names:
+            self.order = source.sort_order(self.sort_column, self.sort_direction)
+        self._update()
+
+    def _on_source_reset(self):
+        self.masks = {}
+        self.order = None
+        self._text = ""
+        self._search_keys = None
+        # une colonne calculée n'existe plus après un reset : tri réappliqué par _on_columns_updated
+        if 0 <= self.sort_column < self.sourceModel().columnCount():
+            self.order = self.sourceModel().sort_order(self.sort_column, self.sort_direction)
+        self._update()
+
+    # --- filtres ---
+
+    def set_mask(self, name, mask):
+        """Ajouter (ou retirer si mask est None) un filtre booléen sur les lignes du catalogue"""
+        if mask is None:
+            self.masks.pop(name, None)
+        else:
+            self.masks[name] = np.asarray(mask, dtype=bool)
+        self._update()
+
+    def set_text_filter(self, text):
+        """Filtre sur id, HD et type spectral ; une frappe supplémentaire ne teste que les lignes déjà retenues"""
+        text = text.strip().lower()
+        catalogue = self.sourceModel().catalogue
+        if not text or catalogue is None:
+            self._text = ""
+            self.set_mask('text', None)
+            return
+
+        if self._search_keys is None:
+            # Chaînes Python : « in » sur une liste est bien plus rapide que np.char.find
+            self._search_keys = [f"{star_id}\t{hd}\t{sptype}".lower() for star_id, hd, sptype
+                                 in zip(catalogue['id'], catalogue['hd'], catalogue['sptype'])]
+
+        previous = self.masks.get('text')
+        if previous is not None and self._text and text.startswith(self._text):
+            candidates = np.flatnonzero(previous)
+        else:
+            candidates = np.arange(len(catalogue))
+        keys = self._search_keys
+        mask = np.zeros(len(catalogue), dtype=bool)
+        mask[candidates] = np.fromiter((text in keys[i] for i in candidates), dtype=bool, count=len(candidates))
+        self._text = text
+        self.set_mask('text', mask)
+
+    def set_range_filter(self, name, minimum=None, maximum=None):
+        """Filtre numérique sur une colonne typée (ex. mag_value) ; bornes None = pas de limite"""
+        if minimum is None and maximum is None:
+            self.set_mask(name, None)
+            return
+        values = self.sourceModel().catalogue[name]
+        mask = np.ones(len(values), dtype=bool)
+        if minimum is not None:
+            mask &= values >= minimum
+        if maximum is not None:
+            mask &= values <= maximum
+        self.set_mask(name, mask)
+
+    def visible_rows(self):
+        """Indices (dans le catalogue) des lignes affichées, dans l'ordre d'affichage"""
+        return self.rows
+
+    # --- tri ---
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if self.sourceModel() is None or self.sourceModel().catalogue is None:
+            return
+        self.sort_column = column
+        self.sort_direction = order
+        self.order = self.sourceModel().sort_order(column, order)
+        self._update()
+
+    def _update(self):
+        source = self.sourceModel()
+        n = source.rowCount() if source is not None else 0
+        rows = self.order if self.order is not None and len(self.order) == n else np.arange(n)
+        if self.masks:
+            mask = np.ones(n, dtype=bool)
+            for m in self.masks.values():
+                mask &= m
+            rows = rows[mask[rows]]
+
+        self.beginResetModel()
+        self.rows = np.ascontiguousarray(rows, dtype=np.intp)
+        self._source_rows = np.full(n, -1, dtype=np.intp)
+        self._source_rows[self.rows] = np.arange(len(self.rows))
+        self.endResetModel()
+
+    # --- correspondance proxy <-> source ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        source = self.sourceModel()
+        return 0 if parent.isValid() or source is None else source.columnCount()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < len(self.rows)) or not (0 <= column < self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(int(self.rows[proxy_index.row()]), proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = self._source_rows[source_index.row()]
+        return QModelIndex() if row < 0 else self.createIndex(int(row), source_index.column())
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        return self.sourceModel().data(self.mapToSource(index), role)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal:
+            return self.sourceModel().headerData(section, orientation, role)
+        if role == Qt.DisplayRole:
+            return str(section + 1)
+        return None
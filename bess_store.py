@@ -0,0 +1,132 @@
+import os
+import time
+import sqlite3
+from contextlib import contextmanager
+
+import numpy as np
+
+import config
+from bdd_processing import (BESS_URL, BESS_COLUMNS, TYPED_COLUMNS, BessCatalogue, fetch_bess, parse_bess,
+                            find_constellations)
+
+
+SCHEMA_VERSION = 3  # 2 : colonnes typées (ra_deg, dec_deg, mag_value, date_value) ; 3 : constellation
+
+COLUMNS = BESS_COLUMNS + TYPED_COLUMNS
+
+
+class BessStore:
+    """Catalogue BeSS local (SQLite).
+
+    Affichable immédiatement et hors-ligne ; refresh() interroge ARASBEAM avec une
+    requête conditionnelle (ETag / If-Modified-Since) et n'applique que les lignes
+    ajoutées, modifiées ou supprimées.
+    """
+
+    def __init__(self, path=None, url=BESS_URL, offline=None, timeout=30):
+        self.path = path or os.path.join(config.CACHE_DIR, "bess.sqlite")
+        self.url = url
+        self.offline = config.OFFLINE if offline is None else offline
+        self.timeout = timeout
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._create()
+
+    @contextmanager
+    def _connect(self):
+        # Une connexion par opération : le rafraîchissement tourne dans un autre thread
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _create(self):
+        with self._connect() as db:
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            if version == 2:
+                self._add_constellations(db)
+            elif version != SCHEMA_VERSION:
+                db.execute("DROP TABLE IF EXISTS stars")
+                db.execute("DROP TABLE IF EXISTS meta")
+            db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            db.execute("CREATE TABLE IF NOT EXISTS stars (id TEXT PRIMARY KEY, position INTEGER, "
+                       "hd TEXT, ad TEXT, dec TEXT, mag TEXT, sptype TEXT, date TEXT, bgcolor TEXT, "
+                       "ra_deg REAL, dec_deg REAL, mag_value REAL, date_value TEXT, constellation TEXT)")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _add_constellations(self, db):
+        # Migration 2 -> 3 : le catalogue local est conservé (utile hors-ligne), l'index est calculé une fois
+        db.execute("ALTER TABLE stars ADD COLUMN constellation TEXT")
+        rows = db.execute("SELECT id, ra_deg, dec_deg FROM stars").fetchall()
+        if rows:
+            ids, ra, dec = zip(*rows)
+            names = find_constellations(np.array(ra, dtype=np.float64), np.array(dec, dtype=np.float64))
+            db.executemany("UPDATE stars SET constellation = ? WHERE id = ?", zip(names, ids))
+
+    def rows(self):
+        """Lignes du catalogue dans l'ordre de la page, colonnes BESS_COLUMNS + TYPED_COLUMNS"""
+        with self._connect() as db:
+            return db.execute(f"SELECT {', '.join(COLUMNS)} FROM stars ORDER BY position").fetchall()
+
+    def catalogue(self):
+        """Catalogue local en colonnes (BessCatalogue)"""
+        return BessCatalogue.from_rows(self.rows(), names=COLUMNS)
+
+    def dataframe(self):
+        return self.catalogue().to_dataframe()
+
+    def __len__(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM stars").fetchone()[0]
+
+    def meta(self, key, default=None):
+        with self._connect() as db:
+            row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def refresh(self):
+        """Mettre à jour depuis ARASBEAM ; retourne {'added', 'updated', 'removed'} ou None hors-ligne"""
+        if self.offline:
+            return None
+
+        response = fetch_bess(self.url, etag=self.meta('etag'), last_modified=self.meta('last_modified'),
+                              timeout=self.timeout)
+        if response is None:
+            changes = {'added': 0, 'updated': 0, 'removed': 0}
+        else:
+            changes = self.apply(parse_bess(response.content))
+
+        with self._connect() as db:
+            values = {'checked': str(time.time())}
+            if response is not None:
+                values['etag'] = response.headers.get('ETag')
+                values['last_modified'] = response.headers.get('Last-Modified')
+            db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", values.items())
+        return changes
+
+    def apply(self, catalogue):
+        """Appliquer une nouvelle version du catalogue en ne réécrivant que les lignes qui ont changé"""
+        new = {}
+        for position, row in enumerate(catalogue.rows(COLUMNS)):
+            new.setdefault(row[0], (position,) + tuple(row[1:]))
+
+        columns = ['position'] + COLUMNS[1:]
+        with self._connect() as db:
+            old = {row[0]: tuple(row[1:]) for row in db.execute(f"SELECT id, {', '.join(columns)} FROM stars")}
+
+            added = [(star_id,) + values for star_id, values in new.items() if star_id not in old]
+            updated = [values + (star_id,) for star_id, values in new.items()
+                       if star_id in old and old[star_id][1:] != values[1:]]
+            # Une ligne insérée décale les suivantes : seule leur position est réécrite
+            moved = [(values[0], star_id) for star_id, values in new.items()
+                     if star_id in old and old[star_id][1:] == values[1:] and old[star_id][0] != values[0]]
+            removed = [(star_id,) for star_id in old if star_id not in new]
+
+            db.executemany(f"INSERT INTO stars (id, {', '.join(columns)}) "
+                           f"VALUES ({', '.join('?' * (len(columns) + 1))})", added)
+            db.executemany(f"UPDATE stars SET {', '.join(c + ' = ?' for c in columns)} WHERE id = ?", updated)
+            db.executemany("UPDATE stars SET position = ? WHERE id = ?", moved)
+            db.executemany("DELETE FROM stars WHERE id = ?", removed)
+
+        return {'added': len(added), 'updated': len(updated), 'removed': len(removed)}
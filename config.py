@@ -0,0 +1,10 @@
+import os
+
+# Répertoire des caches locaux (spectres de référence, index, ...)
+CACHE_DIR = os.environ.get("COSMOS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cosmos", "cache"))
+
+# Mode hors-ligne : aucune requête réseau, seules les données en cache sont utilisées
+OFFLINE = os.environ.get("COSMOS_OFFLINE", "0") == "1"
+
+# Lieu d'observation par défaut : "latitude,longitude,altitude" (degrés, degrés est, mètres)
+SITE = tuple(float(v) for v in os.environ.get("COSMOS_SITE", "48.8566,2.3522,35").split(","))
@@ -1,129 +1,195 @@
+import os
 import numpy as np
-import cv2
 from astropy.io import fits
-from astroquery.simbad import Simbad
-from astropy.table import Table
-import pandas as pd
-from astropy.convolution import convolve, Gaussian1DKernel
-from lmfit.models import VoigtModel
-from pybaselines import Baseline
+from melchiors_cache import MelchiorsCache
+from melchiors_index import MelchiorsIndex
+from simbad_resolver import SimbadResolver, hd_from_identifiers
+from spectrum import Spectrum1D
+from product_cache import ProductCache
+from telluric import TelluricFitter, TelluricTemplate, TELLURIC_LINES, default_template, save_default_template
+import config
 
 
 class DataProcessor:
-    def __init__(self):
+    def __init__(self, products=None):
         self.header = None
-
-    def read_fits_file(self, file_name):
-        """Lire les données d'un fichier FITS 1D"""
-        with fits.open(file_name) as hdul:
-            data = hdul[0].data
-            header = hdul[0].header
-        return data, header
-
-    def extract_spectrum(self, header, data):
-        """Extraire le spectre d'un fichier FITS 1D"""
-        value1 = header['CRVAL1']
-        pas = header['CDELT1']
-        wavelength = [value1 + i * pas for i in range(len(data))]
-        spectrum = data
-        title = header['OBJNAME'] + ', ' + header['DATE-OBS'] + ', ' + header['BSS_INST'] + ', ' + header['OBSERVER']
-        obj_name = header['OBJNAME']
-        result_table = Simbad.query_objectids(obj_name)
-        date_obs = header['DATE-OBS']
-        print(type(header['BSS_ITRP']))
-        if isinstance(header['BSS_ITRP'], int):
-            resolution = header['BSS_ITRP']
+        self.melchiors_cache = MelchiorsCache()
+        self.melchiors_index = MelchiorsIndex()
+        self.resolver = SimbadResolver()
+        if products is None:
+            products = ProductCache(spill_dir=os.path.join(config.CACHE_DIR, "products"))
+        self.products = products
+        self._fast_baseline = None
+
+    def extract_spectrum(self, spectrum):
+        """Extraire les métadonnées d'un spectre FITS 1D"""
+        header = spectrum.header
+        spectrum.title = ', '.join(str(header.get(key, '')) for key in ('OBJNAME', 'DATE-OBS', 'BSS_INST', 'OBSERVER'))
+        spectrum.obj_name = header['OBJNAME']
+        try:
+            identifiers = self.resolver.resolve(spectrum.obj_name)
+        except Exception as e:
+            # SIMBAD ne sert qu'au numéro HD (référence MELCHIORS) : le spectre reste traitable
+            print(f"Résolution SIMBAD impossible pour {spectrum.obj_name}: {e}")
+            identifiers = []
+        spectrum.date_obs = header['DATE-OBS']
+        resolution = header.get('BSS_ITRP')
+        if isinstance(resolution, (int, float)) and not isinstance(resolution, bool) and resolution > 0:
+            spectrum.resolution = resolution
         else:
-            resolution = None
-        hd_number = None  # Initialisation en dehors de la boucle
-
-        for i in range(len(result_table)):
-            if 'HD' in result_table['ID'][i]:    
-                hd_number = result_table['ID'][i]
-            else:
-                pass
+            spectrum.resolution = None
+        spectrum.hd_number = hd_from_identifiers(identifiers)
+        return spectrum
 
-        print('hd_number_extract', hd_number)
-        return wavelength, spectrum, title, hd_number, obj_name, date_obs,  resolution
 
+    def prefetch_identifiers(self, file_names):
+        """Résoudre en une seule requête SIMBAD les OBJNAME distincts d'une liste de fichiers"""
+        names = []
+        for file_name in file_names:
+            try:
+                names.append(fits.getval(file_name, 'OBJNAME'))
+            except (OSError, KeyError) as e:
+                print(f"OBJNAME illisible dans {file_name}: {e}")
+        if names:
+            try:
+                self.resolver.resolve_many(names)
+            except Exception as e:
+                print(f"Résolution SIMBAD groupée impossible: {e}")
 
     def process_file(self, file_name):
-        data, self.header = self.read_fits_file(file_name)
-        wavelength, spectrum, title, hd_number, obj_name, date_obs, resolution = self.extract_spectrum(self.header, data)
-        return wavelength, spectrum, title, hd_number, obj_name, date_obs, resolution
-
-
-    def plot_melchiors_BR(self, hd_number):
-        df = pd.read_excel("melchiors_lib.xlsx")
-        ref_number = df.loc[df['Name1'] == hd_number, 'ID'].values[0]
-
-        file = f"https://royer.se/melchiors/spectra/00{ref_number}_melchiors_spectrum.fits.gz"
-
-        table = Table.read(file, format='fits')
-
-        gauss_kernel = Gaussian1DKernel(80)  # basse résolution
-        smoothed_data_gauss = convolve(table['flux_tac'], gauss_kernel)
-
-        wave = table['wave']
-        mask = (wave >= 6620) & (wave <= 6640)
-        
-        mean_value = smoothed_data_gauss[mask].mean()
-        smoothed_data_gauss /= mean_value
-
-        return table['wave'], smoothed_data_gauss
-
-    def plot_melchiors_HR(self, hd_number):
-        df = pd.read_excel("melchiors_lib.xlsx")
-        ref_number = df.loc[df['Name1'] == hd_number, 'ID'].values[0]
-
-        file = f"https://royer.se/melchiors/spectra/00{ref_number}_melchiors_spectrum.fits.gz"
-
-        table = Table.read(file, format='fits')
-
-        gauss_kernel = Gaussian1DKernel(1)  # haute résolution
-        smoothed_data_gauss = convolve(table['flux_tac'], gauss_kernel)
-
-        wave = table['wave']
-        mask = (wave >= 6620) & (wave <= 6640)
-        
-        mean_value = smoothed_data_gauss[mask].mean()
-        smoothed_data_gauss /= mean_value
-
-        return table['wave'], smoothed_data_gauss
+        """Ouvrir un FITS 1D et retourner un Spectrum1D (données en memory-map)"""
+        spectrum = Spectrum1D.from_fits(file_name)
+        self.header = spectrum.header
+        return self.extract_spectrum(spectrum)
+
+
+    def load_spectrum(self, file_name):
+        """process_file complet (axe et flux natif calculés), pour les threads de chargement"""
+        spectrum = self.process_file(file_name)
+        spectrum.wavelength
+        spectrum.native_flux
+        return spectrum
+
+
+    def melchiors_reference(self, hd_number, wavelength, resolution=None):
+        """Spectre MELCHIORS de l'étoile vu à la résolution du spectre observé (BSS_ITRP, sinon
+        déduite de sa dispersion), sur sa grille et normalisé ; mémorisé par (étoile, résolution)"""
+        from degrade import degrade, normalize
+
+        ref_number = self.melchiors_index.lookup(hd_number)
+        key = ProductCache.key((wavelength,), product="melchiors", ref_number=ref_number, resolution=resolution)
+        products = self.products.get(key)
+        if products is None:
+            wave, flux = self.melchiors_cache.get(ref_number)
+            degraded = degrade(wave, flux, wavelength, resolution)
+            products = self.products.put(key, (normalize(degraded, np.asarray(wavelength)),))
+        return wavelength, products[0]
 
     def fit_voigt(self,x, y, center):
+        from lmfit.models import VoigtModel
+
         model = VoigtModel()
         params = model.make_params(center=center, amplitude=max(y), sigma=1.0, fraction=0.5)
         result = model.fit(y, params, x=x)
         return result
 
     
-    def remove_atmospheric_lines(self, x, y):
+    def estimate_baseline(self, x, y, lam=1e5, p=0.95, mode="full"):
+        """Ligne de base AsLS ; mode="fast" résout sur une grille décimée avec démarrage à chaud"""
+        if mode == "fast":
+            from baseline import FastBaseline
+
+            fast = self._fast_baseline
+            if fast is None or len(fast.x) != len(x) or not np.array_equal(fast.x, x):
+                fast = self._fast_baseline = FastBaseline(x)
+            return fast.fit(y, lam=lam, p=p)
+        if mode != "full":
+            raise ValueError(f"Mode de ligne de base inconnu: {mode}")
+        from pybaselines import Baseline
 
-        line_positions = [
-            6508.603, 6511.999, 6512.242, 6514.727, 6516.437, 6516.543, 6516.625, 6519.467, 
-            6523.850, 6532.459, 6534.000, 6534.014, 6536.726, 6542.317, 6543.912, 6547.705,
-            6548.627, 6552.632, 6557.181, 6558.149, 6560.501, 6564.208, 6568.806, 6572.087, 
-            6574.860, 6580.794, 6586.559, 6594.375, 6599.365, 6605.566, 6612.550
-        ]
+        baseline_fitter = Baseline(x_data=x)
+        bkg, params = baseline_fitter.asls(y, lam=lam, p=p)
+        return bkg
+
+    def save_telluric_template(self, x, y):
+        """Mesurer le gabarit tellurique sur ce spectre et l'utiliser par défaut"""
+        bkg = self.estimate_baseline(x, y)
+        template = TelluricTemplate.from_spectrum(x, y / bkg)
+        save_default_template(template)
+        return template
+
+    def telluric_key(self, x, y, method="joint", window=2, line_positions=None, lam=1e5, p=0.95,
+                     resolution=None, template=None, baseline="full"):
+        """Clé du cache des produits dérivés pour remove_atmospheric_lines"""
+        params = dict(method=method, window=window, lam=lam, p=p, baseline=baseline,
+                      line_positions=tuple(TELLURIC_LINES if line_positions is None else line_positions))
+        if method == "template":
+            template = template or default_template()
+            params['resolution'] = resolution
+            params['template'] = ProductCache.hash_arrays((template.wavelength, template.optical_depth))
+        return ProductCache.key((x, y), **params)
+
+    def cached_atmospheric_lines(self, x, y, **kwargs):
+        """Résultat déjà calculé de remove_atmospheric_lines, ou None"""
+        products = self.products.get(self.telluric_key(x, y, **kwargs))
+        if products is None:
+            return None
+        cleaned, bkg = products
+        return x, cleaned, bkg
+
+    def store_atmospheric_lines(self, x, y, cleaned, bkg, **kwargs):
+        """Enregistrer un résultat calculé ailleurs (ex. pool de processus)"""
+        self.products.put(self.telluric_key(x, y, **kwargs), (cleaned, bkg))
+
+    def remove_atmospheric_lines(self, x, y, method="joint", window=2, line_positions=None, lam=1e5, p=0.95,
+                                 resolution=None, template=None, baseline="full"):
+        """Retirer les raies telluriques d'un spectre.
+
+        method="joint" ajuste toutes les raies simultanément (TelluricFitter),
+        method="template" ajuste un gabarit de transmission (masse d'air, décalage ;
+        élargissement instrumental fixé par resolution = BSS_ITRP) ; sans template, le
+        gabarit mesuré par save_telluric_template (FileNotFoundError s'il n'existe pas),
+        method="lmfit" conserve l'ajustement raie par raie d'origine.
+        baseline="fast" estime la ligne de base sur une grille décimée (voir estimate_baseline).
+        Les résultats sont mémorisés dans self.products.
+        """
+        key = self.telluric_key(x, y, method, window, line_positions, lam, p, resolution, template, baseline)
+        products = self.products.get(key)
+        if products is None:
+            products = self.products.put(key, self._remove_atmospheric_lines(
+                x, y, method, window, line_positions, lam, p, resolution, template, baseline))
+        cleaned, bkg = products
+        return x, cleaned, bkg
+
+    def _remove_atmospheric_lines(self, x, y, method, window, line_positions, lam, p, resolution, template, baseline):
+        if line_positions is None:
+            line_positions = TELLURIC_LINES
 
         # estimation de la ldb
-        baseline_fitter = Baseline(x_data=x)
-        bkg, params = baseline_fitter.asls(y, lam=1e5, p=0.95)  # pouvoir modifier ces parametres , p en particulier ?
+        bkg = self.estimate_baseline(x, y, lam=lam, p=p, mode=baseline)
 
         # Correction du spectre de la ldb
         y_corrected = y - bkg
 
-        # Fit  avec profil de Voigt
-        for pos in line_positions:
-            window = 2  # pouvoir modifier ce parametre ?
-            mask = (x > pos - window) & (x < pos + window)
-            
-            try:
-                result = self.fit_voigt(x[mask], y_corrected[mask], center=pos)
-                y_corrected[mask] -= result.best_fit
-                
-            except Exception as e:
-                print(f"Could not fit Pseudo-Voigt to line at {pos}: {e}")
+        if method == "template":
+            template = template or default_template()
+            transmission, _ = template.fit(x, y / bkg, resolution=resolution)
+            return y / np.clip(transmission, 0.05, None), bkg
+
+        if method == "joint":
+            y_corrected = TelluricFitter(line_positions, window=window).remove(x, y_corrected)
+        elif method == "lmfit":
+            # Fit  avec profil de Voigt
+            for pos in line_positions:
+                mask = (x > pos - window) & (x < pos + window)
+
+                try:
+                    result = self.fit_voigt(x[mask], y_corrected[mask], center=pos)
+                    y_corrected[mask] -= result.best_fit
+
+                except Exception as e:
+                    print(f"Could not fit Pseudo-Voigt to line at {pos}: {e}")
+        else:
+            raise ValueError(f"Méthode de correction tellurique inconnue: {method}")
 
-        return x,y_corrected + bkg, bkg
+        return y_corrected + bkg, bkg
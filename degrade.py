@@ -0,0 +1,81 @@
+"""Dégradation d'un spectre de référence haute résolution (MELCHIORS) à la résolution d'un spectre observé.
+
+Le profil instrumental est une gaussienne de FWHM = lambda / R (R = BSS_ITRP, ou déduit de
+la dispersion du spectre observé) : sa largeur est constante en ln(lambda). La référence,
+limitée au domaine observé (plus une marge), est rééchantillonnée sur une grille régulière
+en ln(lambda), convoluée par FFT (overlap-add) par le noyau qui complète sa propre résolution
+jusqu'à R, puis interpolée sur la grille du spectre observé.
+"""
+import numpy as np
+
+MELCHIORS_RESOLUTION = 85000  # HERMES (Mercator)
+KERNEL_SIGMAS = 5  # demi-largeur du noyau, en sigma
+NORMALIZE_WINDOW = (6620, 6640)  # Å, continuum près de H-alpha
+FWHM_TO_SIGMA = 1 / (2 * np.sqrt(2 * np.log(2)))
+
+
+def resolution_from_dispersion(wavelength):
+    """Résolution d'un spectre sans BSS_ITRP : échantillonnage de Nyquist (FWHM = 2 pixels)"""
+    wavelength = np.asarray(wavelength, dtype=np.float64)
+    step = np.abs(np.diff(wavelength))
+    return float(np.median(wavelength[1:] / (2 * step[step > 0])))
+
+
+def kernel_sigma(resolution, reference_resolution=MELCHIORS_RESOLUTION):
+    """Écart type (en ln lambda) du noyau qui amène la référence à la résolution donnée ; 0 si inutile"""
+    if not resolution or resolution >= reference_resolution:
+        return 0.0
+    return FWHM_TO_SIGMA * np.sqrt(1.0 / resolution ** 2 - 1.0 / reference_resolution ** 2)
+
+
+def gaussian_kernel(sigma_pixels):
+    half = max(1, int(np.ceil(KERNEL_SIGMAS * sigma_pixels)))
+    x = np.arange(-half, half + 1)
+    kernel = np.exp(-0.5 * (x / sigma_pixels) ** 2)
+    return kernel / kernel.sum()
+
+
+def degrade(wave, flux, target_wavelength, resolution=None, reference_resolution=MELCHIORS_RESOLUTION):
+    """Spectre de référence (wave, flux) vu à la résolution resolution, sur la grille target_wavelength.
+
+    resolution None : déduite de la dispersion de target_wavelength. Les points hors de la
+    référence valent NaN.
+    """
+    from scipy.signal import oaconvolve
+
+    wave = np.asarray(wave, dtype=np.float64)
+    flux = np.asarray(flux, dtype=np.float64)
+    target = np.asarray(target_wavelength, dtype=np.float64)
+    if not resolution or resolution <= 0:
+        resolution = resolution_from_dispersion(target)
+    sigma = kernel_sigma(resolution, reference_resolution)
+
+    # domaine observé + marge du noyau, dans la référence seulement
+    low, high = np.log(np.nanmin(target)), np.log(np.nanmax(target))
+    margin = KERNEL_SIGMAS * sigma + 1e-4
+    start = max(0, np.searchsorted(wave, np.exp(low - margin)) - 1)
+    stop = min(len(wave), np.searchsorted(wave, np.exp(high + margin)) + 1)
+    wave, flux = wave[start:stop], flux[start:stop]
+    finite = np.isfinite(flux)
+    if finite.sum() < 2:
+        return np.full(target.shape, np.nan)
+    wave, flux = wave[finite], flux[finite]
+
+    # grille régulière en ln(lambda) au pas natif de la référence : le noyau y a une largeur fixe
+    log_wave = np.log(wave)
+    step = float(np.median(np.diff(log_wave)))
+    grid = np.arange(log_wave[0], log_wave[-1] + step / 2, step)
+    resampled = np.interp(grid, log_wave, flux)
+    if sigma > 0:
+        kernel = gaussian_kernel(sigma / step)
+        half = len(kernel) // 2
+        # bords prolongés : pas d'affaiblissement du flux aux extrémités
+        resampled = oaconvolve(np.pad(resampled, half, mode='edge'), kernel, mode='valid')
+    return np.interp(np.log(target), grid, resampled, left=np.nan, right=np.nan)
+
+
+def normalize(flux, wavelength, window=NORMALIZE_WINDOW):
+    """Diviser par la moyenne de la fenêtre de continuum (médiane du spectre si elle est hors domaine)"""
+    mask = (wavelength >= window[0]) & (wavelength <= window[1]) & np.isfinite(flux)
+    scale = np.mean(flux[mask]) if mask.any() else np.nanmedian(flux)
+    return flux / scale if scale else flux
@@ -0,0 +1,298 @@
+"""Extraction optimale de spectres 1D à partir de séries de poses 2D, sans interface graphique.
+
+Usage : python extraction.py <dossier ou fichier> [...] -o <dossier de sortie> [options]
+
+Le spectre est supposé horizontal (dispersion le long des colonnes). Pour chaque pose :
+fond de ciel (médiane de bandes de part et d'autre de la trace, colonne par colonne),
+puis extraction optimale pondérée par la variance (Horne 1986) avec rejet itératif des
+pixels aberrants. Les poses sont traitées par paquets (calcul vectorisé sur la pile)
+répartis sur plusieurs processus ; chaque spectre est écrit en FITS 1D lisible par
+DataProcessor.process_file (variance en extension VARIANCE).
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from batch import find_spectra, output_paths, write_summary
+
+DEFAULT_GAIN = 1.0  # e-/ADU
+DEFAULT_READ_NOISE = 5.0  # e-
+PROFILE_WINDOW = 31  # colonnes de la médiane glissante du profil spatial
+CLIP_SIGMA = 5.0
+ITERATIONS = 4
+CHUNK_FRAMES = 8  # poses par tâche (calcul vectorisé sur la pile)
+SUMMARY_NAME = "extraction_summary.csv"
+OUTPUT_SUFFIX = "_1d.fits"
+SUMMARY_COLUMNS = ['file', 'status', 'output', 'object', 'date_obs', 'npix', 'snr', 'rejected', 'seconds', 'error']
+
+# Mots-clés de l'axe 2 (spatial) retirés de l'en-tête du spectre 1D
+AXIS2_KEYWORDS = ('CRVAL2', 'CDELT2', 'CRPIX2', 'CTYPE2', 'CUNIT2', 'CD1_2', 'CD2_1', 'CD2_2', 'PC1_2', 'PC2_1', 'PC2_2')
+
+
+def find_aperture(frame, half_width=None, sky_gap=3, sky_width=None):
+    """Ouverture autour de la trace la plus brillante : {'rows': (r0, r1), 'sky': [(a, b), ...]}"""
+    profile = np.nanmedian(np.asarray(frame, dtype=np.float32), axis=1)
+    profile = profile - np.nanmedian(profile)
+    center = int(np.nanargmax(profile))
+    if half_width is None:
+        # largeur à mi-hauteur -> ouverture de +-1.5 FWHM
+        above = np.flatnonzero(profile >= profile[center] / 2)
+        runs = np.split(above, np.flatnonzero(np.diff(above) > 1) + 1)
+        fwhm = next(len(run) for run in runs if run[0] <= center <= run[-1])
+        half_width = max(2, int(np.ceil(1.5 * fwhm)))
+    return aperture_around(center, half_width, len(profile), sky_gap, sky_width)
+
+
+def aperture_around(center, half_width, rows, sky_gap=3, sky_width=None):
+    sky_width = sky_width or 2 * half_width
+    r0, r1 = max(0, center - half_width), min(rows, center + half_width + 1)
+    sky = [(max(0, r0 - sky_gap - sky_width), max(0, r0 - sky_gap)),
+           (min(rows, r1 + sky_gap), min(rows, r1 + sky_gap + sky_width))]
+    return {'rows': (r0, r1), 'sky': [band for band in sky if band[1] > band[0]]}
+
+
+def _running_median(values, window):
+    """Médiane glissante le long du dernier axe (insensible aux cosmiques isolés)"""
+    if window <= 1:
+        return values
+    half = window // 2
+    padded = np.pad(values, [(0, 0)] * (values.ndim - 1) + [(half, half)], mode='edge')
+    return np.median(np.lib.stride_tricks.sliding_window_view(padded, window, axis=-1), axis=-1)
+
+
+def sky_background(frames, bands):
+    """Fond de ciel (poses, colonnes) : médiane des lignes des bandes de ciel"""
+    if not bands:
+        return np.zeros((frames.shape[0], frames.shape[2]), dtype=np.float64)
+    rows = np.concatenate([np.arange(a, b) for a, b in bands])
+    return np.median(frames[:, rows, :], axis=1)
+
+
+def optimal_extract(frames, aperture, gain=DEFAULT_GAIN, read_noise=DEFAULT_READ_NOISE,
+                    window=PROFILE_WINDOW, clip=CLIP_SIGMA, iterations=ITERATIONS):
+    """Extraction optimale d'une pile de poses (poses, lignes, colonnes).
+
+    Retourne un dict de tableaux (poses, colonnes) : flux, variance, sky (par pixel),
+    standard (somme simple de l'ouverture) et rejected (pixels rejetés par pose).
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    if frames.ndim == 2:
+        frames = frames[None]
+    r0, r1 = aperture['rows']
+    sky = sky_background(frames, aperture.get('sky', []))
+    data = frames[:, r0:r1, :]
+    signal = data - sky[:, None, :]
+    noise2 = (read_noise / gain) ** 2
+
+    mask = np.isfinite(signal)
+    signal = np.where(mask, signal, 0.0)
+    flux = signal.sum(axis=1)
+    standard = flux.copy()
+
+    # Profil spatial : fraction du flux par ligne, médiane glissante le long de la dispersion,
+    # positive et normalisée par colonne
+    fraction = signal / np.where(flux > 0, flux, np.inf)[:, None, :]
+    profile = np.clip(_running_median(fraction, window), 0, None)
+    total = profile.sum(axis=1, keepdims=True)
+    profile = np.where(total > 0, profile / np.where(total > 0, total, 1), 1.0 / (r1 - r0))
+    for _ in range(iterations):
+        variance = noise2 + np.clip(flux[:, None, :] * profile + sky[:, None, :], 0, None) / gain
+        variance = np.maximum(variance, 1e-12)
+        weight = mask * profile / variance
+        denominator = (weight * profile).sum(axis=1)
+        denominator = np.where(denominator > 0, denominator, np.nan)
+        flux = (weight * signal).sum(axis=1) / denominator
+        flux_variance = (mask * profile).sum(axis=1) / denominator
+
+        # rejet du pixel le plus aberrant de chaque colonne (un par itération)
+        residual = np.where(mask, (signal - flux[:, None, :] * profile) ** 2 / variance, 0.0)
+        worst = residual.argmax(axis=1)
+        bad = np.take_along_axis(residual, worst[:, None, :], axis=1)[:, 0, :] > clip ** 2
+        if not bad.any():
+            break
+        frame_index, column = np.nonzero(bad)
+        mask[frame_index, worst[frame_index, column], column] = False
+
+    return {'flux': flux, 'variance': flux_variance, 'sky': sky, 'standard': standard,
+            'rejected': (~mask).sum(axis=(1, 2))}
+
+
+def spectrum_header(header, aperture, columns, options):
+    """En-tête du spectre 1D : WCS de l'axe 1 conservé (ou axe en pixels), mots-clés lus par DataProcessor"""
+    header = header.copy()
+    for keyword in AXIS2_KEYWORDS + ('BZERO', 'BSCALE', 'BLANK'):
+        header.remove(keyword, ignore_missing=True)
+    if 'CRVAL1' not in header:
+        header['CTYPE1'] = 'PIXEL'
+        header['CRVAL1'] = 1.0
+        header['CDELT1'] = 1.0
+        header['CRPIX1'] = 1.0
+    if columns[0]:
+        header['CRPIX1'] = header.get('CRPIX1', 1.0) - columns[0]
+    header.setdefault('OBJNAME', header.get('OBJECT', ''))
+    header.setdefault('BSS_INST', header.get('INSTRUME', ''))
+    header.setdefault('OBSERVER', '')
+    header.setdefault('DATE-OBS', '')
+    header['HISTORY'] = (f"Cosmos extraction optimale: lignes {aperture['rows'][0]}-{aperture['rows'][1]}, "
+                         f"ciel {aperture.get('sky', [])}")
+    header['HISTORY'] = f"Cosmos extraction: gain={options['gain']:g} e/ADU, bruit de lecture={options['read_noise']:g} e"
+    return header
+
+
+def write_spectrum(out_name, flux, variance, header):
+    from astropy.io import fits
+
+    hdul = fits.HDUList([fits.PrimaryHDU(flux.astype(np.float32), header=header),
+                         fits.ImageHDU(variance.astype(np.float32), name="VARIANCE")])
+    os.makedirs(os.path.dirname(os.path.abspath(out_name)), exist_ok=True)
+    tmp_name = out_name + ".tmp"
+    hdul.writeto(tmp_name, overwrite=True, output_verify="silentfix")
+    os.replace(tmp_name, out_name)
+
+
+def extract_files(jobs, aperture, options):
+    """Extraire un paquet de poses (processus de calcul) ; retourne une ligne de récapitulatif par pose"""
+    from astropy.io import fits
+
+    t0 = time.perf_counter()
+    columns = options.get('columns') or (0, None)
+    rows_needed = [aperture['rows']] + list(aperture.get('sky', []))
+    first, last = min(r[0] for r in rows_needed), max(r[1] for r in rows_needed)
+    shifted = {'rows': (aperture['rows'][0] - first, aperture['rows'][1] - first),
+               'sky': [(a - first, b - first) for a, b in aperture.get('sky', [])]}
+
+    stack, headers, results = [], [], []
+    for file_name, out_name in jobs:
+        try:
+            with fits.open(file_name, memmap=True) as hdul:
+                # seules les lignes de l'ouverture et du ciel sont lues
+                stack.append(np.array(hdul[0].section[first:last, columns[0]:columns[1]], dtype=np.float64))
+                headers.append(hdul[0].header.copy())
+            results.append({'file': file_name, 'output': out_name})
+        except Exception as e:
+            results.append({'file': file_name, 'output': out_name, 'status': "échec", 'error': f"{type(e).__name__}: {e}"})
+
+    valid = [result for result in results if 'status' not in result]
+    if valid:
+        shapes = {frame.shape for frame in stack}
+        if len(shapes) > 1:
+            raise ValueError(f"Poses de tailles différentes dans le paquet : {sorted(shapes)}")
+        extracted = optimal_extract(np.stack(stack), shifted, gain=options['gain'], read_noise=options['read_noise'])
+        elapsed = (time.perf_counter() - t0) / len(valid)
+        for i, (result, header) in enumerate(zip(valid, headers)):
+            flux, variance = extracted['flux'][i], extracted['variance'][i]
+            write_spectrum(result['output'], flux, variance, spectrum_header(header, aperture, columns, options))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                snr = np.nanmedian(flux / np.sqrt(variance))
+            result.update(status="ok", error="", object=header.get('OBJNAME', header.get('OBJECT', '')),
+                          date_obs=header.get('DATE-OBS', ''), npix=len(flux), snr=round(float(snr), 1),
+                          rejected=int(extracted['rejected'][i]), seconds=round(elapsed, 3))
+    return results
+
+
+def run(paths, output_dir, aperture=None, columns=None, gain=DEFAULT_GAIN, read_noise=DEFAULT_READ_NOISE,
+        workers=None, chunk=CHUNK_FRAMES):
+    """Extraire toutes les poses de paths ; ouverture commune (détectée sur la première pose si None)"""
+    from astropy.io import fits
+
+    os.makedirs(output_dir, exist_ok=True)
+    frames = find_spectra(paths, exclude=[output_dir], skip_suffixes=[OUTPUT_SUFFIX])
+    if not frames:
+        return []
+    outputs = output_paths(frames, output_dir, OUTPUT_SUFFIX)  # avant tout calcul : sorties en double refusées
+    height = fits.getval(frames[0][0], 'NAXIS2')
+    if aperture is None:
+        aperture = find_aperture(fits.getdata(frames[0][0]))
+    elif 'sky' not in aperture:
+        r0, r1 = aperture['rows']
+        aperture = dict(aperture, sky=aperture_around((r0 + r1) // 2, (r1 - r0) // 2, height)['sky'])
+    aperture = clamp_aperture(aperture, height)
+    print(f"{len(frames)} pose(s), ouverture lignes {aperture['rows'][0]}-{aperture['rows'][1]}, "
+          f"ciel {aperture['sky']}")
+
+    options = {'gain': gain, 'read_noise': read_noise, 'columns': columns}
+    jobs = list(zip([file_name for file_name, _ in frames], outputs))
+    chunks = [jobs[i:i + chunk] for i in range(0, len(jobs), chunk)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+
+    rows = []
+    if workers == 1:
+        for part in chunks:
+            try:
+                rows.extend(extract_files(part, aperture, options))
+            except Exception as e:
+                rows.extend(_failed_rows(part, e))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {executor.submit(extract_files, part, aperture, options): part for part in chunks}
+            for future in as_completed(futures):
+                rows.extend(_result_rows(future, futures[future]))
+                print(f"[{len(rows)}/{len(jobs)}] poses extraites")
+
+    order = {file_name: i for i, (file_name, _) in enumerate(jobs)}
+    rows.sort(key=lambda row: order[row['file']])
+    write_summary(os.path.join(output_dir, SUMMARY_NAME), rows, columns=SUMMARY_COLUMNS)
+    return rows
+
+
+def clamp_aperture(aperture, height):
+    """Bornes de l'ouverture et des bandes de ciel ramenées à la hauteur des poses"""
+    r0, r1 = (int(np.clip(r, 0, height)) for r in aperture['rows'])
+    if r1 <= r0:
+        raise ValueError(f"Ouverture vide (lignes {aperture['rows']}, {height} lignes par pose)")
+    sky = [(int(np.clip(a, 0, height)), int(np.clip(b, 0, height))) for a, b in aperture.get('sky', [])]
+    return {'rows': (r0, r1), 'sky': [(a, b) for a, b in sky if b > a]}
+
+
+def _failed_rows(part, error):
+    return [{'file': file_name, 'output': out_name, 'status': "échec", 'error': f"{type(error).__name__}: {error}"}
+            for file_name, out_name in part]
+
+
+def _result_rows(future, part):
+    try:
+        return future.result()
+    except Exception as e:
+        return _failed_rows(part, e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extraction optimale de spectres 1D à partir de poses 2D")
+    parser.add_argument('paths', nargs='+', help="poses FITS 2D ou dossiers (parcourus récursivement)")
+    parser.add_argument('-o', '--output', required=True, help="dossier de sortie")
+    parser.add_argument('--rows', type=int, nargs=2, metavar=('DEBUT', 'FIN'),
+                        help="lignes de l'ouverture (défaut : trace détectée sur la première pose)")
+    parser.add_argument('--sky', type=int, nargs=2, action='append', metavar=('DEBUT', 'FIN'),
+                        help="bande de ciel (répétable ; défaut : de part et d'autre de l'ouverture)")
+    parser.add_argument('--columns', type=int, nargs=2, metavar=('DEBUT', 'FIN'), help="colonnes extraites")
+    parser.add_argument('--gain', type=float, default=DEFAULT_GAIN, help="gain (e-/ADU)")
+    parser.add_argument('--read-noise', type=float, default=DEFAULT_READ_NOISE, help="bruit de lecture (e-)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="nombre de processus (défaut : tous les cœurs)")
+    args = parser.parse_args(argv)
+
+    aperture = None
+    if args.rows:
+        aperture = {'rows': tuple(args.rows)}
+        if args.sky:
+            aperture['sky'] = [tuple(band) for band in args.sky]
+
+    t0 = time.perf_counter()
+    try:
+        rows = run(args.paths, args.output, aperture=aperture, columns=tuple(args.columns) if args.columns else None,
+                   gain=args.gain, read_noise=args.read_noise, workers=args.workers)
+    except ValueError as e:
+        print(f"Erreur : {e}")
+        return 2
+    failed = sum(1 for row in rows if row['status'] != "ok")
+    print(f"Terminé en {time.perf_counter() - t0:.1f} s : {len(rows) - failed} réussie(s), {failed} échec(s) ; "
+          f"récapitulatif dans {os.path.join(args.output, SUMMARY_NAME)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
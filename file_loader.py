@@ -0,0 +1,221 @@
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+
+PENDING = "en attente"
+RUNNING = "en cours"
+DONE = "terminé"
+FAILED = "échec"
+CANCELLED = "annulé"
+
+
+class _TaskSignals(QObject):
+    # (numéro de lot, index, succès, résultat ou message d'erreur)
+    done = Signal(int, int, bool, object)
+
+
+class LoadTask(QRunnable):
+    """Chargement d'un fichier dans le pool de threads"""
+
+    def __init__(self, batch, index, file_name, func, signals):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.batch = batch
+        self.index = index
+        self.file_name = file_name
+        self.func = func
+        self.signals = signals
+        self.state = PENDING
+
+    def run(self):
+        if self.state == CANCELLED:
+            return
+        self.state = RUNNING
+        try:
+            result = self.func(self.file_name)
+        except Exception as e:
+            self.state = FAILED
+            self.signals.done.emit(self.batch, self.index, False, str(e))
+            return
+        if self.state != CANCELLED:
+            self.state = DONE
+        self.signals.done.emit(self.batch, self.index, True, result)
+
+
+class _PrepareTask(QRunnable):
+    def __init__(self, batch, func, file_names, signals):
+        super().__init__()
+        self.batch = batch
+        self.func = func
+        self.file_names = file_names
+        self.signals = signals
+
+    def run(self):
+        try:
+            self.func(self.file_names)
+        except Exception as e:
+            print(f"Préparation du chargement impossible: {e}")
+        self.signals.done.emit(self.batch, -1, True, None)
+
+
+class FileLoader(QObject):
+    """Chargement de fichiers hors du thread graphique.
+
+    Les résultats sont délivrés dans l'ordre de la liste de fichiers (signal loaded),
+    les erreurs sont regroupées et transmises en une fois à la fin du lot (signal finished).
+    Un nouvel appel à load() annule le lot en cours.
+    """
+
+    loaded = Signal(str, object)
+    failed = Signal(str, str)
+    progress = Signal(int, int)
+    finished = Signal(list)
+
+    def __init__(self, parent=None, max_threads=4):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._signals = _TaskSignals()
+        self._signals.done.connect(self._on_task_done)
+        self._batch = 0
+        self.tasks = []
+        self.errors = []
+        self._results = {}
+        self._next = 0
+
+    def load(self, file_names, func, prepare=None):
+        """Charger file_names avec func(file_name) ; prepare(file_names) est exécuté avant (ex. SIMBAD groupé)"""
+        self.cancel()
+        self._batch += 1
+        self.tasks = [LoadTask(self._batch, i, name, func, self._signals) for i, name in enumerate(file_names)]
+        self.errors = []
+        self._results = {}
+        self._next = 0
+        if prepare is not None:
+            self.pool.start(_PrepareTask(self._batch, prepare, list(file_names), self._signals))
+        else:
+            self._start_tasks()
+
+    def cancel(self):
+        """Annuler les tâches en attente ; les résultats des tâches en cours sont ignorés"""
+        for task in self.tasks:
+            if task.state in (PENDING, RUNNING):
+                task.state = CANCELLED
+                self.pool.tryTake(task)
+        self._batch += 1
+
+    def is_running(self):
+        return any(task.state in (PENDING, RUNNING) for task in self.tasks)
+
+    def states(self):
+        """État de chaque fichier du lot en cours"""
+        return {task.file_name: task.state for task in self.tasks}
+
+    def _start_tasks(self):
+        for task in self.tasks:
+            if task.state == PENDING:
+                self.pool.start(task)
+        if not self.tasks:
+            self.finished.emit([])
+
+    def _on_task_done(self, batch, index, ok, value):
+        if batch != self._batch:
+            return
+        if index < 0:
+            self._start_tasks()
+            return
+
+        self._results[index] = (ok, value)
+        # Livraison dans l'ordre : on attend les fichiers précédents
+        while self._next in self._results:
+            ok, value = self._results.pop(self._next)
+            file_name = self.tasks[self._next].file_name
+            self._next += 1
+            if ok:
+                self.loaded.emit(file_name, value)
+            else:
+                self.errors.append((file_name, value))
+                self.failed.emit(file_name, value)
+            self.progress.emit(self._next, len(self.tasks))
+
+        if self._next == len(self.tasks):
+            self.finished.emit(list(self.errors))
+
+
+class _JobSignals(QObject):
+    # (numéro de tâche, succès, résultat ou message d'erreur)
+    done = Signal(int, bool, object)
+
+
+class _Job(QRunnable):
+    def __init__(self, number, func, signals):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.number = number
+        self.func = func
+        self.signals = signals
+
+    def run(self):
+        try:
+            result = self.func()
+        except Exception as e:
+            self.signals.done.emit(self.number, False, str(e))
+            return
+        self.signals.done.emit(self.number, True, result)
+
+
+class JobRunner(QObject):
+    """Exécution d'un calcul (extraction, combinaison, requête...) hors du thread graphique.
+
+    Une seule tâche à la fois : un nouvel appel à run_async() remplace la précédente,
+    dont le résultat est ignoré. done ou failed, puis finished, sont émis avec la clé
+    donnée à run_async (fichier de sortie, URL...).
+    """
+
+    done = Signal(str, object)
+    failed = Signal(str, str)
+    finished = Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self._signals = _JobSignals()
+        self._signals.done.connect(self._on_job_done)
+        self._number = 0
+        self._job = None
+        self.key = None
+
+    def run_async(self, key, func):
+        """Exécuter func() dans le pool ; la tâche en cours est annulée"""
+        self.cancel()
+        self.key = key
+        self._job = _Job(self._number, func, self._signals)
+        self.pool.start(self._job)
+
+    def cancel(self):
+        """Annuler la tâche en attente ; le résultat d'une tâche en cours est ignoré"""
+        if self._job is not None:
+            self.pool.tryTake(self._job)
+            self._job = None
+        self._number += 1
+
+    def is_running(self):
+        return self._job is not None
+
+    def _on_job_done(self, number, ok, value):
+        if number != self._number:
+            return
+        self._job = None
+        if ok:
+            self.done.emit(self.key, value)
+        else:
+            self.failed.emit(self.key, value)
+        self.finished.emit(self.key)
+
+
+def format_errors(errors):
+    """Message unique récapitulant les erreurs d'un lot"""
+    lines = [f"{len(errors)} fichier(s) n'ont pas pu être ouverts :"]
+    for file_name, message in errors:
+        lines.append(f"- {file_name}: {message}")
+    return "\n".join(lines)
@@ -0,0 +1,264 @@
+"""Combinaison de poses 2D (darks, flats, piles de poses) à mémoire bornée, sans interface graphique.
+
+Usage : python frame_combine.py <dossier ou fichier> [...] -o maitre.fits [--method median] [options]
+
+Les poses sont ouvertes en memory-map et lues par bandes de lignes : chaque bande de la
+pile (N poses x lignes x colonnes) tient dans le budget mémoire, quelle que soit la
+taille totale de la pile. Les bandes sont combinées (moyenne, médiane ou moyenne avec
+rejet sigma) en parallèle et écrites directement dans le FITS de sortie (memory-map).
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from batch import find_spectra
+
+METHODS = ("mean", "median", "sigma")
+DEFAULT_MEMORY = 512 * 1024**2  # octets pour l'ensemble des processus
+DEFAULT_SIGMA = 3.0
+SIGMA_ITERATIONS = 3
+# octets de travail par pixel de la bande, en plus de la pile (mesurés avec tracemalloc, avec marge) :
+# lecture d'une pose, moments float64, médiane sur la pile triée, masques des valeurs rejetées
+PIXEL_WORK_BYTES = {'mean': 64, 'median': 32, 'sigma': 96}
+FITS_BLOCK = 2880
+
+
+def frame_info(file_names):
+    """Forme commune des poses, en-tête de la première et description brute de chacune :
+    (fichier, décalage des données, dtype, bscale, bzero) pour les relire en memory-map sans astropy"""
+    from astropy.io import fits
+
+    shape, frames, first_header = None, [], None
+    for file_name in file_names:
+        with fits.open(file_name, memmap=True, do_not_scale_image_data=True) as hdul:
+            hdu = hdul[0]
+            if hdu.data is None or hdu.data.ndim != 2:
+                raise ValueError(f"{os.path.basename(file_name)} n'est pas une image 2D")
+            if shape is None:
+                shape, first_header = hdu.data.shape, hdu.header.copy()
+            elif hdu.data.shape != shape:
+                raise ValueError(f"{os.path.basename(file_name)} : {hdu.data.shape} au lieu de {shape}")
+            frames.append((file_name, hdu.fileinfo()['datLoc'], hdu.data.dtype.str,
+                           hdu.header.get('BSCALE', 1.0), hdu.header.get('BZERO', 0.0)))
+    return shape, frames, first_header
+
+
+def read_rows(frame, shape, row0, row1):
+    """Lignes [row0, row1) d'une pose décrite par frame_info, mises à l'échelle (float32)"""
+    file_name, offset, dtype, bscale, bzero = frame
+    data = np.memmap(file_name, dtype=dtype, mode='r', offset=offset, shape=shape)
+    rows = data[row0:row1].astype(np.float32)
+    del data
+    if bscale != 1.0:
+        rows *= bscale
+    if bzero:
+        rows += bzero
+    return rows
+
+
+def frame_scales(frames, shape, normalize, samples=100_000):
+    """Facteur de normalisation de chaque pose (médiane d'un échantillon, pour les flats), 1 sinon"""
+    if not normalize:
+        return [1.0] * len(frames)
+    step = max(1, int(np.sqrt(shape[0] * shape[1] / samples)))
+    scales = []
+    for file_name, offset, dtype, bscale, bzero in frames:
+        data = np.memmap(file_name, dtype=dtype, mode='r', offset=offset, shape=shape)
+        median = float(np.nanmedian(data[::step, ::step].astype(np.float32))) * bscale + bzero
+        del data
+        scales.append(1.0 / median if median else 1.0)
+    return scales
+
+
+def rows_per_chunk(n_frames, cols, memory, method="median"):
+    """Lignes par bande pour que la pile de la bande et les tableaux de travail tiennent dans memory"""
+    return max(1, int(memory // (cols * (4 * n_frames + PIXEL_WORK_BYTES[method]))))
+
+
+def _has_nan(stack):
+    # NaN propagé par la somme : un tableau de la taille d'une pose au lieu d'un masque de la pile
+    return not np.isfinite(stack.sum(axis=0)).all()
+
+
+def _valid_count(stack):
+    count = np.zeros(stack.shape[1:], dtype=np.int32)
+    for frame in stack:
+        count += ~np.isnan(frame)
+    return count
+
+
+def _frame_moments(stack):
+    """Moyenne et écart type (hors NaN) le long de l'axe des poses, pose par pose"""
+    total = np.zeros(stack.shape[1:], dtype=np.float64)
+    squares = np.zeros(stack.shape[1:], dtype=np.float64)
+    count = np.zeros(stack.shape[1:], dtype=np.int32)
+    for frame in stack:
+        valid = ~np.isnan(frame)
+        values = np.where(valid, frame, 0.0)
+        total += values
+        squares += values * values
+        count += valid
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        std = np.sqrt(np.maximum(squares / count - mean * mean, 0.0))
+    return mean, std, count
+
+
+def _sorted_median(stack, count):
+    """Médiane hors NaN d'une pile triée le long de l'axe des poses (NaN en fin), count valeurs valides"""
+    low = np.take_along_axis(stack, np.maximum(count - 1, 0)[None] // 2, axis=0)[0]
+    high = np.take_along_axis(stack, (count // 2)[None], axis=0)[0]
+    median = 0.5 * (low + high)
+    median[count == 0] = np.nan
+    return median
+
+
+def combine_stack(stack, method="median", sigma=DEFAULT_SIGMA, iterations=SIGMA_ITERATIONS):
+    """Combiner une pile (poses, lignes, colonnes) float32 le long de l'axe des poses.
+
+    La pile sert d'espace de travail (triée, valeurs rejetées mises à NaN) : pas de copie
+    de la pile, seulement des tableaux de la taille d'une pose.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Méthode inconnue : {method}")
+    if method == "mean":
+        if not _has_nan(stack):
+            return stack.mean(axis=0, dtype=np.float64).astype(np.float32)
+        return _frame_moments(stack)[0].astype(np.float32)
+    if method == "median" and not _has_nan(stack):
+        return np.median(stack, axis=0, overwrite_input=True)
+
+    stack.sort(axis=0)  # NaN en fin de chaque pixel
+    count = _valid_count(stack)
+    if method == "median":
+        return _sorted_median(stack, count)
+
+    for _ in range(iterations):
+        center = _sorted_median(stack, count)
+        _, spread, _ = _frame_moments(stack)
+        limit = sigma * spread
+        rejected = 0
+        for frame in stack:
+            with np.errstate(invalid='ignore'):
+                outliers = np.abs(frame - center) > limit
+            rejected += np.count_nonzero(outliers)
+            frame[outliers] = np.nan
+        if not rejected:
+            break
+        stack.sort(axis=0)
+        count = _valid_count(stack)
+    return _frame_moments(stack)[0].astype(np.float32)
+
+
+def write_header(out_name, header, shape):
+    """Créer le FITS de sortie (float32) à la bonne taille ; retourne le décalage des données"""
+    from astropy.io import fits
+
+    header = header.copy()
+    for keyword in ('BZERO', 'BSCALE', 'BLANK'):
+        header.remove(keyword, ignore_missing=True)
+    hdu = fits.PrimaryHDU(header=header)
+    hdu.header['BITPIX'] = -32
+    hdu.header['NAXIS'] = 2
+    # cartes obligatoires juste après NAXIS (sinon cfitsio, DS9, IRAF refusent le fichier)
+    hdu.header.set('NAXIS1', shape[1], after='NAXIS')
+    hdu.header.set('NAXIS2', shape[0], after='NAXIS1')
+    text = hdu.header.tostring().encode('ascii')
+    data_bytes = shape[0] * shape[1] * 4
+    with open(out_name, "wb") as f:
+        f.write(text)
+        f.truncate(len(text) + -(-data_bytes // FITS_BLOCK) * FITS_BLOCK)  # zéros, blocs FITS complets
+    return len(text)
+
+
+def combine_rows(frames, scales, row0, row1, out_name, offset, shape, options):
+    """Combiner les lignes [row0, row1) de toutes les poses et les écrire dans la sortie (processus de calcul)"""
+    stack = np.empty((len(frames), row1 - row0, shape[1]), dtype=np.float32)
+    for i, (frame, scale) in enumerate(zip(frames, scales)):
+        stack[i] = read_rows(frame, shape, row0, row1)
+        if scale != 1.0:
+            stack[i] *= scale
+
+    result = combine_stack(stack, options['method'], options['sigma'])
+    output = np.memmap(out_name, dtype='>f4', mode='r+', offset=offset, shape=shape)
+    output[row0:row1] = result
+    output.flush()
+    del output
+    return row1 - row0
+
+
+def combine(file_names, out_name, method="median", sigma=DEFAULT_SIGMA, normalize=False,
+            memory=DEFAULT_MEMORY, workers=None, progress=None):
+    """Combiner les poses file_names dans out_name ; retourne (forme, lignes par bande, secondes)"""
+    from astropy.io import fits
+
+    if method not in METHODS:
+        raise ValueError(f"Méthode inconnue : {method} (choix : {', '.join(METHODS)})")
+    if not file_names:
+        raise ValueError("Aucune pose à combiner")
+    t0 = time.perf_counter()
+    shape, frames, header = frame_info(file_names)
+    scales = frame_scales(frames, shape, normalize)
+
+    workers = max(1, workers or os.cpu_count() or 1)
+    chunk = min(shape[0], rows_per_chunk(len(file_names), shape[1], memory / workers, method))
+    bands = [(row0, min(row0 + chunk, shape[0])) for row0 in range(0, shape[0], chunk)]
+    workers = min(workers, len(bands))
+
+    header['NCOMBINE'] = (len(file_names), "poses combinees")
+    header['COMBMETH'] = (method, "methode de combinaison")
+    header['HISTORY'] = f"Cosmos: combinaison {method} de {len(file_names)} poses" + (" normalisees" if normalize else "")
+    os.makedirs(os.path.dirname(os.path.abspath(out_name)), exist_ok=True)
+    tmp_name = out_name + ".tmp"
+    offset = write_header(tmp_name, header, shape)
+
+    options = {'method': method, 'sigma': sigma}
+    args = (frames, scales)
+    done = 0
+    if workers == 1:
+        for row0, row1 in bands:
+            done += combine_rows(*args, row0, row1, tmp_name, offset, shape, options)
+            if progress:
+                progress(done, shape[0])
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(combine_rows, *args, row0, row1, tmp_name, offset, shape, options)
+                       for row0, row1 in bands]
+            for future in as_completed(futures):
+                done += future.result()
+                if progress:
+                    progress(done, shape[0])
+    with fits.open(tmp_name) as hdul:  # structure du fichier écrit (ordre des cartes, taille)
+        hdul.verify('exception')
+    os.replace(tmp_name, out_name)
+    return shape, chunk, time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Combinaison de poses 2D à mémoire bornée (darks, flats, piles)")
+    parser.add_argument('paths', nargs='+', help="poses FITS ou dossiers (parcourus récursivement)")
+    parser.add_argument('-o', '--output', required=True, help="FITS de sortie")
+    parser.add_argument('--method', choices=METHODS, default="median", help="combinaison (défaut : median)")
+    parser.add_argument('--sigma', type=float, default=DEFAULT_SIGMA, help="seuil de rejet de la méthode sigma")
+    parser.add_argument('--normalize', action='store_true', help="normaliser chaque pose par sa médiane (flats)")
+    parser.add_argument('--memory', type=float, default=DEFAULT_MEMORY / 1024**2, help="budget mémoire en Mo")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="nombre de processus (défaut : tous les cœurs)")
+    args = parser.parse_args(argv)
+
+    # la pose combinée d'un lancement précédent ne fait pas partie de la pile
+    file_names = [file_name for file_name, _ in find_spectra(args.paths, exclude=[args.output, args.output + ".tmp"])]
+    shape, chunk, elapsed = combine(file_names, args.output, method=args.method, sigma=args.sigma,
+                                    normalize=args.normalize, memory=args.memory * 1024**2, workers=args.workers,
+                                    progress=lambda done, total: print(f"\r{done}/{total} lignes", end=""))
+    print(f"\n{len(file_names)} poses {shape} combinées ({args.method}) en {elapsed:.1f} s, "
+          f"bandes de {chunk} lignes -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,19 @@
-import pyqtgraph as pg
+from collections import OrderedDict
+
 import numpy as np
-from astropy.io import fits
-import cv2  # Si vous utilisez OpenCV pour traiter les images
+import pyqtgraph as pg
+from PySide6.QtCore import QTimer
+from PySide6.QtGui import QTransform, QGuiApplication
+from PySide6.QtWidgets import QGraphicsPathItem
+
+from cosmic import detect_cosmics, header_options, cosmic_regions
+from image_pyramid import ImagePyramid, sample_levels
+from isocurve import IsocurveEngine
+from roi_profile import SummedAreaTable
+
+
+MAX_TILES = 48  # tuiles gardées en mémoire (visibles ou récemment vues)
+
 
 class ImageProcessor:
     def __init__(self, win):
@@ -13,15 +25,22 @@ class ImageProcessor:
         self.hist = None
         self.isoLine = None
         self.p2 = None
+        self.pyramid = None
+        self.sat = None
+        self.profile_curve = None
+        self.cosmic_overlay = None
+        self.tiles = OrderedDict()  # (niveau, ty, tx) -> ImageItem
 
     def setup_image_analysis(self):
         """Configurer les composants pour l'analyse d'image"""
         # A plot area (ViewBox + axes) for displaying the image
         self.p1 = self.win.addPlot(title="")
 
-        # Item for displaying image data
-        self.img = pg.ImageItem()
+        # Item for displaying image data : vue d'ensemble (niveau le plus grossier de la pyramide),
+        # les tuiles plus fines sont ses enfants et ne sont chargées que pour la zone visible
+        self.img = pg.ImageItem(axisOrder='row-major')
         self.p1.addItem(self.img)
+        self.p1.vb.sigRangeChanged.connect(self.update_tiles)
 
         # Custom ROI for selecting an image region
         self.roi = pg.ROI([0, 0], [1000, 1000])
@@ -30,14 +49,33 @@ class ImageProcessor:
         self.p1.addItem(self.roi)
         self.roi.setZValue(10000)  # make sure ROI is drawn above image
 
-        # Isocurve drawing
-        self.iso = pg.IsocurveItem(level=0.8, pen='g')
+        # Masque des cosmiques : un carré par cosmique, en pixels de l'image (suit le zoom)
+        self.cosmic_overlay = pg.ScatterPlotItem(pxMode=False, symbol='s', pen=pg.mkPen('r'), brush=None)
+        self.cosmic_overlay.setZValue(20)
+        self.p1.addItem(self.cosmic_overlay)
+
+        # Profil recalculé au plus une fois par rafraîchissement de l'écran pendant un déplacement
+        screen = QGuiApplication.primaryScreen()
+        rate = screen.refreshRate() if screen is not None else 60
+        self.profile_timer = QTimer(self.win)
+        self.profile_timer.setSingleShot(True)
+        self.profile_timer.setInterval(int(1000 / (rate if rate > 0 else 60)))
+        self.profile_timer.timeout.connect(self.update_plot)
+        self.roi.sigRegionChanged.connect(self.schedule_plot)
+
+        # Isocurve drawing : courbes calculées hors du thread graphique, remplacées d'un bloc
+        self.iso = QGraphicsPathItem()
+        self.iso.setPen(pg.mkPen('g'))
         self.iso.setParentItem(self.img)
         self.iso.setZValue(5)
+        self.iso_engine = IsocurveEngine(self.win)
+        self.iso_engine.ready.connect(self.iso.setPath)
 
         # Contrast/color control
         self.hist = pg.HistogramLUTItem()
         self.hist.setImageItem(self.img)
+        self.hist.sigLevelsChanged.connect(self.sync_tiles)
+        self.hist.sigLookupTableChanged.connect(self.sync_tiles)
         self.win.addItem(self.hist)
 
         # Draggable line for setting isocurve level
@@ -46,48 +84,207 @@ class ImageProcessor:
         self.hist.vb.setMouseEnabled(y=False)  # makes user interaction a little easier
         self.isoLine.setValue(0.8)
         self.isoLine.setZValue(1000)  # bring iso line above contrast controls
+        self.isoLine.sigDragged.connect(lambda: self.update_isocurve())
+        self.isoLine.sigPositionChangeFinished.connect(lambda: self.update_isocurve(immediate=True))
 
         # Another plot area for displaying ROI data
         self.win.nextRow()
         self.p2 = self.win.addPlot(colspan=2)
         self.p2.setMaximumHeight(250)
+        self.profile_curve = self.p2.plot()
         self.win.resize(800, 800)
         self.win.show()
 
     def process_image(self, file_name):
         """Traitement de l'image à partir d'un fichier FITS"""
-        image_data, header = self.read_fits_image(file_name)
-        self.display_image(self.img, self.hist, self.iso, image_data)
-        self.roi.sigRegionChanged.connect(self.update_plot)
-        self.isoLine.sigDragged.connect(self.update_isocurve)
+        self.show_image(self.prepare_image(file_name))
+
+    def prepare_image(self, file_name):
+        """Ouvrir l'image en memory-map et préparer son affichage (exécutable hors du thread graphique)"""
+        return self.prepare_pyramid(ImagePyramid.from_file(file_name))
+
+    def prepare_pyramid(self, pyramid):
+        levels = sample_levels(pyramid.levels[0], scaling=pyramid.scaling)
+        overview = pyramid.overview()
+        return pyramid, overview, levels, pg.gaussianFilter(overview, (2, 2)), SummedAreaTable(pyramid)
+
+    def prepare_cosmics(self, pyramid, **options):
+        """Rejeter les cosmiques de l'image d'origine (hors du thread graphique).
+
+        Retourne (image nettoyée préparée comme par prepare_image, rectangles des cosmiques) :
+        isocourbes et profils de la ROI sont ensuite calculés sur l'image nettoyée.
+        """
+        options = {**header_options(getattr(pyramid, 'header', None)), **options}
+        cleaned, mask = detect_cosmics(pyramid.levels[0], scaling=pyramid.scaling, **options)
+        clean_pyramid = ImagePyramid(cleaned)
+        clean_pyramid.header = getattr(pyramid, 'header', None)
+        clean_pyramid.build()
+        return self.prepare_pyramid(clean_pyramid), cosmic_regions(mask)
+
+    def show_image(self, prepared, keep_view=False):
+        """Afficher une image préparée par prepare_image (thread graphique)"""
+        pyramid, overview, levels, smoothed, sat = prepared
+        self.clear_tiles()
+        self.cosmic_overlay.clear()
+        self.pyramid = pyramid
+        self.sat = sat
+        self.img.setImage(overview, autoLevels=False)
+        # lignes vers le bas (comme l'ancienne rotation) sans recopier l'image
+        factor = 2 ** pyramid.top
+        self.img.setTransform(QTransform(factor, 0, 0, -factor, 0, pyramid.shape[0]))
+        self.hist.setLevels(*levels)
+        self.iso.setPath(pg.QtGui.QPainterPath())
+        self.iso_engine.set_data(smoothed)
+        self.update_isocurve(immediate=True)
+        if not keep_view:
+            self.p1.autoRange()
+        self.update_tiles()
+        self.update_plot()
+
+    def show_live(self, frame):
+        """Afficher une pose du mode direct (case du tampon circulaire) en place.
+
+        Pas de pyramide ni de table des sommes : l'image, l'histogramme et le profil sont
+        mis à jour depuis le tableau de la pose ; les tampons d'affichage de l'ImageItem
+        sont réutilisés tant que la forme ne change pas. Pas d'isocourbes en mode direct.
+        """
+        first = self.pyramid is None or self.sat is not None or self.pyramid.shape != frame.shape
+        self.pyramid = ImagePyramid(frame)  # niveau 0 seul, aucune copie
+        if first:
+            self.sat = None
+            self.clear_tiles()
+            self.cosmic_overlay.clear()
+            self.iso_engine.clear()
+            self.iso.setPath(pg.QtGui.QPainterPath())
+            self.img.setTransform(QTransform(1, 0, 0, -1, 0, frame.shape[0]))
+        self.img.setImage(frame, autoLevels=False)
+        if first:
+            self.hist.setLevels(*sample_levels(frame))
+            self.p1.autoRange()
+        self.update_plot()
+
+    def show_cosmics(self, regions):
+        """Superposer les cosmiques (ligne, colonne, hauteur, largeur) à l'image affichée"""
+        if not len(regions):
+            self.cosmic_overlay.clear()
+            return
+        rows = self.pyramid.shape[0]
+        x = regions[:, 1] + regions[:, 3] / 2
+        y = rows - (regions[:, 0] + regions[:, 2] / 2)
+        self.cosmic_overlay.setData(x=x, y=y, size=regions[:, 2:].max(axis=1) + 2)
+
+    def roi_rectangle(self):
+        """Rectangle de la ROI en pixels de l'image d'origine : (colonne début, fin, ligne début, fin)"""
+        x, y = self.roi.pos()
+        width, height = self.roi.size()
+        rows = self.pyramid.shape[0]
+        return x, x + width, rows - (y + height), rows - y
+
+    def extraction_aperture(self):
+        """Ouverture d'extraction (lignes de la ROI) et colonnes, pour extraction.run"""
+        x0, x1, row0, row1 = self.roi_rectangle()
+        rows, cols = self.pyramid.shape
+        aperture = {'rows': (max(0, int(round(row0))), min(rows, int(round(row1))))}
+        columns = (max(0, int(round(x0))), min(cols, int(round(x1))))
+        return aperture, columns
+
+    def schedule_plot(self):
+        if not self.profile_timer.isActive():
+            self.profile_timer.start()
 
     def update_plot(self):
         """Mise à jour du tracé basé sur la région d'intérêt"""
+        if self.pyramid is None:
+            return
+        if self.roi.angle() % 360 == 0:
+            # ROI alignée sur les axes : profil lu dans la table des sommes cumulées
+            # (mode direct : moyenne de la région de la pose, sans table)
+            x0, x1, row0, row1 = self.roi_rectangle()
+            if self.sat is not None:
+                result = self.sat.profile(x0, x1, row0, row1)
+            else:
+                result = self.region_profile(x0, x1, row0, row1)
+            if result is None:
+                self.profile_curve.setData([], [])
+            else:
+                self.profile_curve.setData(*result)
+            return
+
+        # ROI tournée : région interpolée dans la vue d'ensemble
         roi_data = self.roi.getArrayRegion(self.img.image, self.img)
         if roi_data is not None and roi_data.size > 0:
-            profile = roi_data.mean(axis=1)  # Calculer le profil spectral en prenant la moyenne sur l'axe y
-            self.p2.plot(profile, clear=True)  # Afficher le profil dans le deuxième graphique
-
-    def update_isocurve(self):
-        """Mise à jour de la courbe d'isocourbes"""
-        self.iso.setLevel(self.isoLine.value())
-
-    def read_fits_image(self, file_name):
-        """Lire les données d'une image FITS"""
-        with fits.open(file_name) as hdul:
-            data = hdul[0].data
-            header = hdul[0].header
-        return data, header
-
-    def display_image(self, img_item, hist_item, iso_item, image_data):
-        """Afficher l'image dans le widget pyqtgraph"""
-        rotated_data = np.rot90(image_data, 3)
-        img_item.setImage(rotated_data)
-        hist_item.setLevels(rotated_data.min(), rotated_data.max())
-        iso_item.setData(pg.gaussianFilter(rotated_data, (2, 2)))
+            profile = roi_data.mean(axis=0)  # Calculer le profil spectral en prenant la moyenne sur l'axe y (lignes)
+            self.profile_curve.setData(profile)  # Afficher le profil dans le deuxième graphique
+
+    def region_profile(self, x0, x1, row0, row1):
+        """Profil moyen du rectangle lu directement au niveau 0 : (x, profil), None si vide"""
+        rows, cols = self.pyramid.shape
+        r0, r1 = np.clip(np.round([row0, row1]).astype(int), 0, rows)
+        c0, c1 = np.clip(np.round([x0, x1]).astype(int), 0, cols)
+        if r1 <= r0 or c1 <= c0:
+            return None
+        return np.arange(c0, c1) + 0.5, self.pyramid.read(0, r0, r1, c0, c1).mean(axis=0)
+
+    def update_tiles(self):
+        """Afficher les tuiles du niveau adapté au zoom courant, pour la zone visible seulement"""
+        if self.pyramid is None:
+            return
+        vb = self.p1.vb
+        level = self.pyramid.level_for(vb.viewPixelSize()[0])
+        visible = set()
+        if level < self.pyramid.top:
+            (x0, x1), (y0, y1) = vb.viewRange()
+            height = self.pyramid.shape[0]
+            visible = {(level, ty, tx) for ty, tx in self.pyramid.tiles(level, x0, x1, height - y1, height - y0)}
+
+        for key in visible:
+            item = self.tiles.get(key)
+            if item is None:
+                item = self.tiles[key] = self.create_tile(*key)
+            self.tiles.move_to_end(key)
+            item.show()
+        for key, item in self.tiles.items():
+            if key not in visible:
+                item.hide()
+        while len(self.tiles) > max(MAX_TILES, len(visible)):
+            key, item = self.tiles.popitem(last=False)
+            self.remove_tile(item)
+
+    def create_tile(self, level, ty, tx):
+        data, row0, col0 = self.pyramid.tile(level, ty, tx)
+        item = pg.ImageItem(axisOrder='row-major')
+        item.setImage(data, autoLevels=False, levels=self.img.levels, lut=self.img.lut)
+        # coordonnées de la vue d'ensemble (parent) : facteur 2^niveau / 2^top
+        scale = 2.0 ** (level - self.pyramid.top)
+        item.setTransform(QTransform(scale, 0, 0, scale, col0 * scale, row0 * scale))
+        item.setParentItem(self.img)
+        item.setZValue(1)  # au-dessus de la vue d'ensemble, sous les isocourbes
+        return item
+
+    def remove_tile(self, item):
+        item.setParentItem(None)
+        if item.scene() is not None:
+            item.scene().removeItem(item)
+
+    def clear_tiles(self):
+        for item in self.tiles.values():
+            self.remove_tile(item)
+        self.tiles.clear()
+
+    def sync_tiles(self):
+        """Reporter niveaux et table de couleurs de l'histogramme sur les tuiles"""
+        for item in self.tiles.values():
+            item.setLevels(self.img.levels)
+            item.setLookupTable(self.img.lut)
+
+    def update_isocurve(self, immediate=False):
+        """Mise à jour de la courbe d'isocourbes (calcul regroupé et en arrière-plan)"""
+        self.iso_engine.request(self.isoLine.value(), immediate=immediate)
 
     def adjust_image(self, image_data, brightness, contrast):
         """Ajuster la luminosité et le contraste d'une image"""
+        import cv2
+
         # Ajuster les niveaux de luminosité et de contraste
         adjusted_image = cv2.convertScaleAbs(image_data, alpha=1 + contrast / 100, beta=brightness)
         return adjusted_image
@@ -0,0 +1,161 @@
+import os
+import hashlib
+import shutil
+
+import numpy as np
+
+import config
+
+
+TILE_SIZE = 512  # pixels par côté de tuile, à chaque niveau
+SAMPLE_PIXELS = 1_000_000  # pixels échantillonnés pour les niveaux de contraste
+DEFAULT_PERCENTILES = (0.5, 99.5)
+BUILD_ROWS = 1024  # lignes lues à la fois pour construire un niveau (mémoire bornée)
+
+
+def open_image(file_name, hdu=0):
+    """Données d'une image FITS en memory-map (non recopiées) et leur mise à l'échelle (bscale, bzero)"""
+    from astropy.io import fits
+
+    # do_not_scale_image_data : sinon BZERO/BSCALE forcent la lecture complète en float
+    with fits.open(file_name, memmap=True, do_not_scale_image_data=True) as hdul:
+        header = hdul[hdu].header
+        data = hdul[hdu].data
+        if data is None or data.ndim != 2:
+            raise ValueError(f"{os.path.basename(file_name)} n'est pas une image 2D")
+        bscale = header.get('BSCALE', 1.0)
+        bzero = header.get('BZERO', 0.0)
+    return data, header, (bscale, bzero)
+
+
+def sample_levels(data, percentiles=DEFAULT_PERCENTILES, scaling=(1.0, 0.0), samples=SAMPLE_PIXELS):
+    """Niveaux de contraste à partir d'un échantillon régulier de l'image (pas de parcours complet)"""
+    step = max(1, int(np.ceil(np.sqrt(data.size / samples))))
+    sample = np.asarray(data[::step, ::step], dtype=np.float32)
+    sample = sample[np.isfinite(sample)]
+    if not sample.size:
+        return 0.0, 1.0
+    low, high = np.percentile(sample, percentiles) * scaling[0] + scaling[1]
+    if high <= low:
+        high = low + 1.0
+    return float(low), float(high)
+
+
+class ImagePyramid:
+    """Pyramide multi-résolution d'une image 2D.
+
+    Le niveau 0 est l'image d'origine (memory-map), le niveau k est moyenné par blocs de
+    2^k x 2^k pixels (float32). Les niveaux sont construits par bandes de lignes et
+    conservés sur disque (.npy relus en memory-map) : rouvrir la même image est immédiat.
+    """
+
+    def __init__(self, data, scaling=(1.0, 0.0), cache_dir=None, tile_size=TILE_SIZE):
+        self.levels = [data]
+        self.scaling = scaling
+        self.cache_dir = cache_dir
+        self.tile_size = tile_size
+        self.shape = data.shape
+
+    @classmethod
+    def from_file(cls, file_name, hdu=0, cache_root=None, max_cache_bytes=4 * 1024**3):
+        data, header, scaling = open_image(file_name, hdu)
+        cache_root = cache_root or os.path.join(config.CACHE_DIR, "pyramids")
+        stat = os.stat(file_name)
+        key = hashlib.sha1(repr((os.path.abspath(file_name), stat.st_size, stat.st_mtime_ns, hdu)).encode()).hexdigest()
+        pyramid = cls(data, scaling, os.path.join(cache_root, key))
+        pyramid.header = header
+        pyramid.build()
+        trim_cache(cache_root, max_cache_bytes, keep=pyramid.cache_dir)
+        return pyramid
+
+    @property
+    def top(self):
+        return len(self.levels) - 1
+
+    def build(self):
+        """Construire (ou relire depuis le disque) les niveaux jusqu'à ce que l'image tienne dans une tuile"""
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            os.utime(self.cache_dir)
+        level = 0
+        while max(self.levels[-1].shape) > self.tile_size and min(self.levels[-1].shape) >= 2:
+            level += 1
+            path = os.path.join(self.cache_dir, f"level{level}.npy") if self.cache_dir else None
+            try:
+                self.levels.append(np.load(path, mmap_mode='r'))
+                continue
+            except (TypeError, OSError, ValueError):
+                pass
+            self.levels.append(self._downsample(self.levels[-1], level == 1, path))
+
+    def _downsample(self, source, scale, path):
+        rows, cols = source.shape[0] // 2, source.shape[1] // 2
+        if path:
+            tmp_path = path + ".tmp.npy"
+            result = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(rows, cols))
+        else:
+            result = np.empty((rows, cols), dtype=np.float32)
+        step = BUILD_ROWS // 2
+        for start in range(0, rows, step):
+            stop = min(start + step, rows)
+            block = np.asarray(source[2 * start:2 * stop, :2 * cols], dtype=np.float32)
+            block = block.reshape(stop - start, 2, cols, 2).mean(axis=(1, 3))
+            if scale:
+                block = block * self.scaling[0] + self.scaling[1]
+            result[start:stop] = block
+        if not path:
+            return result
+        result.flush()
+        del result
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode='r')
+
+    def read(self, level, row0, row1, col0, col1):
+        """Région d'un niveau en float32 natif (mise à l'échelle appliquée au niveau 0)"""
+        block = np.asarray(self.levels[level][row0:row1, col0:col1], dtype=np.float32)
+        if level == 0 and self.scaling != (1.0, 0.0):
+            block = block * self.scaling[0] + self.scaling[1]
+        return block
+
+    def overview(self):
+        """Niveau le plus grossier en entier (une tuile au plus)"""
+        level = self.levels[-1]
+        return self.read(self.top, 0, level.shape[0], 0, level.shape[1])
+
+    def level_for(self, pixel_size):
+        """Niveau adapté à un zoom où un pixel écran couvre pixel_size pixels de l'image"""
+        if not pixel_size or pixel_size <= 1:
+            return 0
+        return int(min(self.top, np.floor(np.log2(pixel_size))))
+
+    def tiles(self, level, x0, x1, row0, row1):
+        """Tuiles (ty, tx) du niveau couvrant les colonnes [x0, x1] et lignes [row0, row1] de l'image d'origine"""
+        factor = 2 ** level
+        rows, cols = self.levels[level].shape
+        tx0 = max(0, int(x0 // factor) // self.tile_size)
+        tx1 = min((cols - 1) // self.tile_size, int(x1 // factor) // self.tile_size)
+        ty0 = max(0, int(row0 // factor) // self.tile_size)
+        ty1 = min((rows - 1) // self.tile_size, int(row1 // factor) // self.tile_size)
+        return [(ty, tx) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+
+    def tile(self, level, ty, tx):
+        """Données d'une tuile et position (ligne, colonne) de son coin dans le niveau"""
+        row0, col0 = ty * self.tile_size, tx * self.tile_size
+        return self.read(level, row0, row0 + self.tile_size, col0, col0 + self.tile_size), row0, col0
+
+
+def trim_cache(cache_root, max_bytes, keep=None):
+    """Supprimer les pyramides les moins récemment ouvertes au-delà de max_bytes"""
+    entries = []
+    for name in os.listdir(cache_root):
+        path = os.path.join(cache_root, name)
+        if os.path.isdir(path):
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            entries.append((os.stat(path).st_mtime, size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
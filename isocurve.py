@@ -0,0 +1,132 @@
+from collections import OrderedDict
+
+import numpy as np
+import pyqtgraph as pg
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QTimer, Signal
+
+
+DEBOUNCE_MS = 40  # délai sans nouveau mouvement avant de lancer le calcul
+LEVEL_STEPS = 512  # niveaux distincts sur la dynamique utile de l'image (clés du cache)
+MAX_CACHED = 64  # courbes gardées en mémoire
+
+
+def isocurve_path(data, level):
+    """Isocourbes de data (lignes, colonnes) au niveau level, en un seul QPainterPath (x = colonne, y = ligne)"""
+    lines = pg.isocurve(data.T, level, connected=True, extendToEdge=True)
+    lines = [np.asarray(line, dtype=np.float64) for line in lines if len(line) > 1]
+    if not lines:
+        return pg.QtGui.QPainterPath()
+    points = np.concatenate(lines) + 0.5  # centre des pixels
+    connect = np.ones(len(points), dtype=np.int32)
+    connect[np.cumsum([len(line) for line in lines]) - 1] = 0  # pas de trait d'une courbe à la suivante
+    return pg.arrayToQPath(points[:, 0], points[:, 1], connect=connect)
+
+
+class _IsocurveSignals(QObject):
+    # (génération, clé du niveau, QPainterPath)
+    done = Signal(int, int, object)
+
+
+class _IsocurveTask(QRunnable):
+    def __init__(self, generation, key, data, level, signals):
+        super().__init__()
+        self.generation = generation
+        self.key = key
+        self.data = data
+        self.level = level
+        self.signals = signals
+
+    def run(self):
+        try:
+            path = isocurve_path(self.data, self.level)
+        except Exception as e:
+            print(f"Calcul des isocourbes impossible: {e}")
+            path = None
+        self.signals.done.emit(self.generation, self.key, path)
+
+
+class IsocurveEngine(QObject):
+    """Isocourbes calculées hors du thread graphique.
+
+    Les courbes sont tracées sur une image lissée et sous-échantillonnée (set_data) ;
+    les demandes rapprochées (glissement de la ligne de niveau) sont regroupées, un
+    seul calcul tourne à la fois et seule la dernière demande en attente est lancée. Chaque
+    niveau (arrondi à LEVEL_STEPS pas sur la dynamique) est gardé en cache.
+    """
+
+    ready = Signal(object)  # QPainterPath à afficher
+
+    def __init__(self, parent=None, delay=DEBOUNCE_MS, max_cached=MAX_CACHED):
+        super().__init__(parent)
+        self.data = None
+        self.max_cached = max_cached
+        self.cache = OrderedDict()
+        self.generation = 0
+        self.step = 1.0
+        self.pending = None  # clé demandée, pas encore calculée
+        self.wanted = None  # dernière clé demandée
+        self.running = False
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self._signals = _IsocurveSignals()
+        self._signals.done.connect(self._on_done)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self._start)
+
+    def set_data(self, data):
+        """Nouvelle image source : le cache et les calculs en cours sont abandonnés"""
+        self.data = np.ascontiguousarray(data, dtype=np.float32)
+        self.generation += 1
+        self.cache.clear()
+        self.pending = self.wanted = None
+        finite = self.data[np.isfinite(self.data)]
+        # dynamique utile (quelques pixels très brillants ne doivent pas grossir le pas)
+        span = float(np.subtract(*np.percentile(finite, [99.5, 0.5]))) if finite.size else 0.0
+        self.step = span / LEVEL_STEPS if span > 0 else 1.0
+
+    def clear(self):
+        """Plus d'image source (mode direct) : les demandes sont ignorées"""
+        self.generation += 1
+        self.data = None
+        self.cache.clear()
+        self.pending = self.wanted = None
+        self.timer.stop()
+
+    def request(self, level, immediate=False):
+        """Demander les courbes au niveau level (réponse par le signal ready)"""
+        if self.data is None:
+            return
+        key = self.wanted = int(round(level / self.step))
+        path = self.cache.get(key)
+        if path is not None:
+            self.cache.move_to_end(key)
+            self.pending = None
+            self.timer.stop()
+            self.ready.emit(path)
+            return
+        self.pending = key
+        if immediate:
+            self.timer.stop()
+            self._start()
+        else:
+            self.timer.start()
+
+    def _start(self):
+        if self.running or self.pending is None:
+            return  # relancé à la fin du calcul en cours
+        key, self.pending = self.pending, None
+        self.running = True
+        self.pool.start(_IsocurveTask(self.generation, key, self.data, key * self.step, self._signals))
+
+    def _on_done(self, generation, key, path):
+        self.running = False
+        if generation == self.generation and path is not None:
+            self.cache[key] = path
+            while len(self.cache) > self.max_cached:
+                self.cache.popitem(last=False)
+            if key == self.wanted or self.pending is not None:
+                self.ready.emit(path)  # affiché même si une demande plus récente attend : suivi du glissement
+        if self.pending is not None:
+            self._start()
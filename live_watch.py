@@ -0,0 +1,277 @@
+"""Mode direct de la page FITS 2D : suivre un dossier où le logiciel d'acquisition écrit ses poses.
+
+Chaque nouvelle pose est lue dès qu'elle est complète (taille annoncée par l'en-tête FITS
+atteinte) dans un tampon circulaire préalloué des N dernières poses, hors du thread
+graphique. L'affichage est cadencé au rafraîchissement de l'écran : une pose remplacée
+par une plus récente avant d'avoir été lue ou affichée est abandonnée. La latence est
+mesurée de l'écriture du fichier (date de modification) à l'affichage effectif.
+"""
+import os
+import time
+from collections import deque
+
+import numpy as np
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QTimer, QFileSystemWatcher, QEvent, Signal
+
+FITS_SUFFIXES = ('.fits', '.fit', '.fts')
+FITS_BLOCK = 2880
+RING_FRAMES = 8  # poses gardées dans le tampon circulaire
+POLL_MS = 100  # relecture du dossier tant qu'une pose est en cours d'écriture
+MAX_LATENCIES = 200  # latences gardées pour les statistiques
+
+
+def frame_layout(file_name):
+    """(taille attendue du fichier, forme, en-tête) d'après l'en-tête FITS ; None si l'en-tête est incomplet"""
+    from astropy.io import fits
+
+    text = b""
+    with open(file_name, "rb") as f:
+        while True:
+            block = f.read(FITS_BLOCK)
+            if len(block) < FITS_BLOCK:
+                return None
+            text += block
+            # carte END : 80 caractères commençant par "END"
+            if any(block[i:i + 8] == b"END     " for i in range(0, FITS_BLOCK, 80)):
+                break
+    header = fits.Header.fromstring(text.decode("ascii"))
+    shape = tuple(header.get(f"NAXIS{axis}", 0) for axis in range(header.get("NAXIS", 0), 0, -1))
+    data_bytes = abs(header.get("BITPIX", 8)) // 8 * int(np.prod(shape)) if shape else 0
+    return len(text) + -(-data_bytes // FITS_BLOCK) * FITS_BLOCK, shape, header
+
+
+def read_frame_into(file_name, out):
+    """Lire la pose dans out (float32, déjà alloué) avec sa mise à l'échelle, sans tableau intermédiaire"""
+    from astropy.io import fits
+
+    with fits.open(file_name, memmap=True, do_not_scale_image_data=True) as hdul:
+        hdu = hdul[0]
+        out[...] = hdu.data
+        bscale, bzero = hdu.header.get('BSCALE', 1.0), hdu.header.get('BZERO', 0.0)
+    if bscale != 1.0:
+        out *= bscale
+    if bzero:
+        out += bzero
+
+
+class RingBuffer:
+    """Les N dernières poses dans un seul tableau préalloué (N, lignes, colonnes)"""
+
+    def __init__(self, capacity, shape):
+        self.frames = np.zeros((capacity,) + tuple(shape), dtype=np.float32)
+        self.names = [None] * capacity
+        self.mtimes = np.zeros(capacity)  # date de modification du fichier de chaque case
+        self.head = -1  # case de la pose la plus récente
+        self.count = 0  # poses écrites depuis la création
+
+    @property
+    def capacity(self):
+        return len(self.frames)
+
+    @property
+    def shape(self):
+        return self.frames.shape[1:]
+
+    def acquire(self, busy=()):
+        """Prochaine case à écrire, en évitant les cases occupées (affichée, en cours de lecture)"""
+        for step in range(1, self.capacity + 1):
+            slot = (self.head + step) % self.capacity
+            if slot not in busy:
+                return slot
+        raise RuntimeError("Tampon circulaire plein")
+
+    def commit(self, slot, name, mtime=0.0):
+        self.names[slot] = name
+        self.mtimes[slot] = mtime
+        self.head = slot
+        self.count += 1
+
+    def ordered(self):
+        """Cases remplies, de la plus ancienne à la plus récente"""
+        filled = min(self.count, self.capacity)
+        return [(self.head - i) % self.capacity for i in range(filled - 1, -1, -1)]
+
+
+class _ReadSignals(QObject):
+    # (fichier, case, date de modification, ok, message d'erreur, durée de lecture)
+    done = Signal(str, int, float, bool, str, float)
+
+
+class _ReadTask(QRunnable):
+    def __init__(self, file_name, slot, mtime, out, signals):
+        super().__init__()
+        self.file_name = file_name
+        self.slot = slot
+        self.mtime = mtime
+        self.out = out
+        self.signals = signals
+
+    def run(self):
+        t0 = time.perf_counter()
+        try:
+            read_frame_into(self.file_name, self.out)
+            self.signals.done.emit(self.file_name, self.slot, self.mtime, True, "", time.perf_counter() - t0)
+        except Exception as e:
+            self.signals.done.emit(self.file_name, self.slot, self.mtime, False, str(e), time.perf_counter() - t0)
+
+
+class PaintProbe(QObject):
+    """Filtre d'événements : signale chaque affichage effectif d'un widget"""
+
+    painted = Signal()
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            self.painted.emit()
+        return False
+
+
+class LiveWatcher(QObject):
+    """Surveillance d'un dossier et lecture des nouvelles poses dans un tampon circulaire.
+
+    frameReady(case) est émis au plus une fois par intervalle d'affichage, pour la pose
+    la plus récente ; l'afficheur signale ensuite shown(case) puis painted() pour que la
+    case ne soit pas réécrite pendant l'affichage et que la latence soit mesurée.
+    """
+
+    frameReady = Signal(int)
+    failed = Signal(str, str)
+
+    def __init__(self, folder, capacity=RING_FRAMES, interval_ms=16, parent=None):
+        super().__init__(parent)
+        self.folder = folder
+        self.capacity = capacity
+        self.ring = None
+        self.known = set(self._list_frames())  # poses déjà présentes : ignorées
+        self.pending = set()  # nouvelles poses pas encore complètes
+        self.queued = None  # pose complète en attente de lecture (la plus récente)
+        self.reading = None  # case en cours de lecture
+        self.shown_slot = None  # case affichée
+        self.unshown = None  # case lue, pas encore affichée
+        self.painting = None  # date de modification de la pose affichée, en attente du Paint
+        self.stats = {'read': 0, 'shown': 0, 'dropped': 0, 'errors': 0}
+        self.latencies = deque(maxlen=MAX_LATENCIES)
+        self.read_times = deque(maxlen=MAX_LATENCIES)
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self._signals = _ReadSignals()
+        self._signals.done.connect(self._on_read)
+        self.watcher = QFileSystemWatcher([folder], self)
+        self.watcher.directoryChanged.connect(self.scan)
+        # les écritures dans un fichier déjà créé ne changent pas le dossier : relecture périodique
+        # tant qu'une nouvelle pose est incomplète
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(POLL_MS)
+        self.poll_timer.timeout.connect(self.scan)
+        self.display_timer = QTimer(self)
+        self.display_timer.setSingleShot(True)
+        self.display_timer.setInterval(interval_ms)
+        self.display_timer.timeout.connect(self._emit_frame)
+
+    def _list_frames(self):
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return []
+        return [os.path.join(self.folder, name) for name in names if name.lower().endswith(FITS_SUFFIXES)]
+
+    def stop(self):
+        self.poll_timer.stop()
+        self.display_timer.stop()
+        self.watcher.directoryChanged.disconnect(self.scan)
+        self.pool.clear()
+
+    def scan(self):
+        """Repérer les nouvelles poses et lancer la lecture de la plus récente qui est complète"""
+        for file_name in self._list_frames():
+            if file_name not in self.known:
+                self.known.add(file_name)
+                self.pending.add(file_name)
+        complete = []
+        for file_name in list(self.pending):
+            try:
+                layout = frame_layout(file_name)
+                size = os.path.getsize(file_name)
+            except OSError:
+                continue  # fichier déplacé ou encore verrouillé
+            except Exception as e:
+                self.pending.discard(file_name)
+                self.stats['errors'] += 1
+                self.failed.emit(file_name, str(e))
+                continue
+            if layout is not None and size >= layout[0]:
+                self.pending.discard(file_name)
+                complete.append((os.stat(file_name).st_mtime, file_name, layout[1]))
+        if self.pending:
+            if not self.poll_timer.isActive():
+                self.poll_timer.start()
+        else:
+            self.poll_timer.stop()
+        if not complete:
+            return
+        complete.sort()
+        # seule la plus récente est lue : les autres sont déjà dépassées
+        self.stats['dropped'] += len(complete) - 1 + (self.queued is not None)
+        self.queued = complete[-1]
+        self._start_read()
+
+    def _start_read(self):
+        if self.reading is not None or self.queued is None:
+            return
+        mtime, file_name, shape = self.queued
+        self.queued = None
+        if len(shape) != 2:
+            self.stats['errors'] += 1
+            self.failed.emit(file_name, f"{os.path.basename(file_name)} n'est pas une image 2D")
+            return
+        if self.ring is None or self.ring.shape != shape:
+            self.ring = RingBuffer(self.capacity, shape)
+            self.shown_slot = self.unshown = self.painting = None
+        slot = self.ring.acquire(busy=(self.shown_slot, self.unshown))
+        self.reading = slot
+        self.pool.start(_ReadTask(file_name, slot, mtime, self.ring.frames[slot], self._signals))
+
+    def _on_read(self, file_name, slot, mtime, ok, message, elapsed):
+        self.reading = None
+        if ok:
+            self.stats['read'] += 1
+            self.read_times.append(elapsed)
+            self.ring.commit(slot, file_name, mtime)
+            if self.unshown is not None:
+                self.stats['dropped'] += 1  # lue mais dépassée avant d'être affichée
+            self.unshown = slot
+            if not self.display_timer.isActive():
+                self.display_timer.start()
+        else:
+            self.stats['errors'] += 1
+            self.failed.emit(file_name, message)
+        self._start_read()
+
+    def _emit_frame(self):
+        if self.unshown is None:
+            return
+        slot, self.unshown = self.unshown, None
+        self.frameReady.emit(slot)
+
+    def shown(self, slot):
+        """La case slot est affichée : elle n'est plus réécrite jusqu'à la suivante"""
+        self.shown_slot = slot
+        self.stats['shown'] += 1
+        self.painting = self.ring.mtimes[slot]
+
+    def painted(self):
+        """Affichage effectif (événement Paint) : latence depuis l'écriture du fichier"""
+        if self.painting is not None:
+            self.latencies.append(time.time() - self.painting)
+            self.painting = None
+
+    def summary(self):
+        text = (f"{self.stats['shown']} affichée(s), {self.stats['read']} lue(s), "
+                f"{self.stats['dropped']} abandonnée(s)")
+        if self.latencies:
+            text += (f", latence médiane {np.median(self.latencies) * 1e3:.0f} ms "
+                     f"(lecture {np.median(self.read_times) * 1e3:.0f} ms)")
+        if self.stats['errors']:
+            text += f", {self.stats['errors']} erreur(s)"
+        return text
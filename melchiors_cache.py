@@ -0,0 +1,183 @@
+import os
+import io
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import requests
+
+import config
+
+
+MELCHIORS_URL = "https://royer.se/melchiors/spectra"
+
+
+class MelchiorsCache:
+    """Cache local des spectres de référence MELCHIORS.
+
+    Chaque fichier téléchargé est identifié par l'empreinte SHA-256 de son contenu.
+    Les colonnes utiles sont stockées en .npy natifs pour être relues en memory-map.
+    La taille totale est plafonnée (éviction LRU).
+    """
+
+    columns = ('wave', 'flux_tac')
+
+    def __init__(self, cache_dir=None, max_bytes=2 * 1024**3, offline=None, base_url=MELCHIORS_URL, timeout=60):
+        self.cache_dir = cache_dir or os.path.join(config.CACHE_DIR, "melchiors")
+        self.max_bytes = max_bytes
+        self.offline = config.OFFLINE if offline is None else offline
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self._verified = set()  # entrées déjà vérifiées pendant cette session
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.index = self._load_index()
+
+    def url(self, ref_number):
+        return f"{self.base_url}/00{ref_number}_melchiors_spectrum.fits.gz"
+
+    def get(self, ref_number):
+        """Retourner (wave, flux_tac) du spectre de référence, téléchargé si absent du cache"""
+        url = self.url(ref_number)
+        digest = self.index['urls'].get(url)
+
+        if digest is not None:
+            try:
+                arrays = self._load_entry(digest)
+                self._touch(digest)
+                return arrays
+            except (OSError, ValueError) as e:
+                print(f"Entrée de cache invalide pour {url}: {e}")
+                self._remove_entry(digest)
+
+        if self.offline:
+            raise FileNotFoundError(f"Spectre MELCHIORS {ref_number} absent du cache (mode hors-ligne)")
+
+        digest = self._download(url)
+        return self._load_entry(digest)
+
+    def clear(self):
+        """Vider entièrement le cache"""
+        for digest in list(self.index['entries']):
+            self._remove_entry(digest)
+
+    def total_size(self):
+        return sum(entry['size'] for entry in self.index['entries'].values())
+
+    def _download(self, url):
+        response = requests.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+
+        if digest not in self.index['entries']:
+            from astropy.table import Table
+
+            if content[:2] == b'\x1f\x8b':
+                content = gzip.decompress(content)
+            table = Table.read(io.BytesIO(content), format='fits')
+            self._store_entry(digest, table)
+
+        self.index['urls'][url] = digest
+        self._touch(digest)
+        self._evict(keep=digest)
+        return digest
+
+    def _store_entry(self, digest, table):
+        entry_dir = self._entry_dir(digest)
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        checksums = {}
+        size = 0
+        try:
+            for name in self.columns:
+                path = os.path.join(tmp_dir, name + ".npy")
+                # ordre d'octets natif : relecture sans conversion
+                column = np.asarray(table[name], dtype=np.float64)
+                np.save(path, np.ascontiguousarray(column))
+                checksums[name] = self._file_checksum(path)
+                size += os.path.getsize(path)
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir)
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            os.replace(tmp_dir, entry_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self.index['entries'][digest] = {'size': size, 'atime': time.time(), 'checksums': checksums}
+        self._verified.add(digest)
+
+    def _load_entry(self, digest):
+        entry = self.index['entries'].get(digest)
+        if entry is None:
+            raise ValueError("entrée inconnue")
+        entry_dir = self._entry_dir(digest)
+
+        # Contrôle d'intégrité complet une fois par session, taille ensuite
+        if digest not in self._verified:
+            for name in self.columns:
+                path = os.path.join(entry_dir, name + ".npy")
+                if self._file_checksum(path) != entry['checksums'][name]:
+                    raise ValueError(f"somme de contrôle incorrecte pour {name}")
+            self._verified.add(digest)
+
+        arrays = []
+        for name in self.columns:
+            arrays.append(np.load(os.path.join(entry_dir, name + ".npy"), mmap_mode='r'))
+        return tuple(arrays)
+
+    def _remove_entry(self, digest):
+        self.index['entries'].pop(digest, None)
+        self.index['urls'] = {url: d for url, d in self.index['urls'].items() if d != digest}
+        self._verified.discard(digest)
+        shutil.rmtree(self._entry_dir(digest), ignore_errors=True)
+        self._save_index()
+
+    def _evict(self, keep=None):
+        """Supprimer les entrées les moins récemment utilisées au-delà de max_bytes"""
+        entries = sorted(self.index['entries'].items(), key=lambda item: item[1]['atime'])
+        total = self.total_size()
+        for digest, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            total -= entry['size']
+            self._remove_entry(digest)
+
+    def _touch(self, digest):
+        self.index['entries'][digest]['atime'] = time.time()
+        self._save_index()
+
+    def _entry_dir(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def _file_checksum(self, path):
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault('urls', {})
+        index.setdefault('entries', {})
+        return index
+
+    def _save_index(self):
+        # fichier temporaire propre à chaque écrivain, comme pour les entrées (mkdtemp)
+        with tempfile.NamedTemporaryFile('w', dir=self.cache_dir, suffix=".tmp", delete=False) as f:
+            json.dump(self.index, f)
+        try:
+            os.replace(f.name, self.index_path)
+        except OSError:
+            os.remove(f.name)
+            raise
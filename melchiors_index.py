@@ -0,0 +1,89 @@
+import os
+import re
+import pickle
+
+
+_IDENTIFIER_RE = re.compile(r'^(HD|HR|HIP)\s*0*(\d+)\s*([A-Z]*)$')
+
+
+def normalize_identifier(name):
+    """Normaliser un identifiant HD/HR/HIP : 'hd0012345' -> 'HD 12345'"""
+    if name is None:
+        return None
+    name = " ".join(str(name).upper().split())
+    match = _IDENTIFIER_RE.match(name)
+    if match is None:
+        return None
+    catalog, number, suffix = match.groups()
+    return f"{catalog} {number}{suffix}"
+
+
+class MelchiorsIndex:
+    """Index compilé identifiant -> numéros MELCHIORS construit à partir de melchiors_lib.xlsx.
+
+    L'index est enregistré dans un fichier binaire à côté du classeur et n'est
+    reconstruit que si la date de modification du classeur change.
+    """
+
+    def __init__(self, xlsx_path="melchiors_lib.xlsx", sidecar_path=None):
+        self.xlsx_path = xlsx_path
+        self.sidecar_path = sidecar_path or os.path.splitext(xlsx_path)[0] + ".idx"
+        self.index = None
+        self._stamp = None
+
+    def lookup(self, name):
+        """Retourner le premier numéro MELCHIORS associé à un identifiant HD/HR/HIP"""
+        ids = self.lookup_all(name)
+        if not ids:
+            raise ValueError(f"{name} absent de la bibliothèque MELCHIORS")
+        return ids[0]
+
+    def lookup_all(self, name):
+        """Retourner tous les numéros MELCHIORS associés à un identifiant, dans l'ordre du classeur"""
+        self._ensure_loaded()
+        return self.index.get(normalize_identifier(name), [])
+
+    def __contains__(self, name):
+        return bool(self.lookup_all(name))
+
+    def _ensure_loaded(self):
+        stamp = self._xlsx_stamp()
+        if self.index is not None and stamp == self._stamp:
+            return
+
+        try:
+            with open(self.sidecar_path, 'rb') as f:
+                stored = pickle.load(f)
+            if stored['stamp'] == stamp:
+                self.index, self._stamp = stored['index'], stamp
+                return
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError):
+            pass
+
+        self.index, self._stamp = self._build(), stamp
+        try:
+            tmp_path = self.sidecar_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'stamp': stamp, 'index': self.index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.sidecar_path)
+        except OSError as e:
+            print(f"Impossible d'enregistrer l'index MELCHIORS: {e}")
+
+    def _build(self):
+        import pandas as pd
+
+        df = pd.read_excel(self.xlsx_path, usecols=['ID', 'Name1', 'Name2'])
+        index = {}
+        for ref, name1, name2 in zip(df['ID'].tolist(), df['Name1'].tolist(), df['Name2'].tolist()):
+            for name in (name1, name2):
+                key = normalize_identifier(name)
+                if key is None:
+                    continue
+                ids = index.setdefault(key, [])
+                if int(ref) not in ids:
+                    ids.append(int(ref))
+        return index
+
+    def _xlsx_stamp(self):
+        stat = os.stat(self.xlsx_path)
+        return (stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,144 @@
+"""Observabilité nocturne de tout le catalogue.
+
+La grille temporelle de la nuit (temps sidéral, hauteur du Soleil) est calculée une
+fois par (date, lieu) avec astropy et mise en cache ; les coordonnées des étoiles sont
+ramenées à l'équinoxe de la date en une seule transformation, puis la hauteur des
+N étoiles aux T instants est un calcul numpy (N x T) par blocs.
+"""
+import functools
+
+import numpy as np
+
+import config
+
+DEFAULT_MIN_ALTITUDE = 30.0  # degrés
+DEFAULT_TWILIGHT = -12.0  # crépuscule nautique
+DEFAULT_STEP = 5.0  # minutes
+CHUNK_STARS = 4096  # étoiles par bloc (mémoire N x T bornée)
+
+SIDEREAL_RATIO = 0.9972695663  # heure sidérale / heure solaire moyenne
+
+
+class Night:
+    """Grille temporelle d'une nuit : instants, temps sidéral local, hauteur du Soleil"""
+
+    __slots__ = ('date', 'latitude', 'longitude', 'height', 'step', 'twilight',
+                 'times', 'lst', 'sun_altitude', 'dark')
+
+    def __init__(self, date, latitude, longitude, height, step, twilight, times, lst, sun_altitude):
+        self.date = date
+        self.latitude = latitude
+        self.longitude = longitude
+        self.height = height
+        self.step = step
+        self.twilight = twilight
+        self.times = times  # datetime64[s] UTC
+        self.lst = lst  # radians
+        self.sun_altitude = sun_altitude  # degrés
+        self.dark = sun_altitude < twilight
+
+    @property
+    def dark_hours(self):
+        return self.dark.sum() * self.step / 60
+
+    def dark_interval(self):
+        """(début, fin) de la nuit noire, ou None (jour polaire)"""
+        if not self.dark.any():
+            return None
+        indices = np.flatnonzero(self.dark)
+        return self.times[indices[0]], self.times[indices[-1]]
+
+
+@functools.lru_cache(maxsize=16)
+def night_grid(date, latitude, longitude, height=0.0, step=DEFAULT_STEP, twilight=DEFAULT_TWILIGHT):
+    """Grille de la nuit qui commence le soir de date ('AAAA-MM-JJ'), de midi à midi (heure solaire locale)"""
+    from astropy.time import Time
+    from astropy.coordinates import EarthLocation, AltAz, get_sun
+    import astropy.units as u
+    from astropy.utils import iers
+
+    if config.OFFLINE:
+        iers.conf.auto_download = False  # tables IERS embarquées
+    location = EarthLocation(lat=latitude * u.deg, lon=longitude * u.deg, height=height * u.m)
+    # midi solaire local approché à partir de la longitude
+    start = np.datetime64(date, 's') + np.timedelta64(12 * 3600 - int(longitude / 15 * 3600), 's')
+    offsets = np.arange(0, 24 * 60 + step / 2, step)
+    times = start + (offsets * 60).astype('timedelta64[s]')
+
+    obstime = Time(times.astype('datetime64[ms]').astype(str), scale='utc')
+    lst = obstime.sidereal_time('apparent', longitude=location.lon).rad
+    sun = get_sun(obstime).transform_to(AltAz(obstime=obstime, location=location))
+    return Night(date, latitude, longitude, height, step, twilight, times, lst, sun.alt.deg)
+
+
+def coordinates_of_date(ra_deg, dec_deg, night):
+    """Coordonnées J2000 -> équinoxe du milieu de la nuit (radians) ; NaN conservés"""
+    from astropy.time import Time
+    from astropy.coordinates import SkyCoord, FK5
+    import astropy.units as u
+
+    ra_deg = np.asarray(ra_deg, dtype=np.float64)
+    dec_deg = np.asarray(dec_deg, dtype=np.float64)
+    valid = np.isfinite(ra_deg) & np.isfinite(dec_deg)
+    ra = np.full(ra_deg.shape, np.nan)
+    dec = np.full(dec_deg.shape, np.nan)
+    if valid.any():
+        middle = Time(str(night.times[len(night.times) // 2]), scale='utc')
+        coords = SkyCoord(ra=ra_deg[valid] * u.deg, dec=dec_deg[valid] * u.deg, frame='fk5',
+                          equinox='J2000').transform_to(FK5(equinox=middle))
+        ra[valid] = coords.ra.rad
+        dec[valid] = coords.dec.rad
+    return ra, dec
+
+
+def altitude(ra, dec, night):
+    """Hauteur (degrés) des étoiles (ra, dec en radians à l'équinoxe de la date) aux instants de night : N x T"""
+    latitude = np.radians(night.latitude)
+    hour_angle = night.lst[None, :] - ra[:, None]
+    sin_alt = (np.sin(latitude) * np.sin(dec)[:, None]
+               + np.cos(latitude) * np.cos(dec)[:, None] * np.cos(hour_angle))
+    return np.degrees(np.arcsin(np.clip(sin_alt, -1.0, 1.0)))
+
+
+def airmass(altitude_deg):
+    """Masse d'air (Pickering 2002), NaN sous l'horizon"""
+    altitude_deg = np.asarray(altitude_deg, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        result = 1.0 / np.sin(np.radians(altitude_deg + 244.0 / (165.0 + 47.0 * np.abs(altitude_deg) ** 1.1)))
+    return np.where(altitude_deg > 0, result, np.nan)
+
+
+def observability(ra_deg, dec_deg, night, min_altitude=DEFAULT_MIN_ALTITUDE):
+    """Observabilité des étoiles pendant la nuit noire.
+
+    Retourne un dict de tableaux de longueur N :
+    alt_max (hauteur maximale de nuit, degrés), airmass (masse d'air minimale de nuit),
+    transit (passage au méridien le plus proche du milieu de la nuit, datetime64 UTC),
+    obs_hours (heures de nuit au-dessus de min_altitude).
+    """
+    ra, dec = coordinates_of_date(ra_deg, dec_deg, night)
+    n = len(ra)
+    alt_max = np.full(n, np.nan)
+    obs_hours = np.zeros(n)
+    dark = night.dark
+
+    for start in range(0, n, CHUNK_STARS):
+        stop = min(start + CHUNK_STARS, n)
+        alt = altitude(ra[start:stop], dec[start:stop], night)
+        if dark.any():
+            alt_max[start:stop] = alt[:, dark].max(axis=1)
+            obs_hours[start:stop] = (alt[:, dark] >= min_altitude).sum(axis=1) * night.step / 60
+
+    # Passage au méridien : angle horaire nul, ramené à +-12 h sidérales du milieu de la nuit
+    middle = len(night.times) // 2
+    delta = np.mod(ra - night.lst[middle] + np.pi, 2 * np.pi) - np.pi
+    seconds = np.where(np.isfinite(delta), delta / (2 * np.pi) * 24 * 3600 * SIDEREAL_RATIO, 0)
+    transit = night.times[middle] + seconds.astype('timedelta64[s]')
+    transit[~np.isfinite(delta)] = np.datetime64('NaT')
+
+    return {
+        'alt_max': alt_max,
+        'airmass': airmass(alt_max),
+        'transit': transit,
+        'obs_hours': np.where(np.isfinite(ra), obs_hours, np.nan),
+    }
@@ -0,0 +1,127 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ProductCache:
+    """Cache LRU des produits dérivés d'un spectre (ligne de base, spectre nettoyé, ...).
+
+    Les clés combinent l'empreinte du contenu des tableaux d'entrée et les paramètres
+    du traitement. La mémoire est bornée ; les entrées évincées peuvent être écrites
+    sur disque (spill_dir) et relues au besoin.
+    """
+
+    def __init__(self, max_bytes=256 * 1024**2, spill_dir=None, max_spill_bytes=2 * 1024**3):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    @staticmethod
+    def hash_arrays(arrays):
+        sha = hashlib.sha1()
+        for array in arrays:
+            array = np.ascontiguousarray(array)
+            sha.update(str((array.shape, array.dtype.str)).encode())
+            sha.update(array.data)
+        return sha.hexdigest()
+
+    @classmethod
+    def key(cls, arrays, **params):
+        """Clé = empreinte des données + paramètres du traitement"""
+        return cls.hash_arrays(arrays) + "-" + hashlib.sha1(repr(sorted(params.items())).encode()).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            arrays = self._entries.get(key)
+            if arrays is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return arrays
+
+        arrays = self._load_spilled(key)
+        if arrays is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.put(key, arrays)
+        return arrays
+
+    def put(self, key, arrays):
+        arrays = tuple(np.array(array) for array in arrays)
+        for array in arrays:
+            array.setflags(write=False)  # partagés entre les consommateurs
+        size = sum(array.nbytes for array in arrays)
+        if size > self.max_bytes:
+            return arrays
+
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= sum(array.nbytes for array in self._entries.pop(key))
+            self._entries[key] = arrays
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                old_key, old_arrays = self._entries.popitem(last=False)
+                self.nbytes -= sum(array.nbytes for array in old_arrays)
+                evicted.append((old_key, old_arrays))
+
+        for old_key, old_arrays in evicted:
+            self._spill(old_key, old_arrays)
+        return arrays
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, key + ".npz")
+
+    def _spill(self, key, arrays):
+        if not self.spill_dir:
+            return
+        path = self._spill_path(key)
+        try:
+            tmp_path = path + ".tmp.npz"
+            np.savez(tmp_path, *arrays)
+            os.replace(tmp_path, path)
+            self._trim_spill()
+        except OSError as e:
+            print(f"Écriture du cache disque impossible: {e}")
+
+    def _load_spilled(self, key):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(key)
+        try:
+            with np.load(path) as data:
+                arrays = tuple(data[f"arr_{i}"] for i in range(len(data.files)))
+            os.utime(path)
+            return arrays
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _trim_spill(self):
+        """Supprimer les fichiers les moins récemment utilisés au-delà de max_spill_bytes"""
+        files = []
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            if name.endswith(".npz") and not name.endswith(".tmp.npz"):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_spill_bytes:
+                break
+            os.remove(path)
+            total -= size
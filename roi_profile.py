@@ -0,0 +1,53 @@
+import numpy as np
+
+from image_pyramid import BUILD_ROWS
+
+
+SAT_MAX_BYTES = 128 * 1024**2  # taille maximale de la table (float64)
+
+
+class SummedAreaTable:
+    """Table des sommes cumulées (2D) d'un niveau de la pyramide.
+
+    table[r, c] = somme des pixels des lignes < r et colonnes < c : la somme de n'importe
+    quel rectangle coûte quatre lectures, et le profil d'une ROI alignée sur les axes
+    (moyenne des lignes, colonne par colonne) la différence de deux lignes de la table.
+    Le niveau le plus fin dont la table tient dans max_bytes est utilisé ; les pixels
+    non finis comptent pour zéro.
+    """
+
+    def __init__(self, pyramid, max_bytes=SAT_MAX_BYTES):
+        level = 0
+        while level < pyramid.top and np.prod(np.add(pyramid.levels[level].shape, 1)) * 8 > max_bytes:
+            level += 1
+        self.level = level
+        self.factor = 2 ** level
+        rows, cols = pyramid.levels[level].shape
+        self.shape = (rows, cols)
+
+        table = np.zeros((rows + 1, cols + 1))
+        for start in range(0, rows, BUILD_ROWS):
+            stop = min(start + BUILD_ROWS, rows)
+            block = np.nan_to_num(pyramid.read(level, start, stop, 0, cols).astype(np.float64),
+                                  nan=0.0, posinf=0.0, neginf=0.0)
+            table[start + 1:stop + 1, 1:] = table[start, 1:] + np.cumsum(np.cumsum(block, axis=0), axis=1)
+        self.table = table
+
+    def box_sum(self, row0, row1, col0, col1):
+        """Somme des pixels [row0, row1) x [col0, col1) du niveau de la table"""
+        t = self.table
+        return t[row1, col1] - t[row0, col1] - t[row1, col0] + t[row0, col0]
+
+    def profile(self, x0, x1, row0, row1):
+        """Profil moyen (colonne par colonne) du rectangle donné en pixels de l'image d'origine.
+
+        Retourne (x, profil) avec x au centre des colonnes, en pixels d'origine ; None si vide.
+        """
+        rows, cols = self.shape
+        r0, r1 = np.clip(np.round(np.array([row0, row1]) / self.factor).astype(int), 0, rows)
+        c0, c1 = np.clip(np.round(np.array([x0, x1]) / self.factor).astype(int), 0, cols)
+        if r1 <= r0 or c1 <= c0:
+            return None
+        sums = np.diff(self.table[r1, c0:c1 + 1] - self.table[r0, c0:c1 + 1])
+        x = (np.arange(c0, c1) + 0.5) * self.factor
+        return x, sums / (r1 - r0)
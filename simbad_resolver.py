@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import tempfile
+import threading
+
+import config
+
+RETRY_DELAY = 10 * 60  # secondes avant de redemander un nom dont la résolution a échoué
+
+
+class SimbadBackend:
+    """Backend SIMBAD (astroquery) : une requête TAP groupée, puis résolution nom par nom des absents"""
+
+    def query(self, names):
+        from astroquery.simbad import Simbad
+
+        result = {}
+        quoted = ", ".join("'" + name.replace("'", "''") + "'" for name in names)
+        try:
+            table = Simbad.query_tap(
+                "SELECT i1.id AS name, i2.id AS ident FROM ident AS i1 "
+                "JOIN ident AS i2 ON i1.oidref = i2.oidref "
+                f"WHERE i1.id IN ({quoted})"
+            )
+            for name, ident in zip(table['name'], table['ident']):
+                result.setdefault(str(name), []).append(str(ident))
+        except Exception as e:
+            print(f"Requête SIMBAD groupée impossible: {e}")
+
+        # Les noms usuels (ex. 'omi And') ne figurent pas tels quels dans la table ident.
+        # Un nom dont la requête échoue est absent du résultat : ni résolu ni mis en cache.
+        for name in names:
+            if name not in result:
+                try:
+                    table = Simbad.query_objectids(name)
+                except Exception as e:
+                    print(f"Résolution SIMBAD impossible pour {name}: {e}")
+                    continue
+                if table is None or len(table) == 0:
+                    result[name] = []
+                else:
+                    column = 'ID' if 'ID' in table.colnames else 'id'
+                    result[name] = [str(ident) for ident in table[column]]
+        return result
+
+
+class SimbadResolver:
+    """Résolution nom d'objet -> identifiants SIMBAD avec cache persistant et durée de validité"""
+
+    def __init__(self, backend=None, cache_path=None, ttl=30 * 24 * 3600, offline=None, retry_delay=RETRY_DELAY):
+        self.backend = backend or SimbadBackend()
+        self.cache_path = cache_path or os.path.join(config.CACHE_DIR, "simbad_ids.json")
+        self.ttl = ttl
+        self.retry_delay = retry_delay
+        self.offline = config.OFFLINE if offline is None else offline
+        self.lookups = 0  # nombre de requêtes au backend
+        self._lock = threading.Lock()
+        self._cache = self._load_cache()
+
+    def resolve(self, name):
+        """Retourner la liste des identifiants SIMBAD d'un objet"""
+        return self.resolve_many([name])[name]
+
+    def _is_missing(self, entry, now):
+        if entry is None:
+            return True
+        if 'failed' in entry:
+            return now - entry['failed'] >= self.retry_delay  # échec : redemandé seulement après retry_delay
+        return not self.offline and now - entry['time'] > self.ttl
+
+    def resolve_many(self, names):
+        """Résoudre en une seule requête tous les noms distincts absents du cache.
+
+        Un nom dont la résolution échoue (SIMBAD injoignable) est noté dans le cache et n'est
+        redemandé qu'après retry_delay ; ses identifiants précédents, s'il en a, sont conservés.
+        """
+        now = time.time()
+        with self._lock:
+            missing = [name for name in dict.fromkeys(names) if self._is_missing(self._cache.get(name), now)]
+
+        if missing and not self.offline:
+            self.lookups += 1
+            try:
+                found = self.backend.query(missing)
+            except Exception:
+                self._record(missing, {}, now)
+                raise
+            self._record(missing, found, now)
+
+        with self._lock:
+            return {name: list(self._cache[name]['ids']) if name in self._cache else [] for name in names}
+
+    def _record(self, names, found, now):
+        with self._lock:
+            for name in names:
+                if name in found:
+                    self._cache[name] = {'ids': list(found[name]), 'time': now}
+                else:  # erreur du backend pour ce nom
+                    self._cache.setdefault(name, {'ids': [], 'time': 0.0})['failed'] = now
+            self._save_cache()
+
+    def clear(self):
+        with self._lock:
+            self._cache = {}
+            self._save_cache()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self):
+        # fichier temporaire propre à chaque écrivain : plusieurs processus partagent le cache
+        directory = os.path.dirname(self.cache_path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix=".tmp", delete=False) as f:
+            json.dump(self._cache, f)
+        try:
+            os.replace(f.name, self.cache_path)
+        except OSError:
+            os.remove(f.name)
+            raise
+
+
+def hd_from_identifiers(identifiers):
+    """Retourner le dernier identifiant HD de la liste (None si absent)"""
+    hd_number = None
+    for identifier in identifiers:
+        if 'HD' in identifier:
+            hd_number = identifier
+    return hd_number
@@ -0,0 +1,90 @@
+import numpy as np
+from astropy.io import fits
+
+
+# Codes d'algorithme spectral non linéaire (FITS WCS, article III) traités par WCSLIB
+NONLINEAR_ALGORITHMS = {'F2W', 'F2V', 'F2A', 'W2F', 'W2V', 'W2A', 'V2F', 'V2W', 'V2A', 'A2F', 'A2W', 'A2V',
+                        'GRI', 'GRA', 'TAB'}
+
+
+def wavelength_axis(header, n):
+    """Calculer l'axe des longueurs d'onde (Å) à partir du WCS de l'axe 1"""
+    ctype = str(header.get('CTYPE1', '')).strip().upper()
+    # 'WAVE-LOG', 'AWAV-TAB' ; 'LINEAR', 'WAVELENGTH', '' : sans code d'algorithme
+    parts = ctype.split('-')
+    algorithm = parts[-1] if len(parts) > 1 else ''
+
+    if algorithm in NONLINEAR_ALGORITHMS:
+        # Dispersion non linéaire (-TAB, -F2W, ...) : on passe par WCSLIB
+        return _wcs_wavelength_axis(header, n)
+
+    crval = header['CRVAL1']
+    cdelt = header.get('CDELT1', header.get('CD1_1', 1.0))
+    crpix = header.get('CRPIX1', 1.0)
+    offset = (np.arange(n, dtype=np.float64) + 1.0 - crpix) * cdelt
+
+    if algorithm == 'LOG':
+        return crval * np.exp(offset / crval)
+    if header.get('DC-FLAG', 0) == 1:
+        # Convention IRAF : log10(lambda) linéaire
+        return 10 ** (crval + offset)
+    return crval + offset
+
+
+def _wcs_wavelength_axis(header, n):
+    from astropy.wcs import WCS
+    import astropy.units as u
+
+    wcs = WCS(header, naxis=1)
+    world = wcs.all_pix2world(np.arange(n, dtype=np.float64), 0)[0]
+    unit = u.Unit(wcs.wcs.cunit[0] or 'Angstrom')
+    return (world * unit).to_value(u.AA, equivalencies=u.spectral())
+
+
+class Spectrum1D:
+    """Spectre 1D : flux en memory-map, axe des longueurs d'onde calculé à la demande"""
+
+    __slots__ = ('flux', 'header', 'title', 'hd_number', 'obj_name', 'date_obs', 'resolution',
+                 '_wavelength', '_native_flux')
+
+    def __init__(self, flux, header, title=None, hd_number=None, obj_name=None, date_obs=None, resolution=None):
+        self.flux = flux
+        self.header = header
+        self.title = title
+        self.hd_number = hd_number
+        self.obj_name = obj_name
+        self.date_obs = date_obs
+        self.resolution = resolution
+        self._wavelength = None
+        self._native_flux = None
+
+    @classmethod
+    def from_fits(cls, file_name):
+        """Ouvrir le HDU primaire en memory-map (les données ne sont lues qu'à l'accès)"""
+        with fits.open(file_name, memmap=True) as hdul:
+            data = hdul[0].data
+            header = hdul[0].header
+        return cls(data, header)
+
+    def __len__(self):
+        return len(self.flux)
+
+    @property
+    def wavelength(self):
+        if self._wavelength is None:
+            self._wavelength = wavelength_axis(self.header, len(self.flux))
+        return self._wavelength
+
+    @property
+    def native_flux(self):
+        """Flux dans l'ordre d'octets natif.
+
+        Vue directe sur les données si elles sont déjà natives ; sinon une seule
+        conversion, partagée par tous les consommateurs du spectre.
+        """
+        if self._native_flux is None:
+            if self.flux.dtype.isnative:
+                self._native_flux = self.flux
+            else:
+                self._native_flux = self.flux.astype(self.flux.dtype.newbyteorder('='))
+        return self._native_flux
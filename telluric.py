@@ -0,0 +1,310 @@
+import os
+import numpy as np
+from scipy.special import wofz
+
+import config
+
+
+TELLURIC_LINES = [
+    6508.603, 6511.999, 6512.242, 6514.727, 6516.437, 6516.543, 6516.625, 6519.467,
+    6523.850, 6532.459, 6534.000, 6534.014, 6536.726, 6542.317, 6543.912, 6547.705,
+    6548.627, 6552.632, 6557.181, 6558.149, 6560.501, 6564.208, 6568.806, 6572.087,
+    6574.860, 6580.794, 6586.559, 6594.375, 6599.365, 6605.566, 6612.550
+]
+
+SQRT2 = np.sqrt(2.0)
+SQRT2PI = np.sqrt(2.0 * np.pi)
+# Re(w(i/sqrt(2))) : hauteur du profil de Voigt (gamma = sigma) pour amplitude = sigma*sqrt(2pi)
+VOIGT_PEAK = wofz(1j / SQRT2).real
+
+
+def voigt(x, amplitude, center, sigma):
+    """Profil de Voigt normalisé (gamma = sigma, comme lmfit.models.VoigtModel)"""
+    z = (x - center + 1j * sigma) / (sigma * SQRT2)
+    return amplitude * wofz(z).real / (sigma * SQRT2PI)
+
+
+def levenberg_marquardt(residuals, jacobian, p0, lower, upper, max_iter=200, tol=1e-6):
+    """Levenberg-Marquardt borné pour un jacobien creux.
+
+    Les équations normales J^T J (3 paramètres par raie) restent petites :
+    on les résout en dense au lieu de factoriser le jacobien complet.
+    L'amortissement suit la règle de Nielsen (rapport gain réel / gain prédit).
+    """
+    p = p0.copy()
+    r = residuals(p)
+    cost = r @ r
+    damping = 1e-3
+    nu = 2.0
+    for _ in range(max_iter):
+        jac = jacobian(p)
+        jtj = (jac.T @ jac).toarray()
+        gradient = jac.T @ r
+        diagonal = np.maximum(np.diag(jtj), 1e-12)
+        while True:
+            try:
+                step = np.linalg.solve(jtj + damping * np.diag(diagonal), -gradient)
+            except np.linalg.LinAlgError:
+                step = np.zeros_like(p)
+            p_new = np.clip(p + step, lower, upper)
+            step = p_new - p
+            r_new = residuals(p_new)
+            cost_new = r_new @ r_new
+            predicted = -(2 * gradient @ step + step @ jtj @ step)
+            if cost_new < cost and predicted > 0:
+                rho = (cost - cost_new) / predicted
+                damping *= max(1 / 3, 1 - (2 * rho - 1) ** 3)
+                nu = 2.0
+                break
+            damping *= nu
+            nu *= 2
+            if damping > 1e10:
+                return p, r
+        improvement = (cost - cost_new) / max(cost, 1e-300)
+        p, r, cost = p_new, r_new, cost_new
+        if improvement < tol:
+            break
+    return p, r
+
+
+class TelluricFitter:
+    """Ajustement simultané des raies telluriques par moindres carrés creux.
+
+    Chaque raie n'est évaluée que sur sa fenêtre [pos - window, pos + window] ;
+    les trois paramètres (amplitude, centre, sigma) de toutes les raies sont
+    ajustés dans un seul problème avec un jacobien analytique creux.
+    """
+
+    def __init__(self, line_positions=None, window=2.0, sigma0=0.25, center_tolerance=0.5):
+        self.line_positions = TELLURIC_LINES if line_positions is None else list(line_positions)
+        self.window = window
+        self.sigma0 = sigma0
+        self.center_tolerance = center_tolerance
+
+    def fit(self, x, y):
+        """Retourner (indices des pixels ajustés, modèle sur ces pixels, paramètres par raie)"""
+        from scipy.sparse import csr_matrix
+
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if len(x) > 1 and x[0] > x[-1]:
+            # CDELT1 négatif : ajustement sur l'axe retourné, indices ramenés à l'ordre d'origine
+            fitted_pixels, model, params = self.fit(x[::-1], y[::-1])
+            return (len(x) - 1 - fitted_pixels)[::-1], model[::-1], params
+
+        # Fenêtres en intervalles d'indices (x croissant), pas de masque sur tout le spectre
+        positions, starts, stops = [], [], []
+        for pos in self.line_positions:
+            start = np.searchsorted(x, pos - self.window, side='right')
+            stop = np.searchsorted(x, pos + self.window, side='left')
+            if stop - start >= 4:
+                positions.append(pos)
+                starts.append(start)
+                stops.append(stop)
+            else:
+                print(f"Raie {pos} hors du spectre ou trop peu de points, ignorée")
+
+        if not positions:
+            return np.empty(0, dtype=np.intp), np.empty(0), np.empty((0, 3))
+
+        lengths = np.subtract(stops, starts)
+        line_of = np.repeat(np.arange(len(positions)), lengths)
+        pixels = np.concatenate([np.arange(start, stop) for start, stop in zip(starts, stops)])
+        fitted_pixels, rows = np.unique(pixels, return_inverse=True)
+        xs = x[pixels]
+        target = y[fitted_pixels]
+        n_params = 3 * len(positions)
+        cols = 3 * line_of[:, None] + np.arange(3)
+
+        positions = np.asarray(positions)
+        p0 = self._initial_guess(x, y, positions)
+
+        lower = np.column_stack([np.full(len(positions), -np.inf), positions - self.center_tolerance,
+                                 np.full(len(positions), 1e-3)]).ravel()
+        upper = np.column_stack([np.full(len(positions), np.inf), positions + self.center_tolerance,
+                                 np.full(len(positions), self.window)]).ravel()
+
+        last = {}
+
+        def evaluate(p):
+            # Le jacobien est demandé au point que l'on vient d'accepter : on réutilise wofz
+            if last.get('p') is not None and np.array_equal(last['p'], p):
+                return last['values']
+            q = p.reshape(-1, 3)
+            amplitude, center, sigma = q[line_of, 0], q[line_of, 1], q[line_of, 2]
+            dx = xs - center
+            z = (dx + 1j * sigma) / (sigma * SQRT2)
+            w = wofz(z)
+            last['p'], last['values'] = p.copy(), (amplitude, sigma, dx, z, w)
+            return last['values']
+
+        def residuals(p):
+            amplitude, sigma, dx, z, w = evaluate(p)
+            values = amplitude * w.real / (sigma * SQRT2PI)
+            return np.bincount(rows, weights=values, minlength=len(fitted_pixels)) - target
+
+        def jacobian(p):
+            amplitude, sigma, dx, z, w = evaluate(p)
+            dw = -2 * z * w + 2j / np.sqrt(np.pi)  # w'(z)
+            norm = 1.0 / (sigma * SQRT2PI)
+            d_amplitude = w.real * norm
+            d_center = amplitude * norm * (dw * (-1.0 / (sigma * SQRT2))).real
+            d_sigma = amplitude / SQRT2PI * ((dw * (-dx / (sigma ** 2 * SQRT2))).real / sigma - w.real / sigma ** 2)
+            data = np.column_stack([d_amplitude, d_center, d_sigma])
+            return csr_matrix((data.ravel(), (np.repeat(rows, 3), cols.ravel())),
+                              shape=(len(fitted_pixels), n_params))
+
+        params, fun = levenberg_marquardt(residuals, jacobian, np.clip(p0, lower, upper), lower, upper)
+        model = fun + target
+        return fitted_pixels, model, params.reshape(-1, 3)
+
+    def _initial_guess(self, x, y, positions):
+        """Amplitude et largeur initiales à partir de l'aire et de la profondeur de chaque raie"""
+        step = abs(np.median(np.diff(x))) if len(x) > 1 else self.sigma0
+        peak = y[np.clip(np.searchsorted(x, positions), 0, len(x) - 1)]
+        start = np.searchsorted(x, positions - 2 * self.sigma0)
+        stop = np.searchsorted(x, positions + 2 * self.sigma0)
+        cumulative = np.concatenate([[0.0], np.cumsum(y)])
+        area = (cumulative[stop] - cumulative[start]) * step
+
+        sigma = np.full(len(positions), max(self.sigma0, 2 * step))
+        valid = (peak * area > 0) & (np.abs(peak) > 0)
+        sigma[valid] = area[valid] * VOIGT_PEAK / (peak[valid] * SQRT2PI)
+        sigma = np.clip(sigma, 2 * step, self.window / 2)
+        amplitude = peak * sigma * SQRT2PI / VOIGT_PEAK
+        return np.column_stack([amplitude, positions, sigma]).ravel()
+
+    def remove(self, x, y_corrected):
+        """Soustraire le modèle ajusté d'un spectre corrigé de sa ligne de base"""
+        y_corrected = np.array(y_corrected, dtype=np.float64)
+        fitted_pixels, model, params = self.fit(x, y_corrected)
+        y_corrected[fitted_pixels] -= model
+        return y_corrected
+
+
+class TelluricTemplate:
+    """Gabarit de transmission tellurique : profondeur optique à masse d'air 1 sur une grille régulière.
+
+    Le modèle ajusté sur un spectre est exp(-scale * tau(lambda - shift)) convolué
+    par le profil instrumental (FWHM = lambda / R, R = BSS_ITRP).
+    """
+
+    def __init__(self, wavelength, optical_depth):
+        self.wavelength = np.asarray(wavelength, dtype=np.float64)
+        self.optical_depth = np.asarray(optical_depth, dtype=np.float64)
+        self.step = self.wavelength[1] - self.wavelength[0]
+
+    @classmethod
+    def from_lines(cls, line_positions=None, depths=None, sigma=0.04, step=0.01, margin=5.0):
+        """Gabarit synthétique à partir de la liste de raies (profondeurs optiques égales par défaut)"""
+        positions = np.asarray(TELLURIC_LINES if line_positions is None else line_positions)
+        depths = np.full(len(positions), 0.3) if depths is None else np.asarray(depths)
+        wavelength = np.arange(positions.min() - margin, positions.max() + margin, step)
+        optical_depth = np.zeros_like(wavelength)
+        peak = voigt(0.0, 1.0, 0.0, sigma)
+        for pos, depth in zip(positions, depths):
+            start = np.searchsorted(wavelength, pos - margin)
+            stop = np.searchsorted(wavelength, pos + margin)
+            optical_depth[start:stop] += depth * voigt(wavelength[start:stop], 1.0, pos, sigma) / peak
+        return cls(wavelength, optical_depth)
+
+    @classmethod
+    def from_spectrum(cls, x, y_normalized, fitter=None, step=0.01):
+        """Gabarit mesuré sur un spectre de référence normalisé (masse d'air 1, bon S/B)"""
+        x = np.asarray(x, dtype=np.float64)
+        fitter = fitter or TelluricFitter()
+        fitted_pixels, model, params = fitter.fit(x, np.asarray(y_normalized) - 1.0)
+        wavelength = np.arange(x.min(), x.max(), step)  # grille croissante, même si CDELT1 < 0
+        optical_depth = np.zeros_like(wavelength)
+        for amplitude, center, sigma in params:
+            start = np.searchsorted(wavelength, center - fitter.window)
+            stop = np.searchsorted(wavelength, center + fitter.window)
+            optical_depth[start:stop] -= voigt(wavelength[start:stop], amplitude, center, sigma)
+        # 1 - profondeur -> profondeur optique
+        optical_depth = -np.log(np.clip(1.0 - optical_depth, 1e-3, None))
+        return cls(wavelength, optical_depth)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['wavelength'], data['optical_depth'])
+
+    def save(self, path):
+        np.savez(path, wavelength=self.wavelength, optical_depth=self.optical_depth)
+
+    def transmission(self, x, scale, shift, fwhm):
+        """Transmission convoluée par le profil instrumental, rééchantillonnée sur x"""
+        transmission = np.exp(-scale * self.optical_depth)
+        sigma_pix = fwhm / (2 * np.sqrt(2 * np.log(2))) / self.step
+        if sigma_pix > 0.1:
+            from scipy.ndimage import gaussian_filter1d
+            transmission = gaussian_filter1d(transmission, sigma_pix, mode='nearest')
+        return np.interp(x - shift, self.wavelength, transmission, left=1.0, right=1.0)
+
+    def fit(self, x, y_normalized, resolution=None, max_shift=0.5):
+        """Ajuster (scale, shift) ; retourne la transmission sur x et les paramètres"""
+        from scipy.optimize import least_squares
+
+        x = np.asarray(x, dtype=np.float64)
+        y_normalized = np.asarray(y_normalized, dtype=np.float64)
+        if len(x) > 1 and x[0] > x[-1]:
+            # CDELT1 négatif : ajustement sur l'axe retourné, transmission ramenée à l'ordre d'origine
+            transmission, params = self.fit(x[::-1], y_normalized[::-1], resolution, max_shift)
+            return transmission[::-1], params
+
+        start = np.searchsorted(x, self.wavelength[0])
+        stop = np.searchsorted(x, self.wavelength[-1])
+        if stop - start < 10:
+            return np.ones_like(x), (0.0, 0.0)
+
+        xs, ys = x[start:stop], y_normalized[start:stop]
+        center = 0.5 * (xs[0] + xs[-1])
+        if resolution:
+            fwhm = center / resolution
+        else:
+            # Sans BSS_ITRP : échantillonnage de Nyquist
+            fwhm = 2 * abs(np.median(np.diff(xs)))
+
+        def residuals(p):
+            return self.transmission(xs, p[0], p[1], fwhm) - ys
+
+        result = least_squares(residuals, [1.0, 0.0], bounds=([0.0, -max_shift], [20.0, max_shift]),
+                               diff_step=[1e-3, 1e-3])
+        scale, shift = result.x
+        return self.transmission(x, scale, shift, fwhm), (scale, shift)
+
+
+_default_template = None
+
+
+def _default_template_path():
+    return os.path.join(config.CACHE_DIR, "telluric_template.npz")
+
+
+def has_measured_template():
+    """Un gabarit mesuré (save_default_template) est-il disponible ?"""
+    return _default_template is not None or os.path.exists(_default_template_path())
+
+
+def default_template():
+    """Gabarit mesuré enregistré dans le cache par save_default_template.
+
+    Le gabarit synthétique (from_lines) laisse environ deux fois le résidu de l'ajustement
+    joint : il n'est jamais pris par défaut.
+    """
+    global _default_template
+    if _default_template is None:
+        path = _default_template_path()
+        if not os.path.exists(path):
+            raise FileNotFoundError("Aucun gabarit tellurique mesuré : le créer d'abord à partir "
+                                    "d'un spectre de référence")
+        _default_template = TelluricTemplate.load(path)
+    return _default_template
+
+
+def save_default_template(template):
+    """Enregistrer le gabarit utilisé par défaut par le mode template"""
+    global _default_template
+    os.makedirs(config.CACHE_DIR, exist_ok=True)
+    template.save(_default_template_path())
+    _default_template = template
@@ -0,0 +1,108 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def share_array(array):
+    """Copier un tableau dans un bloc de mémoire partagée ; retourne (bloc, descripteur)"""
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def empty_shared_array(shape, dtype=np.float64):
+    dtype = np.dtype(dtype)
+    block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    return block, (block.name, tuple(shape), dtype.str)
+
+
+def attach_array(descriptor):
+    """Ouvrir dans un processus de calcul un tableau partagé par le processus principal"""
+    name, shape, dtype = descriptor
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+_processor = None
+
+
+def _clean_shared(x_descriptor, y_descriptor, out_descriptor, method, resolution):
+    global _processor
+    if _processor is None:
+        from data_processing import DataProcessor
+        from product_cache import ProductCache
+
+        # résultats mémorisés par le processus principal (store_atmospheric_lines) : pas de cache ici
+        _processor = DataProcessor(products=ProductCache(max_bytes=0))
+
+    blocks = []
+    try:
+        block, x = attach_array(x_descriptor)
+        blocks.append(block)
+        block, y = attach_array(y_descriptor)
+        blocks.append(block)
+        block, out = attach_array(out_descriptor)
+        blocks.append(block)
+        _, cleaned, bkg = _processor.remove_atmospheric_lines(x, y, method=method, resolution=resolution)
+        out[0] = cleaned
+        out[1] = bkg
+        del x, y, out
+    finally:
+        for block in blocks:
+            block.close()
+
+
+class TelluricPool:
+    """Nettoyage tellurique de plusieurs spectres dans un pool de processus.
+
+    Les spectres sont transmis aux processus par mémoire partagée (pas de pickle des données).
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self._blocks = {}
+
+    def submit(self, x, y, method="joint", resolution=None):
+        x = np.asarray(x, dtype=np.float64)
+        x_block, x_descriptor = share_array(x)
+        y_block, y_descriptor = share_array(np.asarray(y, dtype=np.float64))
+        out_block, out_descriptor = empty_shared_array((2, len(x)))
+        future = self.executor.submit(_clean_shared, x_descriptor, y_descriptor, out_descriptor, method, resolution)
+        self._blocks[future] = (x_block, y_block, out_block, out_descriptor)
+        return future
+
+    def result(self, future):
+        """Retourner (x, spectre nettoyé, ligne de base) d'une tâche terminée et libérer ses blocs"""
+        x_block, y_block, out_block, (name, shape, dtype) = self._blocks[future]
+        try:
+            future.result()
+            x = np.ndarray(shape[1:], dtype=np.float64, buffer=x_block.buf).copy()
+            out = np.ndarray(shape, dtype=dtype, buffer=out_block.buf).copy()
+        finally:
+            self._release(future)
+        return x, out[0], out[1]
+
+    def cancel(self):
+        """Annuler les tâches en attente ; les tâches en cours libèrent leurs blocs en se terminant"""
+        for future in list(self._blocks):
+            if future.cancel() or future.done():
+                self._release(future)
+            else:
+                future.add_done_callback(self._release)
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, future):
+        blocks = self._blocks.pop(future, None)
+        if blocks is None:
+            return
+        for block in blocks[:3]:
+            block.close()
+            block.unlink()
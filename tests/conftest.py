@@ -0,0 +1,82 @@
+"""Outils communs des tests : dépôt importable et serveur HTTP local remplaçant les sites distants."""
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class LocalServer:
+    """Pages servies : chemin -> (contenu, ETag, Last-Modified).
+
+    Répond 304 quand If-None-Match (ou, sans ETag, If-Modified-Since) correspond à la
+    page courante ; chaque requête est enregistrée (chemin, en-têtes, code de réponse).
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._answer(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def url(self, path):
+        return self.base_url + path
+
+    def serve(self, path, content, etag=None, last_modified=None):
+        self.pages[path] = (content, etag, last_modified)
+
+    def _answer(self, handler):
+        page = self.pages.get(handler.path)
+        if page is None:
+            status = 404
+        else:
+            content, etag, last_modified = page
+            if etag is not None and handler.headers.get('If-None-Match') == etag:
+                status = 304
+            elif (etag is None and last_modified is not None
+                  and handler.headers.get('If-Modified-Since') == last_modified):
+                status = 304
+            else:
+                status = 200
+        self.requests.append((handler.path, dict(handler.headers), status))
+
+        handler.send_response(status)
+        if status == 200:
+            if etag is not None:
+                handler.send_header('ETag', etag)
+            if last_modified is not None:
+                handler.send_header('Last-Modified', last_modified)
+            handler.send_header('Content-Length', str(len(content)))
+            handler.end_headers()
+            handler.wfile.write(content)
+        else:
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def http_server():
+    server = LocalServer()
+    yield server
+    server.close()
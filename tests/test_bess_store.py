@@ -0,0 +1,98 @@
+"""Catalogue BeSS local (SQLite) et rafraîchissement conditionnel, contre un serveur HTTP local."""
+import pytest
+
+from bess_store import BessStore
+
+STARS = [
+    ('gam Cas', 'HD 5394', '00 56 42.5', '+60 43 00', '2.47', 'B0.5IVe', '2024-01-15', '#00ff00'),
+    ('omi And', 'HD 217675', '23 01 55.3', '+42 19 34', '3.62', 'B6IIIpe', '12/03/2023', '#ffff00'),
+    ('zet Tau', 'HD 37202', '05 37 38.7', '+21 08 33', '3.03', 'B2IIIpe', '2022-11-02', '#ff0000'),
+]
+
+
+def bess_page(stars):
+    """Page ARASBEAM réduite : le tableau des étoiles est le 5e <table>, après deux lignes d'en-tête"""
+    tables = "".join("<table><tr><td>menu</td><td>x</td></tr></table>" for _ in range(4))
+    rows = ["<tr><td>Nom</td><td>HD</td><td>AD</td><td>Dec</td><td>V</td><td>Type</td>"
+            "<td>a</td><td>b</td><td>c</td><td>Date</td></tr>",
+            "<tr><td colspan=10>tri</td><td>-</td></tr>"]
+    for star_id, hd, ra, dec, mag, sptype, date, color in stars:
+        rows.append(f"<tr><td><a href='#'>{star_id}</a></td><td>{hd}</td><td>{ra}</td><td>{dec}</td>"
+                    f"<td>{mag}</td><td>{sptype}</td><td>1</td><td>2</td><td>3</td>"
+                    f"<td bgcolor=\"{color}\">{date}</td></tr>")
+    return f"<html><body>{tables}<table>{''.join(rows)}</table></body></html>".encode('utf-8')
+
+
+@pytest.fixture
+def store(http_server, tmp_path):
+    return BessStore(path=str(tmp_path / "bess.sqlite"), url=http_server.url("/bess"), offline=False)
+
+
+def test_first_refresh_fills_the_store(http_server, store):
+    http_server.serve("/bess", bess_page(STARS), etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+    assert store.refresh() == {'added': 3, 'updated': 0, 'removed': 0}
+
+    catalogue = store.catalogue()
+    assert list(catalogue['id']) == ['gam Cas', 'omi And', 'zet Tau']
+    assert catalogue['ra_deg'][0] == pytest.approx(14.177, abs=1e-3)
+    assert str(catalogue['date_value'][1]) == '2023-03-12'
+    assert catalogue['bgcolor'][2] == '#ff0000'
+    assert store.meta('etag') == '"v1"'
+    assert 'If-None-Match' not in http_server.requests[0][1]
+
+
+def test_unchanged_page_answers_304(http_server, store):
+    http_server.serve("/bess", bess_page(STARS), etag='"v1"')
+    store.refresh()
+    assert store.refresh() == {'added': 0, 'updated': 0, 'removed': 0}
+
+    path, headers, status = http_server.requests[-1]
+    assert headers['If-None-Match'] == '"v1"'
+    assert status == 304
+    assert len(store) == 3
+
+
+def test_if_modified_since_without_etag(http_server, store):
+    http_server.serve("/bess", bess_page(STARS), last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+    store.refresh()
+    store.refresh()
+    _, headers, status = http_server.requests[-1]
+    assert headers['If-Modified-Since'] == "Mon, 01 Jan 2024 00:00:00 GMT"
+    assert status == 304
+
+
+def test_changed_page_applies_only_the_differences(http_server, store):
+    http_server.serve("/bess", bess_page(STARS), etag='"v1"')
+    store.refresh()
+
+    changed = [('eta Cen', 'HD 127972', '14 35 30.4', '-42 09 28', '2.33', 'B2Ve', '2024-02-01', '#00ff00'),
+               STARS[0][:6] + ('2024-03-01', '#00ff00'),
+               STARS[1]]
+    http_server.serve("/bess", bess_page(changed), etag='"v2"')
+    assert store.refresh() == {'added': 1, 'updated': 1, 'removed': 1}
+
+    catalogue = store.catalogue()
+    assert list(catalogue['id']) == ['eta Cen', 'gam Cas', 'omi And']
+    assert catalogue['date'][1] == '2024-03-01'
+    assert store.meta('etag') == '"v2"'
+
+
+def test_store_is_readable_after_restart_and_offline(http_server, store, tmp_path):
+    http_server.serve("/bess", bess_page(STARS), etag='"v1"')
+    store.refresh()
+    count = len(http_server.requests)
+
+    offline = BessStore(path=str(tmp_path / "bess.sqlite"), url=http_server.url("/bess"), offline=True)
+    assert offline.refresh() is None
+    assert len(offline) == 3
+    assert list(offline.catalogue()['id']) == ['gam Cas', 'omi And', 'zet Tau']
+    assert len(http_server.requests) == count
+
+
+def test_server_error_keeps_the_local_catalogue(http_server, store):
+    http_server.serve("/bess", bess_page(STARS), etag='"v1"')
+    store.refresh()
+    del http_server.pages["/bess"]
+    with pytest.raises(Exception):
+        store.refresh()
+    assert len(store) == 3
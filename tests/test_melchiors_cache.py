@@ -0,0 +1,113 @@
+"""Cache local des spectres MELCHIORS, contre un serveur HTTP local."""
+import io
+import gzip
+import os
+
+import numpy as np
+import pytest
+from astropy.table import Table
+
+from melchiors_cache import MelchiorsCache
+
+
+def reference_file(ref_number, size=500):
+    """Spectre MELCHIORS factice (FITS compressé), colonnes wave et flux_tac"""
+    wave = np.linspace(4000, 9000, size)
+    table = Table({'wave': wave, 'flux_tac': np.full(size, float(ref_number)), 'flux': np.ones(size)})
+    buffer = io.BytesIO()
+    table.write(buffer, format='fits')
+    return gzip.compress(buffer.getvalue())
+
+
+def serve_reference(server, ref_number, size=500):
+    server.serve(f"/00{ref_number}_melchiors_spectrum.fits.gz", reference_file(ref_number, size))
+
+
+@pytest.fixture
+def cache(http_server, tmp_path):
+    return MelchiorsCache(cache_dir=str(tmp_path / "melchiors"), offline=False, base_url=http_server.base_url)
+
+
+def test_download_then_hit(http_server, cache):
+    serve_reference(http_server, 123)
+    wave, flux = cache.get(123)
+    assert isinstance(wave, np.memmap)
+    assert np.allclose(flux, 123)
+    assert len(http_server.requests) == 1
+
+    wave_again, flux_again = cache.get(123)
+    assert np.array_equal(wave, wave_again)
+    assert len(http_server.requests) == 1  # servi par le cache
+
+
+def test_cache_survives_restart_offline(http_server, cache, tmp_path):
+    serve_reference(http_server, 7)
+    cache.get(7)
+
+    offline = MelchiorsCache(cache_dir=str(tmp_path / "melchiors"), offline=True, base_url=http_server.base_url)
+    _, flux = offline.get(7)
+    assert np.allclose(flux, 7)
+    with pytest.raises(FileNotFoundError):
+        offline.get(8)
+    assert len(http_server.requests) == 1
+
+
+def test_corrupted_entry_is_downloaded_again(http_server, cache, tmp_path):
+    serve_reference(http_server, 5)
+    cache.get(5)
+    digest = cache.index['urls'][cache.url(5)]
+    path = os.path.join(cache._entry_dir(digest), "flux_tac.npy")
+    with open(path, "r+b") as f:
+        f.seek(-8, os.SEEK_END)
+        f.write(b"\xff" * 8)
+
+    fresh = MelchiorsCache(cache_dir=str(tmp_path / "melchiors"), offline=False, base_url=http_server.base_url)
+    _, flux = fresh.get(5)
+    assert np.allclose(flux, 5)
+    assert len(http_server.requests) == 2
+
+
+def test_missing_spectrum_raises(http_server, cache):
+    with pytest.raises(Exception):
+        cache.get(404)
+    assert cache.index['urls'] == {}
+
+
+def test_least_recently_used_entries_are_evicted(http_server, tmp_path):
+    for ref_number in (1, 2, 3):
+        serve_reference(http_server, ref_number, size=1000)
+    cache = MelchiorsCache(cache_dir=str(tmp_path / "melchiors"), offline=False, base_url=http_server.base_url,
+                           max_bytes=2 * 2 * (1000 * 8 + 128))  # deux entrées de deux colonnes
+    cache.get(1)
+    cache.get(2)
+    cache.get(1)  # 2 devient la moins récemment utilisée
+    cache.get(3)
+
+    assert cache.url(1) in cache.index['urls']
+    assert cache.url(2) not in cache.index['urls']
+    assert cache.url(3) in cache.index['urls']
+    assert cache.total_size() <= cache.max_bytes
+
+
+def test_concurrent_index_writers_do_not_share_a_temporary_file(http_server, tmp_path):
+    import threading
+
+    caches = [MelchiorsCache(cache_dir=str(tmp_path / "melchiors"), offline=False, base_url=http_server.base_url)
+              for _ in range(8)]
+    errors = []
+
+    def work(cache):
+        try:
+            for _ in range(20):
+                cache._save_index()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(cache,)) for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert not [name for name in os.listdir(tmp_path / "melchiors") if name.endswith(".tmp")]
@@ -0,0 +1,176 @@
+"""Résolution SIMBAD : regroupement des requêtes, cache persistant, durée de validité et erreurs."""
+import pytest
+
+import simbad_resolver
+from simbad_resolver import SimbadBackend, SimbadResolver, hd_from_identifiers
+
+
+class FakeBackend:
+    """Backend SIMBAD factice : identifiants connus, noms en échec et appels enregistrés"""
+
+    def __init__(self, known=None, failing=(), error=None):
+        self.known = known or {}
+        self.failing = set(failing)
+        self.error = error
+        self.calls = []
+
+    def query(self, names):
+        self.calls.append(list(names))
+        if self.error is not None:
+            raise self.error
+        return {name: list(self.known.get(name, [])) for name in names if name not in self.failing}
+
+
+KNOWN = {'gam Cas': ['* gam Cas', 'HD 5394', 'HIP 4427'], 'omi And': ['* omi And', 'HD 217675']}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(simbad_resolver.time, 'time', lambda: now[0])
+    return now
+
+
+def make_resolver(tmp_path, backend, **options):
+    return SimbadResolver(backend=backend, cache_path=str(tmp_path / "simbad_ids.json"), offline=False, **options)
+
+
+def test_distinct_missing_names_in_one_query(tmp_path):
+    backend = FakeBackend(KNOWN)
+    resolver = make_resolver(tmp_path, backend)
+    result = resolver.resolve_many(['gam Cas', 'omi And', 'gam Cas', 'zet Tau'])
+
+    assert backend.calls == [['gam Cas', 'omi And', 'zet Tau']]
+    assert result['gam Cas'] == KNOWN['gam Cas']
+    assert result['zet Tau'] == []
+    assert resolver.lookups == 1  # une requête pour trois noms
+
+    resolver.resolve_many(['omi And', 'gam Cas'])
+    assert resolver.resolve('zet Tau') == []  # « inconnu » est aussi mis en cache
+    assert len(backend.calls) == 1
+
+
+def test_cache_is_persistent(tmp_path):
+    make_resolver(tmp_path, FakeBackend(KNOWN)).resolve('gam Cas')
+
+    backend = FakeBackend()
+    assert make_resolver(tmp_path, backend).resolve('gam Cas') == KNOWN['gam Cas']
+    assert backend.calls == []
+
+
+def test_expired_entries_are_queried_again(tmp_path, clock):
+    backend = FakeBackend(KNOWN)
+    resolver = make_resolver(tmp_path, backend, ttl=100)
+    resolver.resolve_many(['gam Cas', 'omi And'])
+
+    clock[0] += 50
+    resolver.resolve('gam Cas')
+    assert len(backend.calls) == 1
+
+    clock[0] += 60
+    backend.known = {'gam Cas': ['HD 5394']}
+    assert resolver.resolve('gam Cas') == ['HD 5394']
+    assert backend.calls[-1] == ['gam Cas']
+
+
+def test_offline_uses_expired_entries_without_query(tmp_path, clock):
+    make_resolver(tmp_path, FakeBackend(KNOWN), ttl=100).resolve('gam Cas')
+    clock[0] += 1000
+
+    backend = FakeBackend()
+    resolver = SimbadResolver(backend=backend, cache_path=str(tmp_path / "simbad_ids.json"), ttl=100, offline=True)
+    assert resolver.resolve('gam Cas') == KNOWN['gam Cas']
+    assert resolver.resolve('omi And') == []
+    assert backend.calls == []
+
+
+def test_failed_names_are_retried_after_the_delay(tmp_path, clock):
+    backend = FakeBackend(KNOWN, failing={'omi And'})
+    resolver = make_resolver(tmp_path, backend, retry_delay=600)
+    result = resolver.resolve_many(['gam Cas', 'omi And'])
+    assert result == {'gam Cas': KNOWN['gam Cas'], 'omi And': []}
+
+    backend.failing = set()
+    assert resolver.resolve('omi And') == []  # échec récent : pas de nouvelle requête
+    assert len(backend.calls) == 1
+
+    clock[0] += 601
+    assert resolver.resolve('omi And') == KNOWN['omi And']
+    assert backend.calls[-1] == ['omi And']
+
+
+def test_failed_refresh_keeps_expired_identifiers(tmp_path, clock):
+    backend = FakeBackend(KNOWN)
+    resolver = make_resolver(tmp_path, backend, ttl=100)
+    resolver.resolve('gam Cas')
+
+    clock[0] += 1000
+    backend.failing = {'gam Cas'}
+    assert resolver.resolve('gam Cas') == KNOWN['gam Cas']
+
+
+def test_unreachable_backend_is_not_queried_for_every_file(tmp_path, clock):
+    backend = FakeBackend(KNOWN, error=ConnectionError("réseau indisponible"))
+    resolver = make_resolver(tmp_path, backend, retry_delay=600)
+    with pytest.raises(ConnectionError):
+        resolver.resolve_many(['gam Cas', 'omi And'])
+
+    # autres fichiers, autre processus (cache relu) : aucune nouvelle requête pendant retry_delay
+    for _ in range(50):
+        assert resolver.resolve('gam Cas') == []
+    assert make_resolver(tmp_path, backend, retry_delay=600).resolve('omi And') == []
+    assert len(backend.calls) == 1
+
+    clock[0] += 601
+    backend.error = None
+    assert resolver.resolve('gam Cas') == KNOWN['gam Cas']
+    assert len(backend.calls) == 2
+
+
+def test_backend_keeps_names_resolved_before_a_fallback_error(monkeypatch):
+    pytest.importorskip("astroquery")
+    from astropy.table import Table
+    from astroquery.simbad import Simbad
+
+    def query_tap(query):
+        return Table({'name': ['HD 5394', 'HD 5394'], 'ident': ['HD 5394', '* gam Cas']})
+
+    def query_objectids(name):
+        if name == 'omi And':
+            raise ConnectionError("réseau indisponible")
+        return Table({'id': ['* zet Tau', 'HD 37202']})
+
+    monkeypatch.setattr(Simbad, 'query_tap', query_tap)
+    monkeypatch.setattr(Simbad, 'query_objectids', query_objectids)
+
+    result = SimbadBackend().query(['HD 5394', 'omi And', 'zet Tau'])
+    assert result == {'HD 5394': ['HD 5394', '* gam Cas'], 'zet Tau': ['* zet Tau', 'HD 37202']}
+
+
+def test_hd_from_identifiers():
+    assert hd_from_identifiers(KNOWN['gam Cas']) == 'HD 5394'
+    assert hd_from_identifiers(['* omi And', 'HIP 1']) is None
+
+
+def test_concurrent_writers_do_not_share_a_temporary_file(tmp_path):
+    import threading
+
+    resolvers = [make_resolver(tmp_path, FakeBackend({f'HD {i}': [f'HD {i}']})) for i in range(8)]
+    errors = []
+
+    def work(i, resolver):
+        try:
+            for _ in range(20):
+                resolver.resolve_many([f'HD {i}'])
+                resolver.clear()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(i, r)) for i, r in enumerate(resolvers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert [p.name for p in tmp_path.iterdir()] == ["simbad_ids.json"]
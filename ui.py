@@ -2,14 +2,24 @@ import numpy as np
 from PySide6.QtWidgets import (QMainWindow, QPushButton, QVBoxLayout, QHBoxLayout, QWidget,
                                QFileDialog, QMessageBox, QLabel, QStackedWidget, 
                                QTableWidget, QTableWidgetItem, QSplitter,QCheckBox, QHeaderView,QColorDialog, 
-                               QInputDialog,QMenuBar,QMenu, QDialog, QCalendarWidget,QScrollArea)
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QColor
+                               QInputDialog,QMenuBar,QMenu, QDialog, QCalendarWidget,QScrollArea, QProgressDialog,
+                               QSlider, QTableView, QLineEdit, QDoubleSpinBox, QFormLayout,
+                               QDialogButtonBox)
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QColor, QActionGroup, QGuiApplication
 import pyqtgraph as pg
 from data_processing import DataProcessor
+from telluric import TELLURIC_LINES, has_measured_template
+from telluric_pool import TelluricPool
+from file_loader import FileLoader, JobRunner, format_errors
 from image_analysis import ImageProcessor
-from bdd_processing import bess_request
+from live_watch import LiveWatcher, PaintProbe
+from bess_store import BessStore
+from bess_model import BessTableModel, BessFilterProxy
+from observability import night_grid, observability, DEFAULT_MIN_ALTITUDE
+import config
 import datetime
+import os
 
 
 class MainWindow(QMainWindow):
@@ -118,40 +128,39 @@ class MainWindow(QMainWindow):
 
         self.stacked_widget.addWidget(self.home_page)
 
-        # Page de graphes
-        self.graph_page = GraphPage()
-        self.stacked_widget.addWidget(self.graph_page)
-
-        # Page d'images
-        self.image_page = ImagePage()
-        self.stacked_widget.addWidget(self.image_page)
-
-        # Page de comparaison
-        self.comparaison_page = ComparaisonPage()
-        self.stacked_widget.addWidget(self.comparaison_page)
-
-        # Page de comparaison
-        self.bdd_page = BDDPage()
-        self.stacked_widget.addWidget(self.bdd_page)
-
-
+        # Les autres pages sont construites à la première visite
+        self.pages = {}
+        self.page_classes = {
+            'graph': GraphPage,
+            'image': ImagePage,
+            'comparaison': ComparaisonPage,
+            'bdd': BDDPage,
+        }
 
         self.show_home()
 
+    def page(self, name):
+        """Retourner la page name, construite et ajoutée au QStackedWidget au premier appel"""
+        page = self.pages.get(name)
+        if page is None:
+            page = self.pages[name] = self.page_classes[name]()
+            self.stacked_widget.addWidget(page)
+        return page
+
     def show_home(self):
         self.stacked_widget.setCurrentWidget(self.home_page)
 
     def show_graph_page(self):
-        self.stacked_widget.setCurrentWidget(self.graph_page)
+        self.stacked_widget.setCurrentWidget(self.page('graph'))
 
     def show_image_page(self):
-        self.stacked_widget.setCurrentWidget(self.image_page)
+        self.stacked_widget.setCurrentWidget(self.page('image'))
 
     def show_comparaison_page(self):
-        self.stacked_widget.setCurrentWidget(self.comparaison_page)
+        self.stacked_widget.setCurrentWidget(self.page('comparaison'))
 
     def show_bdd_page(self):
-        self.stacked_widget.setCurrentWidget(self.bdd_page)
+        self.stacked_widget.setCurrentWidget(self.page('bdd'))
 
 
 class ImagePage(QWidget):
@@ -166,6 +175,30 @@ class ImagePage(QWidget):
         self.openImageButton.clicked.connect(self.open_image)
         layout.addWidget(self.openImageButton)
 
+        # Extraction optimale d'une série de poses avec l'ouverture de la ROI
+        self.extractButton = QPushButton("Extraire une série de poses (ouverture = ROI)")
+        self.extractButton.clicked.connect(self.extract_series)
+        layout.addWidget(self.extractButton)
+
+        # Combinaison de poses (darks, flats, piles) à mémoire bornée, résultat affiché ici
+        self.combineButton = QPushButton("Combiner des poses (darks, flats, piles)")
+        self.combineButton.clicked.connect(self.combine_frames)
+        layout.addWidget(self.combineButton)
+
+        # Mode direct : affichage des poses écrites dans un dossier par le logiciel d'acquisition
+        self.liveButton = QPushButton("Mode direct : suivre un dossier")
+        self.liveButton.setCheckable(True)
+        self.liveButton.toggled.connect(self.toggle_live)
+        layout.addWidget(self.liveButton)
+        self.liveLabel = QLabel("")
+        self.liveLabel.hide()
+        layout.addWidget(self.liveLabel)
+
+        # Rejet des cosmiques (L.A.Cosmic) : image nettoyée affichée, cosmiques encadrés
+        self.cosmicCheckbox = QCheckBox("Rejeter les cosmiques")
+        self.cosmicCheckbox.toggled.connect(self.toggle_cosmics)
+        layout.addWidget(self.cosmicCheckbox)
+
         # Créer le widget de pyqtgraph pour l'analyse d'image
         self.win = pg.GraphicsLayoutWidget()
         layout.addWidget(self.win)
@@ -174,14 +207,179 @@ class ImagePage(QWidget):
         self.image_processor = ImageProcessor(self.win)
         self.image_processor.setup_image_analysis()
 
+        # Lecture des fichiers hors du thread graphique
+        self.loader = FileLoader(self, max_threads=1)
+        self.loader.loaded.connect(self.on_image_loaded)
+        self.loader.failed.connect(lambda file_name, message: QMessageBox.critical(self, "Erreur", message))
+
+        # Extraction : le lot (pool de processus) tourne dans un thread pour ne pas bloquer l'interface
+        self.extraction_job = JobRunner(self)
+        self.extraction_job.done.connect(self.on_series_extracted)
+        self.extraction_job.failed.connect(lambda output_dir, message: QMessageBox.critical(self, "Erreur", f"Extraction impossible: {message}"))
+        self.extraction_job.finished.connect(self.on_extraction_finished)
+
+        self.combine_job = JobRunner(self)
+        self.combine_job.done.connect(self.on_frames_combined)
+        self.combine_job.failed.connect(lambda out_name, message: QMessageBox.critical(self, "Erreur", f"Combinaison impossible: {message}"))
+        self.combine_job.finished.connect(self.on_combine_finished)
+
+        self.file_name = None
+        self.raw_prepared = None  # image d'origine préparée, réaffichée sans recalcul
+        self.cosmic_job = JobRunner(self)
+        self.cosmic_job.done.connect(self.on_cosmics_cleaned)
+        self.cosmic_job.finished.connect(lambda file_name: self.cosmicCheckbox.setText("Rejeter les cosmiques"))
+        self.cosmic_job.failed.connect(lambda file_name, message: QMessageBox.critical(self, "Erreur", f"Rejet des cosmiques impossible: {message}"))
+
+        self.live_watcher = None
+        self.paint_probe = PaintProbe(self)
+        self.win.viewport().installEventFilter(self.paint_probe)
+        self.live_timer = QTimer(self)
+        self.live_timer.setInterval(1000)
+        self.live_timer.timeout.connect(lambda: self.liveLabel.setText(self.live_watcher.summary()))
+
     def open_image(self):
         file_name, _ = QFileDialog.getOpenFileName(self, "Ouvrir un fichier FITS 2D", "", "Fichiers FITS 2D (*.fits *.fit);;Tous les fichiers (*)")
 
         if file_name:
-            try:
-                self.image_processor.process_image(file_name)
-            except Exception as e:
-                QMessageBox.critical(self, "Erreur", str(e))
+            self.liveButton.setChecked(False)
+            self.loader.load([file_name], self.image_processor.prepare_image)
+
+    def toggle_live(self, checked):
+        if not checked:
+            if self.live_watcher is not None:
+                self.live_watcher.stop()
+                self.paint_probe.painted.disconnect(self.live_watcher.painted)
+                print(f"Mode direct arrêté : {self.live_watcher.summary()}")
+                self.live_watcher.deleteLater()
+                self.live_watcher = None
+            self.live_timer.stop()
+            self.liveLabel.hide()
+            self.liveButton.setText("Mode direct : suivre un dossier")
+            return
+
+        folder = QFileDialog.getExistingDirectory(self, "Dossier des poses")
+        if not folder:
+            self.liveButton.setChecked(False)
+            return
+        self.start_live(folder)
+
+    def start_live(self, folder):
+        # l'image ouverte auparavant n'est plus affichée
+        self.loader.cancel()
+        self.cosmic_job.cancel()
+        self.file_name = self.raw_prepared = None
+        self.cosmicCheckbox.setChecked(False)
+        screen = QGuiApplication.primaryScreen()
+        rate = screen.refreshRate() if screen is not None else 60
+        self.live_watcher = LiveWatcher(folder, interval_ms=int(1000 / (rate if rate > 0 else 60)), parent=self)
+        self.live_watcher.frameReady.connect(self.on_live_frame)
+        self.live_watcher.failed.connect(lambda file_name, message: print(f"Mode direct, {file_name}: {message}"))
+        self.paint_probe.painted.connect(self.live_watcher.painted)
+        self.liveButton.setText(f"Mode direct : {folder} (cliquer pour arrêter)")
+        self.liveLabel.setText("En attente de nouvelles poses...")
+        self.liveLabel.show()
+        self.live_timer.start()
+
+    def on_live_frame(self, slot):
+        watcher = self.live_watcher
+        if watcher is None:
+            return
+        self.image_processor.show_live(watcher.ring.frames[slot])
+        watcher.shown(slot)
+
+    def on_image_loaded(self, file_name, prepared):
+        try:
+            self.image_processor.show_image(prepared)
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", str(e))
+            return
+        self.file_name, self.raw_prepared = file_name, prepared
+        if self.cosmicCheckbox.isChecked():
+            self.clean_cosmics()
+
+    def toggle_cosmics(self, checked):
+        if self.raw_prepared is None:
+            return
+        if checked:
+            self.clean_cosmics()
+        else:
+            self.cosmic_job.cancel()
+            self.cosmicCheckbox.setText("Rejeter les cosmiques")
+            self.image_processor.show_image(self.raw_prepared, keep_view=True)
+
+    def clean_cosmics(self):
+        pyramid = self.raw_prepared[0]
+        self.cosmicCheckbox.setText("Rejeter les cosmiques (calcul...)")
+        self.cosmic_job.run_async(self.file_name, lambda: self.image_processor.prepare_cosmics(pyramid))
+
+    def on_cosmics_cleaned(self, file_name, result):
+        # résultat périmé : autre image ouverte ou case décochée entre temps
+        if file_name != self.file_name or not self.cosmicCheckbox.isChecked():
+            return
+        prepared, regions = result
+        self.image_processor.show_image(prepared, keep_view=True)
+        self.image_processor.show_cosmics(regions)
+        print(f"{len(regions)} cosmique(s) rejeté(s) dans {os.path.basename(file_name)}")
+
+    def extract_series(self):
+        if self.image_processor.pyramid is None:
+            QMessageBox.critical(self, "Erreur", "Ouvrir d'abord une pose et placer la ROI sur le spectre")
+            return
+        file_names, _ = QFileDialog.getOpenFileNames(self, "Poses à extraire", "", "Fichiers FITS 2D (*.fits *.fit);;Tous les fichiers (*)")
+        if not file_names:
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "Dossier des spectres 1D")
+        if not output_dir:
+            return
+
+        import extraction
+
+        aperture, columns = self.image_processor.extraction_aperture()
+        self.extractButton.setEnabled(False)
+        self.extractButton.setText(f"Extraction de {len(file_names)} pose(s)...")
+        self.extraction_job.run_async(output_dir, lambda: extraction.run(
+            file_names, output_dir, aperture=aperture, columns=columns))
+
+    def on_series_extracted(self, output_dir, rows):
+        failed = [row for row in rows if row['status'] != "ok"]
+        message = f"{len(rows) - len(failed)} spectre(s) 1D écrit(s) dans {output_dir}"
+        if failed:
+            message += f"\n{len(failed)} échec(s), par exemple {failed[0]['file']} : {failed[0]['error']}"
+        QMessageBox.information(self, "Extraction", message)
+
+    def on_extraction_finished(self, output_dir):
+        self.extractButton.setEnabled(True)
+        self.extractButton.setText("Extraire une série de poses (ouverture = ROI)")
+
+    def combine_frames(self):
+        import frame_combine
+
+        file_names, _ = QFileDialog.getOpenFileNames(self, "Poses à combiner", "", "Fichiers FITS 2D (*.fits *.fit);;Tous les fichiers (*)")
+        if not file_names:
+            return
+        choices = {"Médiane": ("median", False), "Moyenne": ("mean", False),
+                   "Moyenne avec rejet sigma": ("sigma", False), "Flat (médiane des poses normalisées)": ("median", True)}
+        choice, ok = QInputDialog.getItem(self, "Combinaison", "Méthode :", list(choices), 0, False)
+        if not ok:
+            return
+        out_name, _ = QFileDialog.getSaveFileName(self, "Enregistrer la pose combinée", "master.fits", "Fichiers FITS (*.fits *.fit)")
+        if not out_name:
+            return
+
+        method, normalize = choices[choice]
+        self.combineButton.setEnabled(False)
+        self.combineButton.setText(f"Combinaison de {len(file_names)} pose(s)...")
+        self.combine_job.run_async(out_name, lambda: frame_combine.combine(
+            file_names, out_name, method=method, normalize=normalize))
+
+    def on_frames_combined(self, out_name, result):
+        shape, chunk, elapsed = result
+        print(f"Poses combinées {shape} en {elapsed:.1f} s (bandes de {chunk} lignes) -> {out_name}")
+        self.loader.load([out_name], self.image_processor.prepare_image)
+
+    def on_combine_finished(self, out_name):
+        self.combineButton.setEnabled(True)
+        self.combineButton.setText("Combiner des poses (darks, flats, piles)")
 
 
 
@@ -241,6 +439,26 @@ class GraphPage(QWidget):
         self.show_telluric_lines_action.setCheckable(True)
         self.show_telluric_lines_action.triggered.connect(self.toggle_show_telluric_lines)
 
+        # Méthode de correction : ajustement Voigt de toutes les raies ou gabarit (rapide)
+        atmo_menu.addSeparator()
+        self.telluric_method = "joint"
+        self.telluric_method_group = QActionGroup(self)
+        self.telluric_method_group.setExclusive(True)
+        for label, method in (("Méthode : ajustement Voigt", "joint"), ("Méthode : gabarit tellurique (rapide)", "template")):
+            action = atmo_menu.addAction(label)
+            action.setCheckable(True)
+            action.setChecked(method == self.telluric_method)
+            action.setData(method)
+            self.telluric_method_group.addAction(action)
+        self.template_method_action = action
+        # le gabarit synthétique est moins bon que l'ajustement Voigt : gabarit mesuré exigé
+        self.template_method_action.setEnabled(has_measured_template())
+        self.template_method_action.setToolTip("Créer d'abord le gabarit à partir d'un spectre de référence")
+        self.telluric_method_group.triggered.connect(self.choose_telluric_method)
+
+        self.save_template_action = atmo_menu.addAction("Créer le gabarit à partir de ce spectre")
+        self.save_template_action.triggered.connect(self.save_telluric_template)
+
 
         # Ajouter la barre de menu au layout principal
         main_layout.setMenuBar(self.menu_bar)
@@ -262,16 +480,43 @@ class GraphPage(QWidget):
         self.hd_number_label = QLabel("")
         side_layout.addWidget(self.hd_number_label)
 
+        # Réglage interactif de la ligne de base (AsLS) : réajustement rapide pendant le glissement
+        self.baseline_lam = 1e5
+        self.baseline_p = 0.95
+        self.baseline_item = None
+        side_layout.addWidget(QLabel("Ligne de base (AsLS)"))
+
+        self.lam_label = QLabel()
+        side_layout.addWidget(self.lam_label)
+        self.lam_slider = QSlider(Qt.Horizontal)
+        self.lam_slider.setRange(20, 90)  # log10(lam) x 10
+        self.lam_slider.setValue(50)
+        side_layout.addWidget(self.lam_slider)
+
+        self.p_label = QLabel()
+        side_layout.addWidget(self.p_label)
+        self.p_slider = QSlider(Qt.Horizontal)
+        self.p_slider.setRange(500, 999)  # p x 1000
+        self.p_slider.setValue(950)
+        side_layout.addWidget(self.p_slider)
+
+        self.fast_baseline_checkbox = QCheckBox("Mode rapide (grille décimée)")
+        side_layout.addWidget(self.fast_baseline_checkbox)
+
+        self.baseline_timer = QTimer(self)
+        self.baseline_timer.setSingleShot(True)
+        self.baseline_timer.setInterval(30)
+        self.baseline_timer.timeout.connect(self.refit_baseline)
+        for slider in (self.lam_slider, self.p_slider):
+            slider.valueChanged.connect(self.on_baseline_params_changed)
+            slider.sliderReleased.connect(self.apply_baseline_params)
+        self.update_baseline_labels()
+
         self.balmer_lines = [4101, 4340, 4861, 6563]
         self.balmer_lines_items = []
         self.hd_spectrum_item = None
 
-        self.telluric_lines = [
-            6508.603, 6511.999, 6512.242, 6514.727, 6516.437, 6516.543, 6516.625, 6519.467, 
-            6523.850, 6532.459, 6534.000, 6534.014, 6536.726, 6542.317, 6543.912, 6547.705,
-            6548.627, 6552.632, 6557.181, 6558.149, 6560.501, 6564.208, 6568.806, 6572.087, 
-            6574.860, 6580.794, 6586.559, 6594.375, 6599.365, 6605.566, 6612.550
-        ]
+        self.telluric_lines = list(TELLURIC_LINES)
 
         # Configurer le style du graphe
         self.graphWidget.setBackground('w')
@@ -282,24 +527,33 @@ class GraphPage(QWidget):
 
         self.data_processor = DataProcessor()
 
+        # Lecture des fichiers hors du thread graphique
+        self.loader = FileLoader(self, max_threads=1)
+        self.loader.loaded.connect(self.on_file_loaded)
+        self.loader.failed.connect(lambda file_name, message: QMessageBox.critical(self, "Erreur", message))
+
     def open_file(self):
         file_name, _ = QFileDialog.getOpenFileName(self, "Ouvrir un fichier FITS 1D", "", "Fichiers FITS 1D (*.fits *.fit);;Tous les fichiers (*)")
 
         if file_name:
-            try:
-                wavelength, spectrum, title, hd_number, obj_name, date_obs, resolution = self.data_processor.process_file(file_name)
-                self.wavelength = wavelength
-                self.spectrum = spectrum
-                self.hd_number = hd_number
-                self.resolution = resolution
-                self.plot_spectrum(wavelength, spectrum, title)
-                self.display_header(self.data_processor.header)
-                self.hd_number_label.setText(f"Numéro HD: {hd_number}" if hd_number else "")
-            except Exception as e:
-                QMessageBox.critical(self, "Erreur", str(e))
+            self.loader.load([file_name], self.data_processor.load_spectrum)
+
+    def on_file_loaded(self, file_name, spectrum):
+        try:
+            self.current_spectrum = spectrum
+            self.wavelength = spectrum.wavelength
+            self.spectrum = spectrum.native_flux
+            self.hd_number = spectrum.hd_number
+            self.resolution = spectrum.resolution
+            self.plot_spectrum(self.wavelength, self.spectrum, spectrum.title)
+            self.display_header(spectrum.header)
+            self.hd_number_label.setText(f"Numéro HD: {spectrum.hd_number}" if spectrum.hd_number else "")
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", str(e))
 
     def plot_spectrum(self, wavelength, spectrum, title):
         self.graphWidget.clear()
+        self.baseline_item = None
         self.graphWidget.plot(wavelength, spectrum, pen='k')
         self.graphWidget.setLabel('left', 'Intensité')
         self.graphWidget.setLabel('bottom', 'Longueur d\'onde [Å]')
@@ -337,12 +591,14 @@ class GraphPage(QWidget):
         if self.melchiors_spectrum_action.isChecked():
             
             print('resolution= ', self.resolution)
-            if self.resolution > 5000:
-                wavelengths, intensities = self.data_processor.plot_melchiors_HR(self.hd_number)
-                self.hd_spectrum_item = self.graphWidget.plot(wavelengths, intensities, pen=pg.mkPen('r', style=Qt.DashLine))
-            elif self.resolution < 5000:
-                wavelengths, intensities = self.data_processor.plot_melchiors_BR(self.hd_number)
-                self.hd_spectrum_item = self.graphWidget.plot(wavelengths, intensities, pen=pg.mkPen('r', style=Qt.DashLine))
+            try:
+                wavelengths, intensities = self.data_processor.melchiors_reference(
+                    self.hd_number, self.wavelength, self.resolution)
+            except Exception as e:
+                QMessageBox.critical(self, "Erreur", f"Spectre Melchiors indisponible: {e}")
+                self.melchiors_spectrum_action.setChecked(False)
+                return
+            self.hd_spectrum_item = self.graphWidget.plot(wavelengths, intensities, pen=pg.mkPen('r', style=Qt.DashLine))
         else:
             if self.hd_spectrum_item:
                 self.graphWidget.removeItem(self.hd_spectrum_item)
@@ -355,9 +611,9 @@ class GraphPage(QWidget):
                 QMessageBox.critical(self, "Erreur", "Veuillez d'abord ouvrir un fichier FITS.")
                 self.remove_atmo_action.setChecked(False)
                 return
-            x = np.array(self.wavelength)
-            y = np.array(self.spectrum)
-            cleaned_wavelength, cleaned_spectrum,bkg = self.data_processor.remove_atmospheric_lines(x,y)
+            cleaned_wavelength, cleaned_spectrum,bkg = self.data_processor.remove_atmospheric_lines(
+                self.wavelength, self.spectrum, method=self.telluric_method, resolution=self.resolution,
+                lam=self.baseline_lam, p=self.baseline_p, baseline=self.baseline_mode())
 
             # Plot the cleaned spectrum
             self.plot_spectrum(cleaned_wavelength, cleaned_spectrum, "Spectre sans raies atmosphériques")
@@ -370,6 +626,54 @@ class GraphPage(QWidget):
             if hasattr(self, 'wavelength') and hasattr(self, 'spectrum'):
                 self.plot_spectrum(self.wavelength, self.spectrum, "Spectre original")
 
+    def baseline_mode(self):
+        return "fast" if self.fast_baseline_checkbox.isChecked() else "full"
+
+    def update_baseline_labels(self):
+        self.lam_label.setText(f"lam = {self.baseline_lam:.3g}")
+        self.p_label.setText(f"p = {self.baseline_p:.3f}")
+
+    def on_baseline_params_changed(self):
+        self.baseline_lam = 10 ** (self.lam_slider.value() / 10)
+        self.baseline_p = self.p_slider.value() / 1000
+        self.update_baseline_labels()
+        self.baseline_timer.start()
+        if not self.lam_slider.isSliderDown() and not self.p_slider.isSliderDown():
+            self.apply_baseline_params()
+
+    def refit_baseline(self):
+        """Réajustement rapide (grille décimée, démarrage à chaud) affiché pendant le réglage"""
+        if not hasattr(self, 'wavelength') or not hasattr(self, 'spectrum'):
+            return
+        self.bkg = self.data_processor.estimate_baseline(self.wavelength, self.spectrum,
+                                                         lam=self.baseline_lam, p=self.baseline_p, mode="fast")
+        if self.baseline_item is None:
+            self.baseline_item = self.graphWidget.plot(self.wavelength, self.bkg, pen=pg.mkPen('g', style=Qt.DashLine),
+                                                       name="Ligne de base")
+        else:
+            self.baseline_item.setData(self.wavelength, self.bkg)
+
+    def apply_baseline_params(self):
+        """Fin du réglage : recalcul du spectre corrigé avec les nouveaux paramètres"""
+        if self.remove_atmo_action.isChecked():
+            self.toggle_remove_atmo()
+
+    def choose_telluric_method(self, action):
+        self.telluric_method = action.data()
+        if self.remove_atmo_action.isChecked():
+            self.toggle_remove_atmo()
+
+    def save_telluric_template(self):
+        if not hasattr(self, 'wavelength') or not hasattr(self, 'spectrum'):
+            QMessageBox.critical(self, "Erreur", "Veuillez d'abord ouvrir un fichier FITS.")
+            return
+        try:
+            self.data_processor.save_telluric_template(self.wavelength, self.spectrum)
+            self.template_method_action.setEnabled(True)
+            QMessageBox.information(self, "Gabarit tellurique", "Gabarit enregistré.")
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", str(e))
+
     def toggle_show_both_spectra(self):
             if self.show_both_spectra_action.isChecked():
                 if hasattr(self, 'cleaned_wavelength') and hasattr(self, 'cleaned_spectrum'):
@@ -442,6 +746,9 @@ class ComparaisonPage(QWidget):
         self.remove_atmo_action.setCheckable(True)
         self.remove_atmo_action.triggered.connect(self.toggle_remove_atmo)
 
+        self.choix_workers_action = options_menu.addAction("Nombre de processus")
+        self.choix_workers_action.triggered.connect(self.choose_workers)
+
 
 
         # Ajouter la barre de menu au layout principal
@@ -471,6 +778,23 @@ class ComparaisonPage(QWidget):
 
         self.data_processor = DataProcessor()
 
+        # Nettoyage des raies atmosphériques en parallèle
+        self.workers = os.cpu_count() or 1
+        self.telluric_pool = None
+        self.cleaning_futures = {}
+        self.cleaning_errors = []
+        self.cleaning_progress = None
+        self.cleaning_timer = QTimer(self)
+        self.cleaning_timer.timeout.connect(self.poll_cleaning)
+
+        # Lecture des fichiers hors du thread graphique, résultats dans l'ordre de sélection
+        self.file_names = []
+        self.loading_progress = None
+        self.loader = FileLoader(self)
+        self.loader.loaded.connect(self.on_file_loaded)
+        self.loader.progress.connect(self.on_loading_progress)
+        self.loader.finished.connect(self.on_files_loaded)
+
     def choose_background_color(self):
         color = QColorDialog.getColor()
 
@@ -504,18 +828,48 @@ class ComparaisonPage(QWidget):
         file_names, _ = QFileDialog.getOpenFileNames(self, "Ouvrir des fichiers FITS 1D", "", "Fichiers FITS 1D (*.fits *.fit);;Tous les fichiers (*)")
 
         if file_names:
+            if self.remove_atmo_action.isChecked():
+                self.cancel_cleaning()
+                self.remove_atmo_action.setChecked(False)
+                if hasattr(self, 'original_data'):
+                    del self.original_data
             self.graph_comp_Widget.clear()
             self.plots.clear()
-
-            for i, file_name in enumerate(file_names):
-                try:
-                    wavelength, spectrum, title, hd_number,obj_name, date_obs, resolution = self.data_processor.process_file(file_name)
-                    self.wavelength = wavelength
-                    self.spectrum = spectrum
-                    color = self.colors[i % len(self.colors)]
-                    self.plot_spectrum(wavelength, spectrum, color, obj_name, date_obs)
-                except Exception as e:
-                    QMessageBox.critical(self, "Erreur", f"Erreur avec le fichier {file_name}: {str(e)}")
+            self.file_names = list(file_names)
+
+            self.loading_progress = QProgressDialog("Ouverture des fichiers...", "Annuler", 0, len(file_names), self)
+            self.loading_progress.setWindowModality(Qt.WindowModal)
+            self.loading_progress.setMinimumDuration(500)
+            self.loading_progress.canceled.connect(self.cancel_loading)
+            self.loader.load(file_names, self.data_processor.load_spectrum, prepare=self.data_processor.prefetch_identifiers)
+
+    def on_file_loaded(self, file_name, spectrum):
+        try:
+            self.wavelength = spectrum.wavelength
+            self.spectrum = spectrum.native_flux
+            color = self.colors[self.file_names.index(file_name) % len(self.colors)]
+            self.plot_spectrum(self.wavelength, self.spectrum, color, spectrum.obj_name, spectrum.date_obs)
+        except Exception as e:
+            self.loader.errors.append((file_name, str(e)))
+
+    def on_loading_progress(self, done, total):
+        if self.loading_progress is not None:
+            self.loading_progress.setValue(done)
+
+    def on_files_loaded(self, errors):
+        self.close_loading_progress()
+        if errors:
+            QMessageBox.critical(self, "Erreur", format_errors(errors))
+
+    def cancel_loading(self):
+        self.loader.cancel()
+        self.close_loading_progress()
+
+    def close_loading_progress(self):
+        if self.loading_progress is not None:
+            progress, self.loading_progress = self.loading_progress, None
+            progress.canceled.disconnect(self.cancel_loading)
+            progress.close()
 
     def plot_spectrum(self, wavelength, spectrum, color, obj_name, date_obs):
         wavelength = np.asarray(wavelength)
@@ -525,6 +879,17 @@ class ComparaisonPage(QWidget):
         self.graph_comp_Widget.setLabel("left", "Intensité")
         self.graph_comp_Widget.setLabel("bottom", 'Longueur d\'onde [Å]')
 
+    def choose_workers(self):
+        workers, ok = QInputDialog.getInt(self, "Nombre de processus", "Processus pour le nettoyage des raies:",
+                                          self.workers, 1, 64)
+        if ok and workers != self.workers:
+            self.workers = workers
+            if self.cleaning_futures:
+                self.on_cleaning_canceled()
+            if self.telluric_pool is not None:
+                self.telluric_pool.shutdown()
+                self.telluric_pool = None
+
     def toggle_remove_atmo(self):
         if self.remove_atmo_action.isChecked():
             if not self.plots:
@@ -533,45 +898,83 @@ class ComparaisonPage(QWidget):
                 return
 
             # Conserver une copie des spectres originaux
-            self.original_plots = list(self.plots)
-            
-            self.graph_comp_Widget.clear()
-            self.plots.clear()
-
-            for plot_item, color in self.original_plots:
-                try:
-                    x = plot_item.getData()[0]  # Extraction des longueurs d'onde
-                    y = plot_item.getData()[1]  # Extraction des spectres
-                    
-                    # Suppression des raies atmosphériques
-                    cleaned_wavelength, cleaned_spectrum, bkg = self.data_processor.remove_atmospheric_lines(x, y)
-
-                    # Affichage du spectre nettoyé
-                    cleaned_plot = self.graph_comp_Widget.plot(cleaned_wavelength, cleaned_spectrum, pen=pg.mkPen(color, width=self.line_thickness), name="Spectre sans raies atmosphériques")
-                    self.plots.append((cleaned_plot, color))
-
-                except Exception as e:
-                    QMessageBox.critical(self, "Erreur", f"Erreur lors du traitement des raies atmosphériques: {str(e)}")
-                    self.remove_atmo_action.setChecked(False)
-                    return
+            self.original_data = [plot_item.getData() for plot_item, color in self.plots]
+            self.start_cleaning()
 
         else:
-            if not hasattr(self, 'original_plots'):
+            self.cancel_cleaning()
+            if not hasattr(self, 'original_data'):
                 QMessageBox.critical(self, "Erreur", "Aucune donnée d'origine n'est disponible.")
                 self.remove_atmo_action.setChecked(False)
                 return
 
-            self.graph_comp_Widget.clear()
-            self.plots.clear()
-
             # Réafficher les spectres originaux
-            for plot_item, color in self.original_plots:
-                x = plot_item.getData()[0]
-                y = plot_item.getData()[1]
-                original_plot = self.graph_comp_Widget.plot(x, y, pen=pg.mkPen(color, width=self.line_thickness), name="Spectre original")
-                self.plots.append((original_plot, color))
-            
-            del self.original_plots  # Nettoyer les spectres originaux pour éviter des incohérences futures
+            for (plot_item, color), (x, y) in zip(self.plots, self.original_data):
+                plot_item.setData(x, y)
+
+            del self.original_data  # Nettoyer les spectres originaux pour éviter des incohérences futures
+
+    def start_cleaning(self):
+        """Envoyer chaque spectre au pool de processus ; les courbes sont remplacées au fil de l'eau"""
+        self.cleaning_futures = {}
+        self.cleaning_errors = []
+        for index, (x, y) in enumerate(self.original_data):
+            cached = self.data_processor.cached_atmospheric_lines(x, y)
+            if cached is not None:
+                self.plots[index][0].setData(cached[0], cached[1])
+                continue
+            if self.telluric_pool is None:
+                self.telluric_pool = TelluricPool(self.workers)
+            future = self.telluric_pool.submit(x, y)
+            self.cleaning_futures[future] = index
+
+        self.cleaning_progress = QProgressDialog("Retrait des raies atmosphériques...", "Annuler",
+                                                 0, len(self.cleaning_futures), self)
+        self.cleaning_progress.setWindowModality(Qt.WindowModal)
+        self.cleaning_progress.setMinimumDuration(0)
+        self.cleaning_progress.canceled.connect(self.on_cleaning_canceled)
+        # le pool ne peut pas être remplacé tant que ses tâches sont suivies
+        self.choix_workers_action.setEnabled(False)
+        self.cleaning_timer.start(50)
+
+    def poll_cleaning(self):
+        for future in [f for f in self.cleaning_futures if f.done()]:
+            index = self.cleaning_futures.pop(future)
+            try:
+                x, cleaned_spectrum, bkg = self.telluric_pool.result(future)
+                self.data_processor.store_atmospheric_lines(*self.original_data[index], cleaned_spectrum, bkg)
+                self.plots[index][0].setData(x, cleaned_spectrum)
+            except Exception as e:
+                self.cleaning_errors.append(str(e))
+
+        if self.cleaning_progress is not None:
+            self.cleaning_progress.setValue(self.cleaning_progress.maximum() - len(self.cleaning_futures))
+
+        if not self.cleaning_futures:
+            self.finish_cleaning()
+            if self.cleaning_errors:
+                QMessageBox.critical(self, "Erreur", "Erreur lors du traitement des raies atmosphériques:\n"
+                                     + "\n".join(self.cleaning_errors))
+
+    def on_cleaning_canceled(self):
+        """Annulation : on revient aux spectres originaux"""
+        self.cancel_cleaning()
+        self.remove_atmo_action.setChecked(False)
+        self.toggle_remove_atmo()
+
+    def cancel_cleaning(self):
+        if self.cleaning_futures and self.telluric_pool is not None:
+            self.telluric_pool.cancel()
+        self.cleaning_futures = {}
+        self.finish_cleaning()
+
+    def finish_cleaning(self):
+        self.cleaning_timer.stop()
+        self.choix_workers_action.setEnabled(True)
+        if self.cleaning_progress is not None:
+            progress, self.cleaning_progress = self.cleaning_progress, None
+            progress.canceled.disconnect(self.on_cleaning_canceled)
+            progress.close()
 
 
 class BDDPage(QWidget):
@@ -600,6 +1003,27 @@ class BDDPage(QWidget):
         self.calendar_button.clicked.connect(self.choose_date)
         left_layout.addWidget(self.calendar_button)
 
+        # Observabilité : lieu et nuit courants, hauteur minimale
+        self.site = config.SITE
+        self.night_date = datetime.date.today()
+        self.night_label = QLabel("")
+        self.night_label.setWordWrap(True)
+        left_layout.addWidget(self.night_label)
+
+        altitude_layout = QHBoxLayout()
+        altitude_layout.addWidget(QLabel("Hauteur min (°)"))
+        self.min_altitude = QDoubleSpinBox()
+        self.min_altitude.setRange(0.0, 80.0)
+        self.min_altitude.setSingleStep(5.0)
+        self.min_altitude.setValue(DEFAULT_MIN_ALTITUDE)
+        self.min_altitude.valueChanged.connect(self.update_observability)
+        altitude_layout.addWidget(self.min_altitude)
+        left_layout.addLayout(altitude_layout)
+
+        self.observable_checkbox = QCheckBox("Observables cette nuit")
+        self.observable_checkbox.toggled.connect(self.on_observable_filter_changed)
+        left_layout.addWidget(self.observable_checkbox)
+
         # Bouton pour ouvrir la sélection des constellations
         self.constellation_button = QPushButton("Choisir les constellations")
         self.constellation_button.clicked.connect(self.choose_constellations)
@@ -607,7 +1031,9 @@ class BDDPage(QWidget):
 
         # Label pour afficher les constellations sélectionnées
         self.selected_constellations_label = QLabel("Constellations sélectionnées: Aucun")
+        self.selected_constellations_label.setWordWrap(True)
         left_layout.addWidget(self.selected_constellations_label)
+        self.selected_constellations = []
 
         left_layout.addStretch()
 
@@ -618,51 +1044,181 @@ class BDDPage(QWidget):
         right_widget = QWidget()
         right_layout = QVBoxLayout(right_widget)
 
-        self.table = QTableWidget()
+        self.catalogue_label = QLabel("Chargement du catalogue BeSS...")
+        right_layout.addWidget(self.catalogue_label)
+
+        # Filtres : texte (id, HD, type spectral) et magnitude maximale
+        filter_layout = QHBoxLayout()
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Filtrer (id, HD, type spectral)")
+        self.filter_edit.textChanged.connect(self.on_text_filter_changed)
+        filter_layout.addWidget(self.filter_edit)
+        filter_layout.addWidget(QLabel("Mag max"))
+        self.mag_filter = QDoubleSpinBox()
+        self.mag_filter.setRange(0.0, 20.0)
+        self.mag_filter.setSingleStep(0.5)
+        self.mag_filter.setSpecialValueText("aucune")  # 0 = pas de limite
+        self.mag_filter.valueChanged.connect(self.on_mag_filter_changed)
+        filter_layout.addWidget(self.mag_filter)
+        right_layout.addLayout(filter_layout)
+
+        # Modèle sur les colonnes du catalogue : seules les lignes visibles sont lues
+        self.model = BessTableModel(parent=self)
+        self.proxy = BessFilterProxy(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.modelReset.connect(self.update_count_label)
+
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setSortingEnabled(True)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         self.table.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)  # Toujours afficher la barre de défilement verticale
         self.table.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)  # Afficher la barre de défilement horizontale si nécessaire
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+
+        # Limiter la hauteur du tableau pour n'afficher que 20 lignes à la fois
+        row_height = self.table.verticalHeader().defaultSectionSize()
+        header_height = self.table.horizontalHeader().sizeHint().height()
+        self.table.setFixedHeight(row_height * 20 + header_height)
 
         right_layout.addWidget(self.table)
 
+        self.count_label = QLabel("")
+        right_layout.addWidget(self.count_label)
+
         # Ajouter le widget droit au splitter
         splitter.addWidget(right_widget)
 
         splitter.setSizes([150, 400])  # Taille initiale des panneaux
 
-        # Charger les données dans le tableau
-        self.load_data_to_table()
-
-    def load_data_to_table(self):
-        
-        df = bess_request()
-
-        # Configurer le tableau
-        self.table.setRowCount(len(df))  # Définir le nombre de lignes total en fonction du DataFrame
-        self.table.setColumnCount(len(df.columns) - 1)  # Ne pas inclure la colonne "bgcolor"
-        self.table.setHorizontalHeaderLabels(df.columns.drop('bgcolor'))
-
-        # Remplir le tableau avec les données du DataFrame
-        for i in range(len(df)):
-            for j, col in enumerate(df.columns.drop('bgcolor')):  # Exclure la colonne "bgcolor"
-                item = QTableWidgetItem(str(df.iloc[i][col]))
-                if col == 'date':
-                    # Appliquer le code couleur à la cellule de la colonne "date"
-                    color = df.iloc[i]['bgcolor']
-                    if color:
-                        item.setBackground(QColor(color))
-                self.table.setItem(i, j, item)
+        # Observabilité calculée hors du thread graphique
+        self.observability_job = JobRunner(self)
+        self.observability_job.done.connect(self.on_observability_computed)
+        self.observability_job.failed.connect(self.on_observability_failed)
+
+        # Catalogue local affiché immédiatement, puis mis à jour en arrière-plan (requête HTTP conditionnelle)
+        self.store = BessStore()
+        if len(self.store):
+            self.catalogue_label.setText("Mise à jour du catalogue BeSS...")
+            self.load_catalogue(self.store.catalogue())
+        self.refresh_job = JobRunner(self)
+        self.refresh_job.done.connect(self.on_catalogue_refreshed)
+        self.refresh_job.failed.connect(self.on_catalogue_failed)
+        self.refresh_job.run_async(self.store.url, self.store.refresh)
+
+    def on_catalogue_refreshed(self, url, changes):
+        if changes is None and not len(self.store):
+            self.catalogue_label.setText("Catalogue BeSS local vide (mode hors-ligne)")
+            return
+        self.catalogue_label.hide()
+        if changes is not None:
+            print(f"Catalogue BeSS: {changes['added']} ajoutée(s), {changes['updated']} modifiée(s), "
+                  f"{changes['removed']} supprimée(s)")
+        if changes is None or any(changes.values()) or self.model.rowCount() == 0:
+            self.load_catalogue(self.store.catalogue())
+
+    def on_catalogue_failed(self, url, message):
+        if len(self.store):
+            self.catalogue_label.setText("Catalogue BeSS local (mise à jour impossible)")
+            print(f"Mise à jour du catalogue BeSS impossible: {message}")
+        else:
+            self.catalogue_label.setText("Catalogue BeSS indisponible")
+            QMessageBox.critical(self, "Erreur", f"Impossible de charger le catalogue BeSS: {message}")
+
+    def load_catalogue(self, catalogue):
+        """Afficher un BessCatalogue ; les filtres en cours sont réappliqués"""
+        self.model.set_catalogue(catalogue)
+        self.on_text_filter_changed(self.filter_edit.text())
+        self.on_mag_filter_changed(self.mag_filter.value())
+        self.apply_constellation_filter()
+        self.update_observability()
+
+    def on_text_filter_changed(self, text):
+        self.proxy.set_text_filter(text)
+
+    def on_mag_filter_changed(self, value):
+        if self.model.catalogue is not None:
+            self.proxy.set_range_filter('mag_value', maximum=value if value > 0 else None)
+
+    def update_count_label(self):
+        total = self.model.rowCount()
+        self.count_label.setText(f"{self.proxy.rowCount()} / {total} étoiles")
+
+    def update_observability(self):
+        """Recalculer hauteur max, masse d'air, transit et durée observable pour la nuit et le lieu courants.
+
+        La grille de la nuit (éphémérides, éventuel téléchargement IERS) et le calcul sur tout
+        le catalogue sont faits dans le pool de threads ; un nouvel appel annule le précédent.
+        """
+        latitude, longitude, height = self.site
+        date = self.night_date.isoformat()
+        min_altitude = self.min_altitude.value()
+        catalogue = self.model.catalogue
+        if catalogue is not None and not len(catalogue):
+            catalogue = None
+        ra_deg = None if catalogue is None else catalogue['ra_deg']
+        dec_deg = None if catalogue is None else catalogue['dec_deg']
+
+        def compute():
+            night = night_grid(date, latitude, longitude, height)
+            columns = None if ra_deg is None else observability(ra_deg, dec_deg, night, min_altitude)
+            return catalogue, night, columns
+
+        self.night_label.setText(f"Nuit du {date} à {latitude:.2f}°, {longitude:.2f}° : calcul en cours...")
+        self.observability_job.run_async(f"{date} {latitude} {longitude} {height} {min_altitude}", compute)
+
+    def on_observability_computed(self, key, result):
+        catalogue, night, columns = result
+        latitude, longitude, _ = self.site
+        interval = night.dark_interval()
+        if interval is None:
+            dark = "pas de nuit noire"
+        else:
+            dark = f"nuit noire {str(interval[0])[11:16]} - {str(interval[1])[11:16]} UTC ({night.dark_hours:.1f} h)"
+        self.night_label.setText(f"Nuit du {self.night_date.isoformat()} à {latitude:.2f}°, {longitude:.2f}° : {dark}")
 
-        # Limiter la hauteur du tableau pour n'afficher que 20 lignes à la fois
-        row_height = self.table.rowHeight(0)
-        header_height = self.table.horizontalHeader().height()
-        self.table.setFixedHeight(row_height * 20 + header_height)
+        # catalogue remplacé pendant le calcul : le calcul relancé par load_catalogue le couvrira
+        if columns is None or catalogue is not self.model.catalogue:
+            return
+        self.model.set_columns(columns)
+        self.on_observable_filter_changed(self.observable_checkbox.isChecked())
 
-        self.table.horizontalHeader().setStretchLastSection(True)
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+    def on_observability_failed(self, key, message):
+        self.night_label.setText("")
+        QMessageBox.critical(self, "Erreur", f"Impossible de calculer la nuit: {message}")
 
+    def on_observable_filter_changed(self, checked):
+        catalogue = self.model.catalogue
+        if checked and catalogue is not None and 'obs_hours' in catalogue.columns:
+            self.proxy.set_mask('observable', catalogue['obs_hours'] > 0)
+        else:
+            self.proxy.set_mask('observable', None)
 
     def choose_location(self):
-        print("Choisir un lieu via Google Maps")
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Choisir un lieu")
+        layout = QFormLayout(dialog)
+
+        spinboxes = []
+        for label, (minimum, maximum), value in zip(["Latitude (°)", "Longitude (° est)", "Altitude (m)"],
+                                                    [(-90, 90), (-180, 180), (-500, 9000)], self.site):
+            spinbox = QDoubleSpinBox()
+            spinbox.setRange(minimum, maximum)
+            spinbox.setDecimals(4 if maximum <= 180 else 0)
+            spinbox.setValue(value)
+            layout.addRow(label, spinbox)
+            spinboxes.append(spinbox)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addRow(buttons)
+
+        if dialog.exec_():
+            self.site = tuple(spinbox.value() for spinbox in spinboxes)
+            self.update_observability()
 
     def choose_date(self):
         dialog = QDialog(self)
@@ -677,8 +1233,9 @@ class BDDPage(QWidget):
         dialog.exec_()
 
     def on_date_selected(self, dialog, date):
-        print(f"Date choisie: {date.toString(Qt.ISODate)}")
+        self.night_date = date.toPython()
         dialog.accept()
+        self.update_observability()
 
     def get_constellation_list(self):
         constellations =  [
@@ -715,6 +1272,7 @@ class BDDPage(QWidget):
 
         for constellation in constellations:
             checkbox = QCheckBox(constellation)
+            checkbox.setChecked(constellation in self.selected_constellations)
             scroll_layout.addWidget(checkbox)
             self.checkboxes.append(checkbox)
 
@@ -735,4 +1293,14 @@ class BDDPage(QWidget):
             self.selected_constellations_label.setText("Constellations sélectionnées: " + ", ".join(selected_constellations))
         else:
             self.selected_constellations_label.setText("Constellations sélectionnées: Aucun")
+        self.selected_constellations = selected_constellations
+        self.apply_constellation_filter()
         dialog.accept()
+
+    def apply_constellation_filter(self):
+        # index étoile -> constellation calculé au chargement du catalogue : aucun calcul de coordonnées ici
+        catalogue = self.model.catalogue
+        if catalogue is None or not self.selected_constellations:
+            self.proxy.set_mask('constellation', None)
+        else:
+            self.proxy.set_mask('constellation', catalogue.constellation_mask(self.selected_constellations))